@@ -1,8 +1,17 @@
 import os
+import concurrent.futures
+from typing import Iterator
 from groq import Groq
 from dotenv import load_dotenv
 from pathlib import Path
-from rate_limiter import groq_rate_limiter
+from rate_limiter import (
+    groq_rate_limiter, groq_scheduler, RequestDropped,
+    PRIORITY_PRIMARY, PRIORITY_SCORING, PRIORITY_EXPLANATION
+)
+from http_clients import http_clients
+from token_usage import token_usage, approx_token_count
+from llm_json import IncrementalJSONParser, parse_llm_json, LLMJSONError
+from lyrics_alignment import align_highlighted_terms
 
 env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(env_path)
@@ -10,13 +19,82 @@ load_dotenv(env_path)
 # Debug mode - set to False in production to reduce logging
 DEBUG_MODE = os.getenv("AI_SERVICE_DEBUG", "false").lower() == "true"
 
+GROQ_API_URL = "https://api.groq.com"
+
+# Seconds to hold a model's limiter after a 429 that came without Retry-After
+GROQ_429_BACKOFF = float(os.getenv("GROQ_429_BACKOFF", 5))
+
+# Max seconds a call may queue in the scheduler before it is shed (classes not listed never are)
+QUEUE_TIMEOUTS = {
+    PRIORITY_EXPLANATION: float(os.getenv("EXPLANATION_QUEUE_TIMEOUT", 8)),
+}
+
+# Combined score + explain + highlight analysis (batch_analyze_lyrics)
+# Prompt + completion tokens allowed per call, and how many calls one request may split into
+LYRICS_ANALYSIS_TOKEN_BUDGET = int(os.getenv("LYRICS_ANALYSIS_TOKEN_BUDGET", 6000))
+LYRICS_ANALYSIS_MAX_CALLS = int(os.getenv("LYRICS_ANALYSIS_MAX_CALLS", 2))
+# Completion allowance per track: score, 2-3 sentence explanation, highlighted terms
+LYRICS_ANALYSIS_TOKENS_PER_TRACK = int(os.getenv("LYRICS_ANALYSIS_TOKENS_PER_TRACK", 150))
+# Above this many tracks per call the work is split (up to the max calls) so decoding runs in parallel
+LYRICS_ANALYSIS_TRACKS_PER_CALL = int(os.getenv("LYRICS_ANALYSIS_TRACKS_PER_CALL", 5))
+# Lyrics preview lengths tried (longest first) until every track fits in the call budget
+LYRICS_ANALYSIS_PREVIEW_CHARS = (600, 400, 250)
+
+
+def _chunk_usage(chunk):
+    """Usage reported on a stream chunk (Groq sends it on the last one, under x_groq)"""
+    return getattr(chunk, 'usage', None) or getattr(getattr(chunk, 'x_groq', None), 'usage', None)
+
+
+def _note_rate_limit(error, reservation):
+    """Feed a Groq 429 (after the SDK's own retries) back into the model's limiter"""
+    if getattr(error, 'status_code', None) != 429:
+        return
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        retry_after = float(headers.get('retry-after') or GROQ_429_BACKOFF)
+    except (TypeError, ValueError):
+        retry_after = GROQ_429_BACKOFF
+    reservation.limiter.backoff(retry_after)
+
+
 class GroqRecommendationService:
     def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        # One pooled client per process (also used by main's translation fallback)
+        self.client = Groq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            http_client=http_clients.httpx_client(GROQ_API_URL),
+            max_retries=http_clients.policy("api.groq.com").retries,
+            timeout=http_clients.policy("api.groq.com").timeout
+        )
         # Use the specified model (llama-3.3-70b-versatile recommended for complex JSON tasks)
         self.model = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
         # Use faster, cheaper model for lyrics scoring
         self.lyrics_model = os.getenv("GROQ_LYRICS_MODEL", "llama-3.1-8b-instant")
+    
+    def complete(self, endpoint, model, messages, expected_completion=None, priority=PRIORITY_PRIMARY, **kwargs):
+        """
+        chat.completions.create behind the scheduler and the model's rate limiter.
+        Queues at `priority` (low classes may be shed with RequestDropped), reserves an
+        estimate of this exact prompt, then records response.usage under `endpoint`
+        and reconciles the reservation with it.
+        """
+        estimate = token_usage.estimate(endpoint, messages, kwargs.get('max_tokens'), expected_completion)
+        limiter = groq_rate_limiter.for_model(model)
+        ticket = groq_scheduler.admit(priority, limiter, estimate.total, timeout=QUEUE_TIMEOUTS.get(priority))
+        try:
+            # Below primary, the scheduler already reserved the budget when it let the call through
+            reservation = ticket.reservation or limiter.reserve(estimate.total)
+            reservation.sleep()
+            try:
+                response = self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+            except Exception as e:
+                _note_rate_limit(e, reservation)
+                raise
+            reservation.reconcile(token_usage.record(estimate, getattr(response, 'usage', None)))
+            return response
+        finally:
+            groq_scheduler.release(ticket)
         
     def analyze_profile(self, user_data):
         """Analyze user's music profile"""
@@ -33,9 +111,10 @@ class GroqRecommendationService:
         Provide a brief analysis of their music taste in 2-3 sentences.
         """
         
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+        response = self.complete(
+            "analyze_profile",
+            self.model,
+            [{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=200
         )
@@ -44,6 +123,107 @@ class GroqRecommendationService:
     
     def get_recommendations(self, user_message, user_profile, conversation_history=None, weather_data=None):
         """Get Musify recommendations: returns both intro text and song list"""
+        messages = self._build_recommendation_messages(user_message, user_profile, conversation_history, weather_data)
+        return self._complete_recommendations(messages)
+    
+    def stream_recommendations(self, user_message, user_profile, conversation_history=None,
+                               weather_data=None) -> Iterator[dict]:
+        """
+        Streaming variant of get_recommendations.
+        Parses Groq's streamed JSON incrementally, so the intro and each song are
+        available while the model is still writing the rest of the list.
+        
+        Yields:
+            {"type": "intro_delta", "delta": "..."}                         - new intro text (token level)
+            {"type": "intro", "content": "..."}                              - complete intro
+            {"type": "song", "index": 0, "data": {"title": ..., "artist": ...}}
+            {"type": "done", "raw": "..."}                                   - full response text (always last)
+        """
+        messages = self._build_recommendation_messages(user_message, user_profile, conversation_history, weather_data)
+        
+        # Wait for a slot and rate limit if needed (estimated from the actual prompt)
+        estimate = token_usage.estimate("recommendations", messages, max_tokens=1000)
+        limiter = groq_rate_limiter.for_model(self.model)
+        ticket = groq_scheduler.admit(PRIORITY_PRIMARY, limiter, estimate.total)
+        
+        parser = IncrementalJSONParser(partial_keys=['intro'])
+        state = {'intro_sent': ''}
+        chunks = []
+        usage = None
+        reservation = None
+        use_blocking_fallback = False
+        
+        try:
+            reservation = limiter.acquire(estimate.total)
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.8,
+                max_tokens=1000,
+                response_format={"type": "json_object"},  # Force JSON output
+                stream=True
+            )
+            for chunk in stream:
+                usage = _chunk_usage(chunk) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                chunks.append(delta)
+                for event in parser.feed(delta):
+                    yield from self._recommendation_stream_events(event, state)
+            reservation.reconcile(token_usage.record(estimate, usage))
+        except Exception as e:
+            if reservation is not None:
+                _note_rate_limit(e, reservation)
+            if chunks:
+                # Keep what was streamed - the caller still parses the full text
+                print(f"⚠️ Groq stream ended early after {sum(len(c) for c in chunks)} chars: {e}")
+            else:
+                # Nothing streamed (e.g. strict JSON validation failed) - use the blocking path and its retry
+                print(f"⚠️ Groq streaming failed ({e}), falling back to a blocking request")
+                use_blocking_fallback = True
+                # The fallback reserves for itself
+                if reservation is not None:
+                    reservation.release()
+        finally:
+            # Also runs if the client disconnects and the generator is closed mid-stream
+            groq_scheduler.release(ticket)
+        
+        if use_blocking_fallback:
+            content = self._complete_recommendations(messages)
+            chunks.append(content)
+            for event in parser.feed(content):
+                yield from self._recommendation_stream_events(event, state)
+        
+        raw = ''.join(chunks)
+        if not raw:
+            raise ValueError(f"Groq API returned empty response. Check if model '{self.model}' is valid and available.")
+        yield {"type": "done", "raw": raw}
+    
+    @staticmethod
+    def _recommendation_stream_events(event, state):
+        """Translate incremental parser events into recommendation stream events"""
+        kind, key = event[0], event[1]
+        if key == 'intro' and kind in ('partial', 'member') and isinstance(event[2], str):
+            text = event[2]
+            sent = state['intro_sent']
+            if text.startswith(sent) and len(text) > len(sent):
+                yield {"type": "intro_delta", "delta": text[len(sent):]}
+                state['intro_sent'] = text
+            if kind == 'member':
+                yield {"type": "intro", "content": text}
+        elif kind == 'item' and key in ('songs', 'recommendations') and isinstance(event[3], dict):
+            song = event[3]
+            # "recommendations" is the old format ({"song": ..., "artist": ...})
+            yield {"type": "song", "index": event[2], "data": {
+                "title": song.get('title', song.get('song', '')),
+                "artist": song.get('artist', '')
+            }}
+    
+    def _build_recommendation_messages(self, user_message, user_profile, conversation_history=None, weather_data=None):
+        """Build the chat messages for a recommendation request (system prompt, history, profile context)"""
         
         print(f"🌤️ [WEATHER DEBUG AI] get_recommendations called with weather_data: {weather_data is not None}", flush=True)
         if weather_data:
@@ -285,29 +465,32 @@ Based on this profile and request, recommend exactly 7 songs that match their ta
                 print(f"  {i+1}. {role}: {content_preview}...")
             print(f"\n{'='*80}\n")
         
+        return messages
+    
+    def _complete_recommendations(self, messages):
+        """Blocking Groq call for recommendation messages; returns the raw JSON text"""
         try:
             if DEBUG_MODE:
                 print(f"Calling Groq API with model: {self.model}")
             
-            # Wait for rate limit if needed (estimate 1200 tokens for main recommendation with 5 songs)
-            groq_rate_limiter.wait_if_needed(estimated_tokens=1200)
-            
             try:
-                response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.8,
+                response = self.complete(
+                    "recommendations",
+                    self.model,
+                    messages,
+                    temperature=0.8,
                     max_tokens=1000,  # Adjusted for 5 songs
-                response_format={"type": "json_object"}  # Force JSON output
-            )
+                    response_format={"type": "json_object"}  # Force JSON output
+                )
             except Exception as e:
                 error_str = str(e)
                 # If strict JSON validation fails, retry without it (some models struggle with it)
                 if "json_validate_failed" in error_str or "400" in error_str:
                     print(f"⚠️ JSON validation failed with strict mode. Retrying without response_format...")
-                    response = self.client.chat.completions.create(
-                        model=self.model,
-                        messages=messages,
+                    response = self.complete(
+                        "recommendations",
+                        self.model,
+                        messages,
                         temperature=0.8,
                         max_tokens=1300
                     )
@@ -351,9 +534,10 @@ Based on this profile and request, recommend exactly 7 songs that match their ta
         Return ONLY a comma-separated list of 2-3 song titles, nothing else.
         """
         
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+        response = self.complete(
+            "seed_tracks",
+            self.model,
+            [{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=100
         )
@@ -364,16 +548,18 @@ Based on this profile and request, recommend exactly 7 songs that match their ta
         seed_tracks = content.strip().split(',')
         return [track.strip() for track in seed_tracks]
     
-    def batch_score_lyrics_relevance(self, tracks_data, user_prompt):
+    def batch_score_lyrics_relevance(self, tracks_data, user_prompt, scored_ids=None):
         """
         Score multiple songs' lyrics in a single API call (more efficient)
         
         Args:
             tracks_data: List of dicts with keys: 'lyrics', 'track_name', 'artist_name', 'track_id'
             user_prompt: User's original request/prompt
+            scored_ids: Optional set, filled with the track_ids Groq actually scored (the
+                        rest get the default of 3, which shouldn't be cached as a real score)
         
         Returns:
-            Dict mapping track_id to score (0-10), or None if error
+            Dict mapping track_id to score (1-5)
         """
         if not tracks_data:
             return {}
@@ -429,13 +615,12 @@ Return ONLY valid JSON, no other text. Each score must be an integer between 1 a
             if DEBUG_MODE:
                 print(f"    📊 Batch scoring {len(valid_tracks)} tracks (filtered from {len(tracks_data)} total)")
             
-            # Wait for rate limit if needed (estimate based on number of valid tracks)
-            estimated_tokens = len(valid_tracks) * 150 + 200  # ~150 tokens per track + prompt
-            groq_rate_limiter.wait_if_needed(estimated_tokens=estimated_tokens)
-            
-            response = self.client.chat.completions.create(
-                model=self.lyrics_model,  # Use faster model for lyrics scoring
-                messages=[{"role": "user", "content": prompt}],
+            # Rate limited on an estimate of this prompt, reconciled with Groq's usage
+            response = self.complete(
+                "batch_scoring",
+                self.lyrics_model,  # Use faster model for lyrics scoring
+                [{"role": "user", "content": prompt}],
+                priority=PRIORITY_SCORING,
                 temperature=0.3,  # Lower temperature for more consistent scoring
                 max_tokens=100,
                 response_format={"type": "json_object"}  # Force JSON output
@@ -447,8 +632,7 @@ Return ONLY valid JSON, no other text. Each score must be an integer between 1 a
             score_text = content.strip()
             
             # Parse JSON response
-            import json
-            scores_by_index = json.loads(score_text)
+            scores_by_index = parse_llm_json(score_text)
             
             # Map back to track IDs using valid indices
             scores_by_id = {}
@@ -464,6 +648,8 @@ Return ONLY valid JSON, no other text. Each score must be an integer between 1 a
                     # Clamp to 1-5
                     score = max(1, min(5, score))
                     scores_by_id[track_id] = score
+                    if scored_ids is not None:
+                        scored_ids.add(track_id)
             
             if DEBUG_MODE:
                 print(f"    ✅ Batch scored {len(scores_by_id)} tracks")
@@ -510,9 +696,11 @@ Consider:
 Return ONLY a single number from 1-5 (where 1 = poor match, 3 = decent match, 5 = perfect match), nothing else."""
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+            response = self.complete(
+                "score_lyrics",
+                self.model,
+                [{"role": "user", "content": prompt}],
+                priority=PRIORITY_SCORING,
                 temperature=0.3,  # Lower temperature for more consistent scoring
                 max_tokens=10
             )
@@ -533,6 +721,33 @@ Return ONLY a single number from 1-5 (where 1 = poor match, 3 = decent match, 5
             print(f"    ❌ Error scoring lyrics: {e}")
             return 3  # Default score on error (midpoint of 1-5)
     
+    @staticmethod
+    def _clean_highlighted_terms(highlighted_terms, lyrics=None):
+        """
+        Clean up highlighted terms - remove any that contain explanation text.
+        If lyrics are given, terms that don't appear in them are dropped too.
+        """
+        if not isinstance(highlighted_terms, list):
+            return []
+        lyrics_lower = lyrics.lower() if lyrics else None
+        cleaned_terms = []
+        for term in highlighted_terms:
+            if isinstance(term, str):
+                # Remove terms that contain explanation markers
+                if any(marker in term.lower() for marker in ['is not present', 'terms like', 'relate to', 'such as', 'including']):
+                    continue
+                # Remove terms that are too long (likely explanation text)
+                if len(term) > 50:
+                    continue
+                # Clean and add
+                cleaned_term = term.strip().strip('"').strip("'")
+                if not cleaned_term:
+                    continue
+                if lyrics_lower is not None and cleaned_term.lower() not in lyrics_lower:
+                    continue
+                cleaned_terms.append(cleaned_term)
+        return cleaned_terms
+    
     def explain_lyrics_relevance(self, lyrics, track_name, artist_name, user_prompt):
         """
         Generate explanation of how song lyrics relate to user's prompt and identify highlighted terms
@@ -584,12 +799,12 @@ CRITICAL RULES FOR highlighted_terms:
             if DEBUG_MODE:
                 print(f"    🤖 Generating lyrics explanation for: {track_name}")
             
-            # Wait for rate limit if needed (estimate 500 tokens for explanation)
-            groq_rate_limiter.wait_if_needed(estimated_tokens=500)
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+            # Rate limited on an estimate of this prompt, reconciled with Groq's usage
+            response = self.complete(
+                "explanations",
+                self.model,
+                [{"role": "user", "content": prompt}],
+                priority=PRIORITY_EXPLANATION,
                 temperature=0.5,  # Lower for more focused responses
                 max_tokens=250,  # Increased to prevent "max completion tokens reached" errors
                 response_format={"type": "json_object"}  # Force JSON output
@@ -599,51 +814,175 @@ CRITICAL RULES FOR highlighted_terms:
                 return None, []  # Return None if content is missing
             response_text = content.strip()
             
-            # Parse JSON response
-            import json
-            import re
-            
+            # Parse JSON response (tolerates extra text, fences and malformed JSON)
             try:
-                # Try to extract JSON from response (in case LLM adds extra text)
-                result = json.loads(response_text)
-            except json.JSONDecodeError:
-                # Try to extract JSON from markdown code blocks or plain text
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    result = json.loads(json_match.group())
-                else:
-                    if DEBUG_MODE:
-                        print(f"    ⚠️ Could not parse JSON, using fallback")
-                    # Fallback: use response as explanation, no highlighted terms
-                    return response_text, []
+                result = parse_llm_json(response_text)
+            except LLMJSONError:
+                if DEBUG_MODE:
+                    print(f"    ⚠️ Could not parse JSON, using fallback")
+                # Fallback: use response as explanation, no highlighted terms
+                return response_text, []
             
             explanation = result.get('explanation', response_text)
             highlighted_terms = result.get('highlighted_terms', [])
             
-            # Clean up highlighted terms - remove any that contain explanation text
-            # Filter out terms that look like they contain commentary or aren't from lyrics
-            cleaned_terms = []
-            for term in highlighted_terms:
-                if isinstance(term, str):
-                    # Remove terms that contain explanation markers
-                    if any(marker in term.lower() for marker in ['is not present', 'terms like', 'relate to', 'such as', 'including']):
-                        continue
-                    # Remove terms that are too long (likely explanation text)
-                    if len(term) > 50:
-                        continue
-                    # Clean and add
-                    cleaned_term = term.strip().strip('"').strip("'")
-                    if cleaned_term and len(cleaned_term) > 0:
-                        cleaned_terms.append(cleaned_term)
-            
-            highlighted_terms = cleaned_terms
+            highlighted_terms = self._clean_highlighted_terms(highlighted_terms)
             
             if DEBUG_MODE:
                 print(f"    ✅ Generated explanation ({len(explanation)} chars)")
                 print(f"    ✅ Identified {len(highlighted_terms)} highlighted terms: {highlighted_terms[:5]}")
             
             return explanation, highlighted_terms
+        except RequestDropped as e:
+            # Shed under load so recommendations and scoring aren't delayed
+            print(f"    ⏭️  Skipped lyrics explanation for {track_name}: {e}")
+            return None, []
         except Exception as e:
             print(f"    ❌ Error generating lyrics explanation: {e}")
             return None, None
+    
+    @staticmethod
+    def _lyrics_preview(lyrics, max_chars):
+        if len(lyrics) <= max_chars:
+            return lyrics
+        return lyrics[:max_chars] + "\n[... truncated ...]"
+    
+    def _analysis_track_section(self, number, track, max_chars):
+        """One track's block in the combined analysis prompt (English lyrics only - see lyrics_alignment)"""
+        return f"""
+Track {number}: "{track['track_name']}" by {track['artist_name']}
+Lyrics:
+{self._lyrics_preview(track['lyrics'], max_chars)}
+"""
+    
+    @staticmethod
+    def _analysis_prompt(user_prompt, sections):
+        return f"""For each song below, rate how well its lyrics match the user's request, explain why, and pick the lyric lines that show it.
+
+User's Request: "{user_prompt}"
+{"".join(sections)}
+For each track return:
+- "score": how well the lyrics match the request - a whole number 1-5 ONLY (1 = poor, 3 = decent, 5 = perfect)
+- "explanation": a brief, engaging explanation (2-3 sentences) of how the themes, emotions, or messages in the lyrics connect to the user's request
+- "highlighted_terms": 3-8 words or short phrases (2-4 words max) copied EXACTLY from the lyrics that relate to the request
+
+Return ONLY a JSON object keyed by track number, no other text:
+{{"1": {{"score": 4, "explanation": "...", "highlighted_terms": ["..."]}}, "2": {{...}}}}
 
+Terms must be direct quotes from the lyrics - no commentary, descriptions or phrases like "terms like"."""
+    
+    def _plan_analysis_batches(self, tracks, user_prompt, token_budget, max_calls):
+        """
+        Split tracks into at most max_calls prompts that each fit token_budget (prompt +
+        completion allowance), shortening lyrics previews until they do. If even the shortest
+        previews don't fit, the tracks are still split over max_calls calls. Long batches are
+        split as well, since one call's latency grows with the completion it has to decode.
+        Returns (preview chars, [[(track number, track), ...], ...]).
+        """
+        header = approx_token_count(self._analysis_prompt(user_prompt, []))
+        numbered = list(enumerate(tracks, 1))
+        for max_chars in LYRICS_ANALYSIS_PREVIEW_CHARS:
+            costs = [
+                approx_token_count(self._analysis_track_section(number, track, max_chars)) + LYRICS_ANALYSIS_TOKENS_PER_TRACK
+                for number, track in numbered
+            ]
+            calls = 1
+            while calls < max_calls and header * calls + sum(costs) > token_budget * calls:
+                calls += 1
+            if header * calls + sum(costs) <= token_budget * calls:
+                break
+        calls = max(calls, min(max_calls, -(-len(tracks) // LYRICS_ANALYSIS_TRACKS_PER_CALL)))
+        
+        # Balance the batches by cost so both calls finish at about the same time
+        target = sum(costs) / calls
+        batches = [[]]
+        running = 0
+        for (number, track), cost in zip(numbered, costs):
+            if batches[-1] and running + cost / 2 > target * len(batches) and len(batches) < calls:
+                batches.append([])
+            batches[-1].append((number, track))
+            running += cost
+        return max_chars, batches
+    
+    def _analyze_batch(self, batch, user_prompt, max_chars):
+        """One combined analysis call; returns {track_id: analysis} for the tracks it covered"""
+        sections = [self._analysis_track_section(number, track, max_chars) for number, track in batch]
+        response = self.complete(
+            "lyrics_analysis",
+            self.model,  # Explanations need the larger model
+            [{"role": "user", "content": self._analysis_prompt(user_prompt, sections)}],
+            priority=PRIORITY_SCORING,  # Selection waits on the scores
+            temperature=0.4,
+            max_tokens=LYRICS_ANALYSIS_TOKENS_PER_TRACK * len(batch),
+            response_format={"type": "json_object"}
+        )
+        content = response.choices[0].message.content
+        if not content:
+            return {}
+        analyses = parse_llm_json(content.strip())
+        if not isinstance(analyses, dict):
+            return {}
+        
+        results = {}
+        for number, track in batch:
+            analysis = analyses.get(str(number))
+            if not isinstance(analysis, dict):
+                continue
+            try:
+                score = max(1, min(5, int(analysis['score'])))
+            except (KeyError, TypeError, ValueError):
+                continue
+            explanation = analysis.get('explanation')
+            highlighted_terms = self._clean_highlighted_terms(analysis.get('highlighted_terms'), track['lyrics'])
+            original = track.get('lyrics_original')
+            results[track['track_id']] = {
+                'score': score,
+                'explanation': explanation if isinstance(explanation, str) and explanation.strip() else None,
+                'highlighted_terms': highlighted_terms,
+                # Mapped onto the original lyrics locally rather than asked of the model
+                'highlighted_terms_original': (
+                    align_highlighted_terms(highlighted_terms, track['lyrics'], original)
+                    if original and original != track['lyrics'] else []
+                )
+            }
+        return results
+    
+    def batch_analyze_lyrics(self, tracks_data, user_prompt, token_budget=LYRICS_ANALYSIS_TOKEN_BUDGET,
+                             max_calls=LYRICS_ANALYSIS_MAX_CALLS):
+        """
+        Score, explain and highlight every candidate track in one or two calls, instead of a
+        scoring call plus an explanation (and original-language highlight) call per track.
+        
+        Args:
+            tracks_data: List of dicts with keys: 'lyrics', 'track_name', 'artist_name', 'track_id'
+                         and optionally 'lyrics_original'
+            user_prompt: User's original request/prompt
+            token_budget: Max prompt + completion tokens per call
+            max_calls: Max calls to split the tracks over (run in parallel)
+        
+        Returns:
+            Dict mapping track_id to {'score', 'explanation', 'highlighted_terms',
+            'highlighted_terms_original'}. Tracks whose call failed or that the model
+            skipped are missing - callers fall back to the per-track methods for them.
+        """
+        valid_tracks = [track for track in tracks_data if track.get('lyrics')]
+        if not valid_tracks:
+            return {}
+        
+        max_chars, batches = self._plan_analysis_batches(valid_tracks, user_prompt, token_budget, max(1, max_calls))
+        if DEBUG_MODE:
+            print(f"    📊 Analyzing {len(valid_tracks)} tracks in {len(batches)} call(s) "
+                  f"({max_chars}-char lyrics previews)")
+        
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            futures = {executor.submit(self._analyze_batch, batch, user_prompt, max_chars): batch for batch in batches}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results.update(future.result())
+                except Exception as e:
+                    print(f"    ❌ Error in combined lyrics analysis ({len(futures[future])} tracks): {e}")
+        
+        if DEBUG_MODE:
+            print(f"    ✅ Analyzed {len(results)}/{len(valid_tracks)} tracks")
+        return results
@@ -0,0 +1,74 @@
+"""
+Benchmark: per-key cache calls vs. the batched CacheManager API
+
+Run from the backend directory against a scratch Redis (keys are written under bench:batch:*):
+    REDIS_DB=15 python benchmarks/bench_cache_batching.py
+    REDIS_DB=15 python benchmarks/bench_cache_batching.py --threads 8   # concurrent requests
+
+Each "request" reads N keys the way a pipeline stage does (7 resolved tracks, 10 lyrics
+entries, 10 explanations) - once with a get/set/delete per key, once with get_many /
+set_many / delete_many - and reports mean and p99 wall-clock per stage. With --threads,
+that many requests run at once, all sharing the process's connection pool.
+"""
+
+import os
+import sys
+import time
+import argparse
+import concurrent.futures
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import redis_cache  # noqa: E402
+from redis_cache import CacheManager  # noqa: E402
+
+STAGES = {"tracks": 7, "lyrics": 10, "explanations": 10}
+VALUE = {"explanation": "x" * 300, "highlighted_terms": ["rain", "night"], "score": 4}
+
+
+def per_key(keys):
+    for key in keys:
+        CacheManager.set(key, VALUE, 60)
+    for key in keys:
+        CacheManager.get(key)
+    for key in keys:
+        CacheManager.delete(key)
+
+
+def batched(keys):
+    CacheManager.set_many({key: VALUE for key in keys}, 60)
+    CacheManager.get_many(keys)
+    CacheManager.delete_many(keys)
+
+
+def run(flow, stage, count, requests, threads):
+    def one(request):
+        keys = [f"bench:batch:{stage}:{request}:{i}" for i in range(count)]
+        start = time.perf_counter()
+        flow(keys)
+        return time.perf_counter() - start
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        samples = sorted(executor.map(one, range(requests)))
+    return sum(samples) / len(samples) * 1000, samples[min(len(samples) - 1, int(0.99 * len(samples)))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(__doc__ or "\n").split("\n")[1])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    if not redis_cache.redis_available():
+        sys.exit("Redis is not reachable (REDIS_HOST/REDIS_PORT/REDIS_DB)")
+
+    print(f"{args.requests} requests, {args.threads} thread(s), pool size {redis_cache.REDIS_MAX_CONNECTIONS}\n")
+    print(f"{'stage':<13} {'keys':>5} {'flow':<9} {'mean ms':>9} {'p99 ms':>9}")
+    for stage, count in STAGES.items():
+        for label, flow in (("per-key", per_key), ("batched", batched)):
+            mean, p99 = run(flow, stage, count, args.requests, args.threads)
+            print(f"{stage:<13} {count:>5} {label:<9} {mean:9.2f} {p99:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
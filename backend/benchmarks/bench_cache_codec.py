@@ -0,0 +1,153 @@
+"""
+Benchmark: cached payload codecs (cache_codec) vs. the old json.dumps text
+
+Run from the backend directory:
+    python benchmarks/bench_cache_codec.py            # sizes + encode/decode throughput
+    python benchmarks/bench_cache_codec.py --redis    # also MEMORY USAGE per key (uses REDIS_DB)
+
+Payloads mirror what the app caches: a resolved Spotify track (album image array,
+artists, urls), a lyrics store entry (original + translation), a user profile and a full
+7-track recommendation. Every installed codec is measured with and without zstd
+compression; codecs or zstandard that aren't installed are skipped.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import cache_codec  # noqa: E402
+from cache_codec import encode, decode, CODEC_NAMES  # noqa: E402
+
+VERSE = (
+    "I walked along the river when the city lights were low\n"
+    "Counting every window where I used to see you glow\n"
+    "And the rain kept on falling like it had somewhere to be\n"
+    "Every drop a little letter that you never sent to me\n"
+)
+VERSE_ES = (
+    "Caminé junto al río cuando las luces de la ciudad estaban bajas\n"
+    "Contando cada ventana donde solía verte brillar\n"
+    "Y la lluvia seguía cayendo como si tuviera adónde ir\n"
+    "Cada gota una pequeña carta que nunca me enviaste\n"
+)
+
+
+def spotify_track(i):
+    return {
+        "id": f"4uLU6hMCjMI75M1A2tKUQ{i}",
+        "name": f"River Lights {i}",
+        "artist": "The Night Owls",
+        "artists": [{"id": "0OdUWJ0sBjDrqHygGUXeCF", "name": "The Night Owls",
+                     "uri": "spotify:artist:0OdUWJ0sBjDrqHygGUXeCF"}],
+        "album": {
+            "id": "6akEvsycLGftJxYudPjmqK",
+            "name": "After Hours",
+            "release_date": "2020-03-20",
+            "images": [
+                {"url": f"https://i.scdn.co/image/ab67616d0000b273{i:024x}", "height": 640, "width": 640},
+                {"url": f"https://i.scdn.co/image/ab67616d00001e02{i:024x}", "height": 300, "width": 300},
+                {"url": f"https://i.scdn.co/image/ab67616d00004851{i:024x}", "height": 64, "width": 64},
+            ],
+        },
+        "duration_ms": 200040 + i,
+        "popularity": 87,
+        "explicit": False,
+        "preview_url": None,
+        "uri": f"spotify:track:4uLU6hMCjMI75M1A2tKUQ{i}",
+        "external_urls": {"spotify": f"https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQ{i}"},
+        "match_score": 0.2137,
+    }
+
+
+def payloads():
+    lyrics_entry = {"original": VERSE_ES * 8, "translated": VERSE * 8, "language": "es"}
+    profile = {
+        "genres": ["indie pop", "dream pop", "bedroom pop", "shoegaze", "chillwave"] * 4,
+        "top_artists": [{"name": f"Artist {i}", "popularity": 60 + i} for i in range(10)],
+        "top_tracks": [{"name": f"Track {i}", "artist": f"Artist {i}"} for i in range(10)],
+        "audio_features_avg": {},
+    }
+    recommendation = {
+        "intro": "Here are some rainy-night songs for you.",
+        "tracks": [
+            {**spotify_track(i), "lyrics": VERSE * 6, "lyrics_original": None, "lyrics_score": 4,
+             "lyrics_explanation": "The lyrics trace a walk through a rainy city at night.",
+             "highlighted_terms": ["rain kept on falling", "city lights"]}
+            for i in range(7)
+        ],
+    }
+    return {
+        "track": spotify_track(1),
+        "lyrics": lyrics_entry,
+        "profile": profile,
+        "recommendation": recommendation,
+    }
+
+
+def variants():
+    """(label, encode fn) for the legacy text format and every installed codec, +/- zstd"""
+    yield "json text (old)", lambda value: json.dumps(value, default=str).encode('utf-8')
+    for codec in sorted(cache_codec._ENCODERS):
+        yield CODEC_NAMES[codec], (lambda value, codec=codec: _encode_with(codec, value, 0))
+        if cache_codec.zstandard is not None:
+            yield CODEC_NAMES[codec] + "+zstd", (lambda value, codec=codec: _encode_with(codec, value, 1))
+
+
+def _encode_with(codec, value, compress_above):
+    saved = cache_codec.CACHE_COMPRESS_THRESHOLD
+    cache_codec.CACHE_COMPRESS_THRESHOLD = compress_above
+    try:
+        return encode(value, codec)
+    finally:
+        cache_codec.CACHE_COMPRESS_THRESHOLD = saved
+
+
+def timed(fn, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - start) / repeat * 1e6  # µs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(__doc__ or "\n").split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--redis", action="store_true", help="measure MEMORY USAGE in Redis too")
+    args = parser.parse_args()
+
+    client = None
+    if args.redis:
+        import redis_cache
+        if not redis_cache.redis_available():
+            sys.exit("Redis is not reachable (REDIS_HOST/REDIS_PORT/REDIS_DB)")
+        client = redis_cache.redis_bytes
+
+    print(f"codecs installed: {cache_codec.codec_info()['available']}, "
+          f"zstd: {'yes' if cache_codec.zstandard is not None else 'no'}\n")
+    header = f"{'payload':<15} {'format':<16} {'bytes':>8} {'vs old':>7} {'encode µs':>10} {'decode µs':>10}"
+    print(header + (f" {'redis bytes':>12}" if client else ""))
+    for name, value in payloads().items():
+        baseline = None
+        for label, encoder in variants():
+            data = encoder(value)
+            baseline = baseline or len(data)
+            assert decode(data) == json.loads(json.dumps(value, default=str))
+            encode_us = timed(encoder, value, args.repeat)
+            decode_us = timed(decode, data, args.repeat)
+            row = (f"{name:<15} {label:<16} {len(data):>8} {len(data) / baseline:>6.0%} "
+                   f"{encode_us:>10.1f} {decode_us:>10.1f}")
+            if client:
+                key = f"bench:codec:{name}:{label}"
+                client.set(key, data)
+                row += f" {client.memory_usage(key):>12}"
+                client.delete(key)
+            print(row)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: cache invalidation with KEYS vs. SCAN/UNLINK vs. tag sets
+
+Run from the backend directory against a scratch Redis (it FLUSHes the selected db):
+    REDIS_DB=15 python benchmarks/bench_cache_invalidation.py --keys 2000000
+
+Fills the db with --keys lyrics-explanation-sized entries spread over 10k tracks (each
+registered in its track's tag set), then invalidates one track's entries three ways:
+  keys     - the old invalidate_pattern: KEYS pattern + DEL
+  scan     - CacheManager.invalidate_pattern: SCAN + UNLINK in batches
+  tags     - CacheManager.invalidate_tags: SSCAN of one tag set + UNLINK
+While each runs, a second client issues GETs in a loop; their p50/p99/max latency shows
+how long other requests are stalled (KEYS holds the single Redis thread for the whole walk).
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import redis  # noqa: E402
+
+import redis_cache  # noqa: E402
+from redis_cache import CacheManager, track_tag, TAG_PREFIX  # noqa: E402
+
+TRACKS = 10_000
+VALUE = '{"explanation": "' + "x" * 300 + '", "highlighted_terms": ["rain", "night"], "score": 4}'
+
+
+def populate(client, total):
+    print(f"Writing {total:,} keys...")
+    start = time.perf_counter()
+    pipe = client.pipeline(transaction=False)
+    for i in range(total):
+        track_id = f"t{i % TRACKS}"
+        key = f"lyrics_exp:{track_id}:{i:064x}"
+        pipe.setex(key, 3600, VALUE)
+        pipe.zadd(f"{TAG_PREFIX}{track_tag(track_id)}", {key: time.time() + 3600})
+        if i % 10_000 == 9_999:
+            pipe.execute()
+    pipe.execute()
+    print(f"  done in {time.perf_counter() - start:.1f}s, dbsize={client.dbsize():,}\n")
+
+
+class GetProbe:
+    """Issues GETs from its own connection and records their latency"""
+
+    def __init__(self, client):
+        self.client = client
+        self.samples = []
+        self.running = False
+
+    def _loop(self):
+        while self.running:
+            start = time.perf_counter()
+            self.client.get(f"lyrics_exp:t{random.randrange(TRACKS)}:{0:064x}")
+            self.samples.append(time.perf_counter() - start)
+
+    def __enter__(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+
+    def summary(self):
+        samples = sorted(self.samples) or [0.0]
+        pick = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))] * 1000  # noqa: E731
+        return f"{pick(0.5):8.2f} {pick(0.99):8.2f} {samples[-1] * 1000:9.2f}"
+
+
+def legacy_invalidate(client, pattern):
+    keys = client.keys(pattern)
+    return client.delete(*keys) if keys else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(__doc__ or "\n").split("\n")[1])
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--skip-populate", action="store_true")
+    args = parser.parse_args()
+
+    if not redis_cache.redis_available():
+        sys.exit("Redis is not reachable (REDIS_HOST/REDIS_PORT/REDIS_DB)")
+    client = redis_cache.redis_client
+    probe_client = redis.Redis(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        db=int(os.getenv('REDIS_DB', 0)),
+        password=os.getenv('REDIS_PASSWORD', None)
+    )
+    if not args.skip_populate:
+        client.flushdb()
+        populate(client, args.keys)
+
+    print(f"{'method':<8} {'deleted':>8} {'took ms':>10}   {'GET p50':>8} {'p99':>8} {'max ms':>9}")
+    cases = (
+        ("keys", lambda: legacy_invalidate(client, "lyrics_exp:t1:*")),
+        ("scan", lambda: CacheManager.invalidate_pattern("lyrics_exp:t2:*")),
+        ("tags", lambda: CacheManager.invalidate_tags(track_tag("t3"))),
+    )
+    for label, invalidate in cases:
+        with GetProbe(probe_client) as probe:
+            start = time.perf_counter()
+            deleted = invalidate()
+            took = (time.perf_counter() - start) * 1000
+        print(f"{label:<8} {deleted:>8} {took:10.1f}   {probe.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark: tolerant LLM JSON parsing (llm_json) vs. the old regex cascade
+
+Run from the backend directory:
+    python benchmarks/bench_llm_json.py
+
+The corpus reproduces the malformed recommendation / explanation responses the
+old cascade in dj_recommend was written for (unescaped quotes in the intro, chatter
+and markdown fences, trailing commas, raw newlines, responses cut off at max_tokens,
+echoed prompt placeholders). Reports, per parser: how many responses yield a usable
+object and the mean parse time, plus how both scale on large unterminated output.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from llm_json import parse_llm_json, LLMJSONError  # noqa: E402
+
+SONGS = ', '.join(
+    f'{{"title": "Song {i}", "artist": "Artist {i}"}}' for i in range(1, 8)
+)
+
+CORPUS = {
+    "valid": f'{{"intro": "Here are some great tracks for you!", "songs": [{SONGS}]}}',
+    "markdown_fence": f'```json\n{{"intro": "Fresh picks!", "songs": [{SONGS}]}}\n```',
+    "chatter_around": f'Sure! Here are your songs:\n{{"intro": "Enjoy!", "songs": [{SONGS}]}}\nLet me know if you want more.',
+    "unescaped_quotes_intro": f'{{"intro": "Get ready for "Blinding Lights" and a "feel good" vibe!", "songs": [{SONGS}]}}',
+    "raw_newlines": '{"intro": "Line one\nLine two", "songs": [' + SONGS + ']}',
+    "trailing_commas": f'{{"intro": "Vibes", "songs": [{SONGS},],}}',
+    "missing_comma_between_songs": '{"intro": "Vibes", "songs": [{"title": "A", "artist": "B"} {"title": "C", "artist": "D"}]}',
+    "truncated_in_song": f'{{"intro": "Cut short", "songs": [{SONGS[:-40]}',
+    "truncated_in_intro": '{"intro": "This intro never finish',
+    "placeholder_echo": f'{{"intro": "Mix", "songs": [{SONGS}, ... (exactly 7 songs)]}}',
+    "python_literals": '{"explanation": "Fits the mood", "highlighted_terms": ["rain", "night"], "explicit": False}',
+    "explanation_inner_quotes": '{"explanation": "The chorus "I\'m on fire" matches your request", "highlighted_terms": ["fire", "burning"]}',
+    "two_objects": '{"intro": "First", "songs": []}\n{"intro": "Second", "songs": []}',
+}
+
+
+def legacy_parse(text):
+    """The cascade from dj_recommend before llm_json (json.loads -> greedy regex -> intro re.sub -> manual)"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    json_match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not json_match:
+        raise ValueError("no JSON")
+    json_str = json_match.group()
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        pass
+    try:
+        fixed_json = re.sub(
+            r'"intro":\s*"([^"]*(?:\\.[^"]*)*)"',
+            lambda m: f'"intro": {json.dumps(m.group(1))}',
+            json_str,
+            flags=re.DOTALL
+        )
+        return json.loads(fixed_json)
+    except Exception:
+        pass
+    intro_match = re.search(r'"intro":\s*"((?:[^"\\]|\\.|"(?!"))*(?:"|$))', json_str, re.DOTALL)
+    songs_match = re.search(r'"songs":\s*\[(.*?)\]', json_str, re.DOTALL)
+    if intro_match and songs_match:
+        intro = intro_match.group(1).replace('\\"', '"').replace('\\n', '\n').strip('"')
+        try:
+            return {"intro": intro, "songs": json.loads('[' + songs_match.group(1) + ']')}
+        except Exception:
+            return {"intro": intro, "songs": []}
+    raise ValueError("could not parse")
+
+
+def new_parse(text):
+    return parse_llm_json(text)
+
+
+def is_usable(text, result):
+    """Usable = a dict that keeps the songs (when the response had any) or else the intro/explanation"""
+    if not isinstance(result, dict):
+        return False
+    if '"songs": [{' in text:
+        return any(isinstance(song, dict) and song.get('title') for song in result.get('songs', []))
+    return bool(result.get('intro')) or bool(result.get('explanation'))
+
+
+def time_parser(parser, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            parser(text)
+        except (ValueError, LLMJSONError):
+            pass
+    return (time.perf_counter() - start) / repeat * 1e6  # µs
+
+
+def main(repeat=500):
+    # Silence the "repaired" log line while benchmarking
+    devnull = open(os.devnull, 'w')
+
+    print(f"{'case':<30} {'legacy':>12} {'llm_json':>12}   legacy µs   llm_json µs")
+    totals = {'legacy': 0, 'new': 0}
+    for name, text in CORPUS.items():
+        row = {}
+        for label, parser in (('legacy', legacy_parse), ('new', new_parse)):
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                ok = is_usable(text, parser(text))
+            except (ValueError, LLMJSONError):
+                ok = False
+            micros = time_parser(parser, text, repeat)
+            sys.stdout = stdout
+            totals[label] += ok
+            row[label] = (ok, micros)
+        print(f"{name:<30} {'ok' if row['legacy'][0] else 'FAIL':>12} {'ok' if row['new'][0] else 'FAIL':>12}"
+              f"   {row['legacy'][1]:9.1f}   {row['new'][1]:11.1f}")
+    print(f"\nUsable: legacy {totals['legacy']}/{len(CORPUS)}, llm_json {totals['new']}/{len(CORPUS)}")
+
+    # Scaling on long output that never closes its object (worst case for greedy .* with DOTALL)
+    print(f"\n{'unterminated size':<30} {'legacy ms':>12} {'llm_json ms':>12}")
+    for size in (10_000, 50_000, 200_000):
+        text = '{"intro": "' + ('la ' * (size // 3)) + '", "songs": [{"title": "A", "artist": "B"}'
+        stdout, sys.stdout = sys.stdout, devnull
+        legacy_ms = time_parser(legacy_parse, text, 5) / 1000
+        new_ms = time_parser(new_parse, text, 5) / 1000
+        sys.stdout = stdout
+        print(f"{size:<30} {legacy_ms:12.2f} {new_ms:12.2f}")
+
+    devnull.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Benchmark: combined lyrics analysis (batch_analyze_lyrics) vs. the per-track fan-out
+
+Run from the backend directory:
+    python benchmarks/bench_lyrics_analysis.py           # modeled Groq latency, no API calls
+    python benchmarks/bench_lyrics_analysis.py --live    # real Groq calls (needs GROQ_API_KEY)
+
+Both modes run the two flows dj_recommend can use after lyrics are fetched, on 10
+candidate tracks (3 of them translated) of which 7 are selected:
+  fan-out  - batch_score_lyrics_relevance on every candidate, then an explanation call per
+             selected track, 5 at a time (original-language terms via lyrics_alignment)
+  combined - batch_analyze_lyrics on every candidate (1-2 calls under the token budget)
+
+Reports Groq calls, tokens reserved against the rate limiter (TPM), tokens used, the
+wall-clock latency of the stage and how many requests per minute the 70b model's limits
+(rate_limiter.MODEL_LIMITS) sustain at that cost. The modeled mode replaces the Groq
+client with a fake that sleeps for a per-call overhead plus completion tokens / model
+throughput (scaled down by --time-scale) and answers with well-formed JSON, so the real
+prompts, batching and thread pools are what's measured.
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import concurrent.futures
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from ai_service import GroqRecommendationService  # noqa: E402
+from rate_limiter import MODEL_LIMITS  # noqa: E402
+from lyrics_alignment import align_highlighted_terms  # noqa: E402
+from token_usage import token_usage, approx_message_tokens  # noqa: E402
+
+USER_PROMPT = "sad songs about rainy nights and missing someone"
+
+# Modeled Groq behaviour: per-call overhead (network + queue + time to first token) and decode speed
+CALL_OVERHEAD_SECONDS = 0.35
+TOKENS_PER_SECOND = {"llama-3.1-8b-instant": 750, "llama-3.3-70b-versatile": 275}
+# Completion tokens the fake returns per track (close to what Groq produced in production logs)
+FAKE_COMPLETION = {"batch_scoring": 6, "explanations": 95, "lyrics_analysis": 110}
+
+ENGLISH_VERSE = (
+    "Rain on the window, I can't sleep tonight\n"
+    "Your voice in the thunder, fading out of sight\n"
+    "Streetlights are crying on an empty avenue\n"
+    "Every little raindrop is a memory of you\n"
+)
+SPANISH_VERSE = (
+    "Lluvia en la ventana, no puedo dormir\n"
+    "Tu voz en el trueno se pierde sin ti\n"
+    "Las luces lloran en la avenida vacía\n"
+    "Cada gota de lluvia es un recuerdo tuyo\n"
+)
+
+
+def make_tracks(count=10, translated=3):
+    tracks = []
+    for i in range(count):
+        lyrics = (ENGLISH_VERSE * 6)[: 900 + 40 * i]
+        track = {
+            'track_id': f"track{i}",
+            'track_name': f"Song {i}",
+            'artist_name': f"Artist {i}",
+            'lyrics': lyrics,
+            'lyrics_original': None,
+            'lyrics_language': 'en'
+        }
+        if i < translated:
+            track['lyrics_original'] = (SPANISH_VERSE * 6)[: 900 + 40 * i]
+            track['lyrics_language'] = 'es'
+        tracks.append(track)
+    return tracks
+
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class ModeledGroq:
+    """Stands in for GroqRecommendationService.complete: records the call and sleeps a modeled latency"""
+
+    def __init__(self, time_scale):
+        self.time_scale = time_scale
+        self.calls = []
+
+    def complete(self, endpoint, model, messages, expected_completion=None, priority=None, **kwargs):
+        prompt = messages[-1]['content']
+        estimate = token_usage.estimate(endpoint, messages, kwargs.get('max_tokens'), expected_completion)
+        numbers = re.findall(r'^Track (\d+):', prompt, re.M)
+        if endpoint == "batch_scoring":
+            content = "{" + ", ".join(f'"{n}": 4' for n in numbers) + "}"
+            completion = FAKE_COMPLETION[endpoint] * len(numbers)
+        elif endpoint == "lyrics_analysis":
+            content = "{" + ", ".join(
+                f'"{n}": {{"score": 4, "explanation": "Rain and loss run through every line.", '
+                f'"highlighted_terms": ["Rain on the window", "memory of you"]}}'
+                for n in numbers
+            ) + "}"
+            completion = FAKE_COMPLETION[endpoint] * len(numbers)
+        else:
+            content = '{"explanation": "Rain and loss run through every line.", "highlighted_terms": ["Rain", "tonight"]}'
+            completion = FAKE_COMPLETION[endpoint]
+
+        prompt_tokens = approx_message_tokens(messages)
+        latency = CALL_OVERHEAD_SECONDS + completion / TOKENS_PER_SECOND.get(model, 275)
+        time.sleep(latency * self.time_scale)
+        self.calls.append({
+            'endpoint': endpoint,
+            'model': model,
+            'reserved': estimate.total,
+            'used': prompt_tokens + completion
+        })
+        return _Obj(choices=[_Obj(message=_Obj(content=content))])
+
+
+def fanout(service, tracks, selected=7):
+    scores = service.batch_score_lyrics_relevance(tracks, USER_PROMPT)
+
+    def explain(track):
+        _, terms = service.explain_lyrics_relevance(track['lyrics'], track['track_name'], track['artist_name'],
+                                                    USER_PROMPT)
+        if track.get('lyrics_original') and track['lyrics_original'] != track['lyrics']:
+            align_highlighted_terms(terms or [], track['lyrics'], track['lyrics_original'])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+        list(executor.map(explain, tracks[:selected]))
+    return scores
+
+
+def combined(service, tracks, selected=7):
+    return service.batch_analyze_lyrics(tracks, USER_PROMPT)
+
+
+def run_modeled(runs, time_scale):
+    tracks = make_tracks()
+    service = GroqRecommendationService.__new__(GroqRecommendationService)
+    service.model = "llama-3.3-70b-versatile"
+    service.lyrics_model = "llama-3.1-8b-instant"
+
+    print(f"{len(tracks)} candidates ({sum(1 for t in tracks if t['lyrics_original'])} translated), 7 selected, "
+          f"{runs} runs, modeled latency\n")
+    rpm, tpm = MODEL_LIMITS[service.model]
+    print(f"{'flow':<10} {'calls':>6} {'70b calls':>10} {'reserved tok':>13} {'used tok':>9} {'latency s':>10} {'req/min (70b)':>14}")
+    for label, flow in (("fan-out", fanout), ("combined", combined)):
+        fake = ModeledGroq(time_scale)
+        service.complete = fake.complete
+        elapsed = 0.0
+        for _ in range(runs):
+            start = time.perf_counter()
+            flow(service, tracks)
+            elapsed += time.perf_counter() - start
+        calls = fake.calls
+        large_calls = [c for c in calls if c['model'] == service.model]
+        large_tokens = sum(c['reserved'] for c in large_calls) / runs
+        sustained = min(rpm / (len(large_calls) / runs), tpm / large_tokens) if large_calls else float('inf')
+        print(f"{label:<10} {len(calls) / runs:6.1f} "
+              f"{len(large_calls) / runs:10.1f} "
+              f"{sum(c['reserved'] for c in calls) / runs:13.0f} "
+              f"{sum(c['used'] for c in calls) / runs:9.0f} "
+              f"{elapsed / runs / time_scale:10.2f} "
+              f"{sustained:14.1f}")
+
+
+def run_live(runs):
+    service = GroqRecommendationService()
+    tracks = make_tracks()
+    print(f"{'flow':<10} {'latency s':>10}")
+    for label, flow in (("fan-out", fanout), ("combined", combined)):
+        elapsed = 0.0
+        for _ in range(runs):
+            start = time.perf_counter()
+            flow(service, tracks)
+            elapsed += time.perf_counter() - start
+        print(f"{label:<10} {elapsed / runs:10.2f}")
+
+    print("\nTokens by endpoint (from response.usage):")
+    for endpoint, stats in token_usage.stats().items():
+        total = stats['total_tokens']
+        print(f"  {endpoint:<16} calls={stats['calls']:<4} tokens={total['sum']:<7} "
+              f"avg/call={total['avg']}  reserved/actual={stats['reserved_vs_actual']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=(__doc__ or "\n").split("\n")[1])
+    parser.add_argument("--live", action="store_true", help="call Groq instead of the latency model")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--time-scale", type=float, default=0.1, help="modeled sleep multiplier")
+    args = parser.parse_args()
+    if args.live:
+        run_live(args.runs)
+    else:
+        run_modeled(args.runs, args.time_scale)
@@ -0,0 +1,164 @@
+"""
+Binary serialization for cached payloads
+Values are encoded with a compact codec (msgpack, or orjson) and, above a size threshold,
+compressed with zstd. Every payload starts with a header byte naming its codec and
+compression, so readers decode any format - including plain JSON text written before
+this module existed (no header) - and the writer's codec can change without a flush.
+
+Header byte: low 4 bits = codec id, 0x10 = zstd-compressed body.
+
+Rolling out a new codec: deploy with CACHE_CODEC=json until every worker runs a version
+that can read it, then switch CACHE_CODEC (older workers can't read binary payloads).
+
+Configuration (environment variables):
+    CACHE_CODEC                 auto | msgpack | orjson | json (default: auto - best installed)
+    CACHE_COMPRESS_THRESHOLD    Compress encoded payloads larger than this many bytes (default: 1024, 0 = never)
+    CACHE_COMPRESS_LEVEL        zstd level (default: 3)
+"""
+
+import os
+import json
+import threading
+from typing import Any, Callable, Dict, Optional, cast
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CACHE_COMPRESS_THRESHOLD = int(os.getenv("CACHE_COMPRESS_THRESHOLD", 1024))
+CACHE_COMPRESS_LEVEL = int(os.getenv("CACHE_COMPRESS_LEVEL", 3))
+
+CODEC_JSON = 1
+CODEC_MSGPACK = 2
+CODEC_ORJSON = 3
+CODEC_NAMES = {CODEC_JSON: "json", CODEC_MSGPACK: "msgpack", CODEC_ORJSON: "orjson"}
+
+COMPRESSED_FLAG = 0x10
+_CODEC_MASK = 0x0F
+
+
+class CodecError(ValueError):
+    """Payload can't be decoded (unknown header or codec not installed)"""
+
+
+def _json_encode(value: Any) -> bytes:
+    return json.dumps(value, default=str, separators=(',', ':')).encode('utf-8')
+
+
+def _json_decode(data: bytes) -> Any:
+    return json.loads(data)
+
+
+def _msgpack_encode(value: Any) -> bytes:
+    assert msgpack is not None
+    return cast(bytes, msgpack.packb(value, default=str, use_bin_type=True))
+
+
+def _msgpack_decode(data: bytes) -> Any:
+    assert msgpack is not None
+    # Non-string map keys are allowed (JSON would have turned them into strings)
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def _orjson_encode(value: Any) -> bytes:
+    assert orjson is not None
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+_ENCODERS: Dict[int, Callable[[Any], bytes]] = {CODEC_JSON: _json_encode}
+_DECODERS: Dict[int, Callable[[bytes], Any]] = {CODEC_JSON: _json_decode}
+if msgpack is not None:
+    _ENCODERS[CODEC_MSGPACK] = _msgpack_encode
+    _DECODERS[CODEC_MSGPACK] = _msgpack_decode
+if orjson is not None:
+    _ENCODERS[CODEC_ORJSON] = _orjson_encode
+    _DECODERS[CODEC_ORJSON] = orjson.loads
+
+
+def _resolve_codec(name: str) -> int:
+    name = name.lower()
+    if name == "auto":
+        for codec in (CODEC_MSGPACK, CODEC_ORJSON):
+            if codec in _ENCODERS:
+                return codec
+        return CODEC_JSON
+    codec = next((codec for codec, codec_name in CODEC_NAMES.items() if codec_name == name), None)
+    if codec is None or codec not in _ENCODERS:
+        print(f"⚠️  Cache codec '{name}' not available - falling back to json")
+        return CODEC_JSON
+    return codec
+
+
+CACHE_CODEC = _resolve_codec(os.getenv("CACHE_CODEC", "auto"))
+
+# zstd (de)compressor objects aren't safe to share between threads
+_zstd = threading.local()
+
+
+def _compressor():
+    assert zstandard is not None
+    if not hasattr(_zstd, 'compressor'):
+        _zstd.compressor = zstandard.ZstdCompressor(level=CACHE_COMPRESS_LEVEL)
+    return _zstd.compressor
+
+
+def _decompressor():
+    assert zstandard is not None
+    if not hasattr(_zstd, 'decompressor'):
+        _zstd.decompressor = zstandard.ZstdDecompressor()
+    return _zstd.decompressor
+
+
+def encode(value: Any, codec: Optional[int] = None) -> bytes:
+    """Header byte + encoded value (zstd-compressed when large and zstandard is installed)"""
+    codec = codec or CACHE_CODEC
+    body = _ENCODERS[codec](value)
+    header = codec
+    if zstandard is not None and CACHE_COMPRESS_THRESHOLD and len(body) > CACHE_COMPRESS_THRESHOLD:
+        compressed = _compressor().compress(body)
+        if len(compressed) < len(body):
+            body = compressed
+            header |= COMPRESSED_FLAG
+    return bytes((header,)) + body
+
+
+def decode(data) -> Any:
+    """Decode a payload from encode() - or legacy JSON text without a header"""
+    if isinstance(data, str):
+        return json.loads(data)
+    if not data:
+        raise CodecError("empty payload")
+    header = data[0]
+    codec = header & _CODEC_MASK
+    if header & ~(_CODEC_MASK | COMPRESSED_FLAG) or codec not in CODEC_NAMES:
+        # Header bytes are all < 0x20, which never starts JSON text
+        return json.loads(data)
+    decoder = _DECODERS.get(codec)
+    if decoder is None:
+        raise CodecError(f"payload uses {CODEC_NAMES[codec]}, which is not installed")
+    body = data[1:]
+    if header & COMPRESSED_FLAG:
+        if zstandard is None:
+            raise CodecError("payload is zstd-compressed but zstandard is not installed")
+        body = _decompressor().decompress(body)
+    return decoder(body)
+
+
+def codec_info() -> dict:
+    return {
+        "codec": CODEC_NAMES[CACHE_CODEC],
+        "available": sorted(CODEC_NAMES[codec] for codec in _ENCODERS),
+        "compression": "zstd" if zstandard is not None and CACHE_COMPRESS_THRESHOLD else None,
+        "compress_threshold": CACHE_COMPRESS_THRESHOLD
+    }
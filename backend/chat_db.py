@@ -3,7 +3,7 @@ Database operations for chat messages and likes
 """
 import os
 import json
-import psycopg2
+from db_pool import get_pool
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from pathlib import Path
@@ -36,9 +36,8 @@ class ChatDatabase:
             return {col: False for col in column_names}
     
     def _get_connection(self):
-        conn = psycopg2.connect(self.db_url)
-        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED)
-        return conn
+        """Borrow a pooled connection (use as `with self._get_connection() as conn:`)"""
+        return get_pool(self.db_url).connection()
     
     # === CHAT MESSAGES ===
     
@@ -1,6 +1,9 @@
 import os
 import json
-import psycopg2
+import time
+import threading
+from db_pool import get_pool
+from redis_cache import TieredCache
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from pathlib import Path
@@ -12,16 +15,22 @@ load_dotenv(env_path)
 # Get Neon database URL from environment
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+# Expired sessions are swept by a background reaper instead of on every read
+SESSION_REAP_INTERVAL = int(os.getenv('SESSION_REAP_INTERVAL', 300))  # seconds
+SESSION_REAP_BATCH_SIZE = int(os.getenv('SESSION_REAP_BATCH_SIZE', 1000))
+
+# Short-lived in-process copy of session tokens, so hot reads skip the database
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 30))  # seconds
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', 10000))
+
 class NeonDBHandler:
     def __init__(self, db_url):
         self.db_url = db_url
         self._init_db()
     
     def _get_connection(self):
-        conn = psycopg2.connect(self.db_url)
-        # Set to READ COMMITTED to ensure we see committed data
-        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED)
-        return conn
+        """Borrow a pooled connection (use as `with self._get_connection() as conn:`)"""
+        return get_pool(self.db_url).connection()
     
     def _init_db(self):
         """Initialize database tables"""
@@ -80,7 +89,8 @@ class NeonDBHandler:
                     
                     # Test read immediately to verify it was stored
                     cur.execute('SELECT COUNT(*) FROM sessions WHERE session_id = %s', (session_id,))
-                    count = cur.fetchone()[0]
+                    row = cur.fetchone()
+                    count = row[0] if row is not None else 0
                     print(f"DEBUG: Verification query - sessions with this ID: {count}")
                     
         except Exception as e:
@@ -90,16 +100,14 @@ class NeonDBHandler:
             raise
     
     def get_token(self, session_id):
-        """Get token from Neon database"""
+        """Get token from Neon database (read-only primary key lookup, expired rows are ignored)"""
         try:
-            print(f"DEBUG: About to get token for {session_id}")
-            
             with self._get_connection() as conn:
                 with conn.cursor() as cur:
-                    # Clean up expired sessions
-                    cur.execute("DELETE FROM sessions WHERE expires_at < NOW()")
-                    
-                    cur.execute('SELECT token_info FROM sessions WHERE session_id = %s', (session_id,))
+                    cur.execute(
+                        'SELECT token_info FROM sessions WHERE session_id = %s AND expires_at > NOW()',
+                        (session_id,)
+                    )
                     row = cur.fetchone()
                     
                     if row:
@@ -123,17 +131,116 @@ class NeonDBHandler:
                     conn.commit()
         except Exception as e:
             print(f"Error deleting token: {e}")
+    
+    def reap_expired_sessions(self, batch_size=SESSION_REAP_BATCH_SIZE):
+        """
+        Delete expired sessions in small batches (one short transaction each),
+        so the sweep never holds locks on a large part of the sessions table.
+        
+        Returns:
+            Number of sessions deleted
+        """
+        total_deleted = 0
+        while True:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute('''
+                        DELETE FROM sessions
+                        WHERE session_id IN (
+                            SELECT session_id FROM sessions
+                            WHERE expires_at < NOW()
+                            LIMIT %s
+                            FOR UPDATE SKIP LOCKED
+                        )
+                    ''', (batch_size,))
+                    deleted = cur.rowcount
+                    conn.commit()
+            total_deleted += deleted
+            if deleted < batch_size:
+                return total_deleted
+
+
+class SessionReaper:
+    """Background thread that periodically deletes expired sessions"""
+    
+    def __init__(self, handler, interval=SESSION_REAP_INTERVAL):
+        self.handler = handler
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        
+        # Metrics
+        self.runs = 0
+        self.total_deleted = 0
+        self.last_run_at = None
+        self.last_duration_ms = None
+        self.last_error = None
+    
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="session-reaper", daemon=True)
+        self._thread.start()
+        print(f"🧹 Session reaper started (every {self.interval}s, batches of {SESSION_REAP_BATCH_SIZE})")
+    
+    def stop(self):
+        self._stop.set()
+    
+    def run_once(self):
+        start = time.monotonic()
+        try:
+            deleted = self.handler.reap_expired_sessions()
+            self.total_deleted += deleted
+            self.last_error = None
+            if deleted:
+                print(f"🧹 Reaped {deleted} expired sessions")
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Session reaper error: {e}")
+        finally:
+            self.runs += 1
+            self.last_run_at = time.time()
+            self.last_duration_ms = round((time.monotonic() - start) * 1000, 2)
+    
+    def _run(self):
+        # Event.wait doubles as an interruptible sleep
+        while not self._stop.wait(self.interval):
+            self.run_once()
+    
+    def stats(self):
+        return {
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "total_deleted": self.total_deleted,
+            "last_run_at": self.last_run_at,
+            "last_duration_ms": self.last_duration_ms,
+            "last_error": self.last_error
+        }
 
 # Create global database handler if DATABASE_URL is set
 # Fallback to in-memory storage if database is unavailable
 token_cache = {}
 db_handler = None
+session_reaper = None
+
+# Fronts db_handler.get_token; entries are replaced by store_token and dropped by delete_token
+# (in every worker - tokens are never written to Redis)
+_token_read_cache = TieredCache(
+    "session_token",
+    ttl=TOKEN_CACHE_TTL,
+    local_max_entries=TOKEN_CACHE_MAX_ENTRIES,
+    local_ttl=TOKEN_CACHE_TTL,
+    use_redis=False
+)
 
 if DATABASE_URL:
     print(f"Initializing database handler with URL: {DATABASE_URL[:30]}...")
     try:
         db_handler = NeonDBHandler(DATABASE_URL)
         print("Using Neon database for session storage")
+        if SESSION_REAP_INTERVAL > 0:
+            session_reaper = SessionReaper(db_handler)
+            session_reaper.start()
     except Exception as e:
         print(f"Failed to initialize database: {e}")
         print("Falling back to in-memory session storage")
@@ -144,6 +251,7 @@ def store_token(session_id, token_info):
         try:
             print(f"STORING token for session_id: {session_id}")
             db_handler.store_token(session_id, token_info)
+            _token_read_cache.set(session_id, token_info)
             print(f"Token stored successfully in database")
             return
         except Exception as e:
@@ -158,10 +266,15 @@ def store_token(session_id, token_info):
 
 def get_token(session_id):
     if db_handler:
+        hit, cached = _token_read_cache.get(session_id)
+        if hit:
+            return cached
         try:
             print(f"GETTING token for session_id: {session_id}")
             token = db_handler.get_token(session_id)
             print(f"Token found in database: {token is not None}")
+            if token is not None:
+                _token_read_cache.set(session_id, token)
             return token
         except Exception as e:
             print(f"Database get failed: {e}, checking in-memory fallback")
@@ -179,6 +292,7 @@ def get_token(session_id):
     return None
 
 def delete_token(session_id):
+    _token_read_cache.delete(session_id)
     if db_handler:
         try:
             db_handler.delete_token(session_id)
@@ -189,3 +303,10 @@ def delete_token(session_id):
     # In-memory fallback
     if session_id in token_cache:
         del token_cache[session_id]
+
+def get_session_stats():
+    """Token read cache and session reaper metrics"""
+    return {
+        "token_cache": _token_read_cache.stats(),
+        "reaper": session_reaper.stats() if session_reaper else None
+    }
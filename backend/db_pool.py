@@ -0,0 +1,216 @@
+"""
+Shared Postgres connection pool for AI DJ
+Used by both db.NeonDBHandler (sessions) and chat_db.ChatDatabase (chat, likes, emotions)
+so a request reuses warm connections instead of paying a TLS + auth handshake per query.
+
+Configuration (environment variables):
+    DB_POOL_MIN                  Connections opened up front (default: 1)
+    DB_POOL_MAX                  Max connections per process (default: 10)
+    DB_POOL_TIMEOUT              Seconds to wait for a free connection (default: 5)
+    DB_STATEMENT_TIMEOUT_MS      statement_timeout applied to every connection (default: 10000)
+    DB_HEALTHCHECK_IDLE_SECONDS  Ping connections idle longer than this before reuse (default: 30)
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 5))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 10000))
+DB_HEALTHCHECK_IDLE_SECONDS = float(os.getenv("DB_HEALTHCHECK_IDLE_SECONDS", 30))
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection became free within the pool timeout"""
+    pass
+
+
+class _ConfiguredConnectionPool(pg_pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that configures every new connection once"""
+
+    def __init__(self, minconn, maxconn, dsn, statement_timeout_ms):
+        self.statement_timeout_ms = statement_timeout_ms
+        super().__init__(minconn, maxconn, dsn)
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)  # type: ignore
+        # Set to READ COMMITTED to ensure we see committed data
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED)
+        if self.statement_timeout_ms:
+            with conn.cursor() as cur:
+                cur.execute("SET statement_timeout = %s", (self.statement_timeout_ms,))
+            conn.commit()
+        return conn
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded Postgres pool with health checks and wait metrics.
+
+    Usage:
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(...)
+            conn.commit()
+
+    Like psycopg2's own `with conn:`, the transaction is committed on success and
+    rolled back on error; the connection then goes back to the pool instead of leaking.
+    """
+
+    def __init__(self, db_url: str, min_size: int = DB_POOL_MIN, max_size: int = DB_POOL_MAX,
+                 timeout: float = DB_POOL_TIMEOUT, statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS,
+                 healthcheck_idle_seconds: float = DB_HEALTHCHECK_IDLE_SECONDS):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_idle_seconds = healthcheck_idle_seconds
+        self._pool = _ConfiguredConnectionPool(min_size, max_size, db_url, statement_timeout_ms)
+        # psycopg2 raises instead of blocking when exhausted - the semaphore makes callers wait
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used = {}  # id(conn) -> time.monotonic() when returned
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.checkouts = 0
+        self.in_use = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.timeouts = 0
+        self.healthcheck_failures = 0
+        self.discarded = 0
+
+        print(f"✅ Postgres pool initialized: min={min_size}, max={max_size}, "
+              f"statement_timeout={statement_timeout_ms}ms")
+
+    def _is_healthy(self, conn) -> bool:
+        """Cheap check for closed connections; ping ones that sat idle (Neon drops idle sockets)"""
+        if conn.closed:
+            return False
+        idle_since = self._last_used.get(id(conn))
+        if idle_since is None or time.monotonic() - idle_since < self.healthcheck_idle_seconds:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _acquire(self):
+        wait_start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self.lock:
+                self.timeouts += 1
+            raise PoolTimeoutError(f"No database connection available after {self.timeout}s "
+                                   f"(pool max size: {self.max_size})")
+        wait_time = time.monotonic() - wait_start
+
+        try:
+            conn = self._pool.getconn()
+            if not self._is_healthy(conn):
+                with self.lock:
+                    self.healthcheck_failures += 1
+                self._discard(conn)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self.lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+        return conn
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        try:
+            self._pool.putconn(conn, close=True)
+        except Exception:
+            pass
+        with self.lock:
+            self.discarded += 1
+
+    def _release(self, conn):
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn)
+        except Exception:
+            self._discard(conn)
+        finally:
+            with self.lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection (commit on success, rollback on error, always returned to the pool)"""
+        conn = self._acquire()
+        try:
+            yield conn
+            if not conn.closed:
+                conn.commit()
+        except Exception:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            raise
+        finally:
+            self._release(conn)
+
+    def close(self):
+        self._pool.closeall()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": self.in_use,
+                "checkouts": self.checkouts,
+                "avg_wait_ms": round(self.total_wait_time / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_time * 1000, 2),
+                "timeouts": self.timeouts,
+                "healthcheck_failures": self.healthcheck_failures,
+                "discarded": self.discarded
+            }
+
+
+# One pool per database URL per process, shared by every handler
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_url: str) -> ConnectionPool:
+    """Get (or lazily create) the shared pool for a database URL"""
+    with _pools_lock:
+        if db_url not in _pools:
+            _pools[db_url] = ConnectionPool(db_url)
+        return _pools[db_url]
+
+
+def get_pool_stats() -> dict:
+    """Metrics for every pool in this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    if not pools:
+        return {"available": False}
+    # Don't leak credentials from the URL - pools are reported by index
+    return {"available": True, "pools": [p.stats() for p in pools]}
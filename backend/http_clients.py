@@ -0,0 +1,275 @@
+"""
+Shared outbound HTTP clients for AI DJ
+Every external REST call (weather, iTunes, DeepL, Spotify, Genius, Groq) goes through a
+per-host keep-alive pool, so a request reuses warm connections instead of paying a new
+TCP + TLS handshake for each call. Timeouts and retries are configured per host.
+
+Usage:
+    from http_clients import http_clients
+    response = http_clients.get("https://itunes.apple.com/search", params=...)
+    session = http_clients.session_for("https://api.spotify.com")   # hand to a library
+
+Configuration (environment variables):
+    HTTP_POOL_MAXSIZE       Keep-alive connections per host (default: 20)
+    HTTP_DEFAULT_TIMEOUT    Seconds, for hosts without their own policy (default: 10)
+    HTTP_DEFAULT_RETRIES    Retries on connect errors / 429 / 502-504 (default: 1)
+    HTTP_RETRY_BACKOFF      urllib3 backoff factor between retries (default: 0.3)
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 20))
+HTTP_DEFAULT_TIMEOUT = float(os.getenv("HTTP_DEFAULT_TIMEOUT", 10))
+HTTP_DEFAULT_RETRIES = int(os.getenv("HTTP_DEFAULT_RETRIES", 1))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", 0.3))
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class SharedSession(requests.Session):
+    """
+    Session owned by the registry and lent to libraries. Clients like spotipy's Spotify and
+    SpotifyOAuth close the session they were given when they are garbage-collected, which
+    would close the shared adapters under every other request - so close() does nothing
+    here and only the registry closes it (close_shared).
+    """
+
+    def close(self):
+        pass
+
+    def close_shared(self):
+        super().close()
+
+
+@dataclass(frozen=True)
+class HostPolicy:
+    """Timeout/retry settings for one upstream host"""
+    timeout: float = HTTP_DEFAULT_TIMEOUT
+    retries: int = HTTP_DEFAULT_RETRIES
+    retry_post: bool = False  # Only for POST endpoints that are safe to repeat
+
+
+HOST_POLICIES = {
+    "api.openweathermap.org": HostPolicy(timeout=5, retries=1),
+    "itunes.apple.com": HostPolicy(timeout=3, retries=1),
+    # Translating the same texts twice is harmless, so batch POSTs may be retried
+    "api-free.deepl.com": HostPolicy(timeout=30, retries=2, retry_post=True),
+    "api.deepl.com": HostPolicy(timeout=30, retries=2, retry_post=True),
+    # Matches spotipy's own defaults (5s timeout, 3 retries) now that it uses our session
+    "api.spotify.com": HostPolicy(timeout=5, retries=3),
+    "accounts.spotify.com": HostPolicy(timeout=10, retries=1),
+    "api.genius.com": HostPolicy(timeout=10, retries=2),
+    "genius.com": HostPolicy(timeout=10, retries=2),
+    # The Groq SDK retries on its own - see HTTPClientRegistry.httpx_client
+    "api.groq.com": HostPolicy(timeout=60, retries=2),
+}
+
+
+def _host(url: str) -> str:
+    return (urlsplit(url).hostname or url).lower()
+
+
+class _HostStats:
+    """Request / connection counters for one host"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.new_connections = 0  # Only tracked directly for httpx clients
+
+
+class HTTPClientRegistry:
+    """
+    One pooled requests.Session (and, for SDKs built on httpx, one httpx.Client) per host.
+
+    Connections are only created when the pool has no idle one for the host, so
+    `1 - new_connections / requests` is the share of calls that skipped the handshake.
+    """
+
+    def __init__(self, pool_maxsize: int = HTTP_POOL_MAXSIZE):
+        self.pool_maxsize = pool_maxsize
+        self._adapters = {}       # host -> HTTPAdapter (shared by every session using the host)
+        self._sessions = {}       # host -> requests.Session
+        self._httpx_clients = {}  # host -> httpx.Client
+        self._stats = {}          # host -> _HostStats
+        self.lock = threading.Lock()
+
+    def policy(self, host: str) -> HostPolicy:
+        return HOST_POLICIES.get(host, HostPolicy())
+
+    def _host_stats(self, host: str) -> _HostStats:
+        with self.lock:
+            if host not in self._stats:
+                self._stats[host] = _HostStats()
+            return self._stats[host]
+
+    def _adapter(self, host: str) -> HTTPAdapter:
+        with self.lock:
+            if host not in self._adapters:
+                policy = self.policy(host)
+                methods = Retry.DEFAULT_ALLOWED_METHODS | ({"POST"} if policy.retry_post else set())
+                retry = Retry(
+                    total=policy.retries,
+                    read=policy.retries if policy.retry_post else 0,
+                    backoff_factor=HTTP_RETRY_BACKOFF,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=methods,
+                    respect_retry_after_header=True,
+                    raise_on_status=False  # Callers keep seeing the final status code
+                )
+                self._adapters[host] = HTTPAdapter(
+                    pool_connections=2,  # http + https
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=retry,
+                    pool_block=False
+                )
+            return self._adapters[host]
+
+    def _count_response(self, response, *args, **kwargs):
+        stats = self._host_stats(_host(response.url))
+        retries = getattr(getattr(response.raw, 'retries', None), 'history', ())
+        with self.lock:
+            stats.requests += 1
+            stats.retries += len(retries)
+            if response.status_code >= 500:
+                stats.errors += 1
+
+    def mount(self, session: requests.Session, url: str):
+        """Route a session's calls to url's host through the shared pool (e.g. a library's own session)"""
+        host = _host(url)
+        adapter = self._adapter(host)
+        for scheme in ("https://", "http://"):
+            session.mount(f"{scheme}{host}", adapter)
+        if self._count_response not in session.hooks['response']:
+            session.hooks['response'].append(self._count_response)
+        return session
+
+    def session_for(self, url: str) -> requests.Session:
+        """The shared keep-alive session for url's host (safe to hand to clients that close it)"""
+        host = _host(url)
+        with self.lock:
+            session = self._sessions.get(host)
+        if session is None:
+            session = self.mount(SharedSession(), url)
+            with self.lock:
+                session = self._sessions.setdefault(host, session)
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """requests.request through the host's pool, with the host's timeout unless one is given"""
+        host = _host(url)
+        kwargs.setdefault('timeout', self.policy(host).timeout)
+        try:
+            return self.session_for(url).request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            stats = self._host_stats(host)
+            with self.lock:
+                stats.errors += 1
+            raise
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def httpx_client(self, url: str):
+        """
+        Shared httpx.Client for SDKs that take one (Groq). Retries are left to the SDK
+        (pass policy(host).retries as its max_retries) so requests aren't retried twice.
+        """
+        import httpx
+
+        host = _host(url)
+        with self.lock:
+            client = self._httpx_clients.get(host)
+        if client is not None:
+            return client
+
+        stats = self._host_stats(host)
+
+        def on_trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                with self.lock:
+                    stats.new_connections += 1
+
+        def on_request(request):
+            # httpcore reports connection setup through the trace extension
+            request.extensions["trace"] = on_trace
+
+        def on_response(response):
+            with self.lock:
+                stats.requests += 1
+                if response.status_code >= 500:
+                    stats.errors += 1
+
+        client = httpx.Client(
+            timeout=self.policy(host).timeout,
+            limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize),
+            event_hooks={"request": [on_request], "response": [on_response]}
+        )
+        with self.lock:
+            existing = self._httpx_clients.setdefault(host, client)
+        if existing is not client:
+            client.close()
+        return existing
+
+    def _requests_connections(self, host: str) -> Optional[int]:
+        """Connections urllib3 opened for host (counted by its connection pools)"""
+        adapter = self._adapters.get(host)
+        if adapter is None:
+            return None
+        pools = adapter.poolmanager.pools
+        total = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                total += getattr(pool, 'num_connections', 0)
+        return total
+
+    def stats(self) -> dict:
+        """Per-host requests, new connections and reuse ratio"""
+        with self.lock:
+            hosts = {host: (s.requests, s.errors, s.retries, s.new_connections) for host, s in self._stats.items()}
+            requests_hosts = set(self._adapters)
+        result = {}
+        for host, (count, errors, retries, httpx_connections) in sorted(hosts.items()):
+            connections = httpx_connections
+            if host in requests_hosts:
+                connections += self._requests_connections(host) or 0
+            result[host] = {
+                "requests": count,
+                "errors": errors,
+                "retries": retries,
+                "new_connections": connections,
+                "reuse_ratio": round(max(0.0, 1 - connections / count), 3) if count else None,
+                "timeout": self.policy(host).timeout
+            }
+        return {"pool_maxsize": self.pool_maxsize, "hosts": result}
+
+    def close(self):
+        with self.lock:
+            sessions = list(self._sessions.values())
+            clients = list(self._httpx_clients.values())
+        for session in sessions:
+            session.close_shared()
+        for client in clients:
+            client.close()
+
+
+# One registry per process, shared by every module making outbound calls
+http_clients = HTTPClientRegistry()
+
+
+def get_http_stats() -> dict:
+    """Connection reuse metrics for every outbound host"""
+    return http_clients.stats()
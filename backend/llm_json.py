@@ -0,0 +1,500 @@
+"""
+Tolerant JSON handling for LLM output in AI DJ
+The model is asked for a single JSON object, but regularly wraps it in markdown
+fences or chatter, leaves quotes unescaped, adds trailing commas or gets cut off
+at max_tokens. Everything here is a single bounded left-to-right scan:
+
+    parse_llm_json(text)       - direct parse, then balanced-object extraction, then repair
+    extract_json_object(text)  - the first balanced {...} in the text
+    repair_json(text)          - rewrite the first object into valid JSON
+    IncrementalJSONParser      - streaming mode: completed fields while the text is still arriving
+"""
+
+import re
+import json
+from typing import Iterable, Optional
+
+_WHITESPACE = ' \t\r\n'
+
+# Upper bound on how much LLM output is scanned (responses are a few KB)
+MAX_JSON_CHARS = 64 * 1024
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?$')
+_LITERALS = {
+    'true': 'true', 'false': 'false', 'null': 'null',
+    # Python-style literals show up too
+    'True': 'true', 'False': 'false', 'None': 'null'
+}
+_STRING_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+
+# Scanners jump between the characters they care about instead of stepping through every one
+_OBJECT_TOKENS = re.compile(r'[{}"\\]')
+_STRING_SPECIALS = re.compile(r'["\\\x00-\x1f]')
+
+# strict=False: LLMs put raw newlines inside strings
+_decoder = json.JSONDecoder(strict=False)
+
+
+def _decode(raw: str):
+    """Decode one JSON value, or None if it is not valid"""
+    try:
+        return _decoder.decode(raw)
+    except ValueError:
+        return None
+
+
+def _decode_string_prefix(raw: str) -> Optional[str]:
+    """Decode the body of a JSON string that is still being written (drops a trailing partial escape)"""
+    backslash = raw.rfind('\\')
+    if backslash != -1:
+        # Count the run of backslashes - an odd run means the last one starts an escape
+        run = len(raw) - len(raw[:backslash + 1].rstrip('\\'))
+        tail = raw[backslash + 1:]
+        if run % 2 == 1 and (not tail or (tail[0] == 'u' and len(tail) < 5)):
+            raw = raw[:backslash]
+    return _decode('"' + raw + '"')
+
+
+class LLMJSONError(ValueError):
+    """No JSON object could be recovered from the LLM output"""
+    pass
+
+
+def parse_llm_json(text: str, repair: bool = True, max_chars: int = MAX_JSON_CHARS) -> dict:
+    """
+    Parse the JSON object in an LLM response.
+
+    Tries, in order: the whole text, the first balanced {...} (drops fences and
+    chatter), and - if repair is enabled - repair_json(). Each step is linear in
+    the (bounded) input, unlike regex cascades over `\\{.*\\}`.
+
+    Raises:
+        LLMJSONError: if no JSON object can be recovered
+    """
+    if not text:
+        raise LLMJSONError("Empty LLM response")
+    text = text[:max_chars]
+
+    value = _decode(text.strip())
+    if isinstance(value, dict):
+        return value
+
+    candidate = extract_json_object(text)
+    if candidate is not None:
+        value = _decode(candidate)
+        if isinstance(value, dict):
+            return value
+
+    if repair:
+        repaired = repair_json(text)
+        if repaired is not None:
+            value = _decode(repaired)
+            if isinstance(value, dict):
+                print(f"✅ Repaired malformed JSON from LLM ({len(text)} chars)")
+                return value
+
+    raise LLMJSONError(f"Could not parse JSON from LLM response. Response was: {text[:500]}")
+
+
+def extract_json_object(text: str) -> Optional[str]:
+    """The first balanced {...} in text (quotes and escapes respected), or None if it never closes"""
+    start = text.find('{')
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    i = start
+    while True:
+        match = _OBJECT_TOKENS.search(text, i)
+        if not match:
+            return None
+        c = match.group()
+        i = match.end()
+        if in_string:
+            if c == '\\':
+                i += 1  # Skip the escaped character
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i]
+
+
+def _next_significant(text: str, i: int) -> int:
+    """Index of the next non-whitespace character at or after i (len(text) if none)"""
+    n = len(text)
+    while i < n and text[i] in _WHITESPACE:
+        i += 1
+    return i
+
+
+def _quote_closes_string(text: str, i: int, in_array: bool) -> bool:
+    """
+    Decide whether the quote at text[i] ends the current string or is an unescaped
+    quote inside it, by looking at what follows (a short, whitespace-only lookahead).
+    """
+    j = _next_significant(text, i + 1)
+    if j >= len(text):
+        return True
+    nxt = text[j]
+    if nxt in ':}]':
+        return True
+    if nxt == ',':
+        k = _next_significant(text, j + 1)
+        return k >= len(text) or text[k] in '"{}[]-0123456789tfnTFN'
+    if nxt == '"':
+        # Missing comma: another array element, or another "key": in the object
+        if in_array:
+            return True
+        end = text.find('"', j + 1)
+        return end != -1 and _next_significant(text, end + 1) < len(text) and text[_next_significant(text, end + 1)] == ':'
+    return False
+
+
+def repair_json(text: str) -> Optional[str]:
+    """
+    Rewrite the first JSON object in text into valid JSON, in one pass.
+
+    Fixes: leading/trailing chatter and fences, unescaped quotes and raw control
+    characters inside strings, trailing or doubled commas, missing commas between
+    values, Python literals, stray bare words, and truncation (open strings and
+    containers are closed, a dangling key gets null).
+
+    Returns:
+        Repaired JSON text, or None if there is no '{' at all
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+
+    out = []
+    stack = []  # [opener, expecting_key] per open container
+    in_string = False
+    string_is_key = False
+    last = ''  # last significant character written outside strings
+    last_was_key = False
+    n = len(text)
+    i = start
+
+    def begin_value():
+        nonlocal last
+        # Missing ':' after a key, or missing ',' between values
+        if last_was_key:
+            out.append(':')
+            last = ':'
+            stack[-1][1] = False
+        elif last and (last in '"}]' or last.isalnum()):
+            out.append(',')
+            last = ','
+            if stack and stack[-1][0] == '{':
+                stack[-1][1] = True
+
+    def drop_trailing_comma():
+        nonlocal last
+        if out and out[-1] == ',':
+            out.pop()
+            last = out[-1][-1] if out else ''
+
+    def fill_missing_value():
+        nonlocal last
+        if last == ':':
+            out.append('null')
+            last = 'l'
+
+    while i < n:
+        c = text[i]
+
+        if in_string:
+            # Copy plain string content in one go
+            match = _STRING_SPECIALS.search(text, i)
+            if not match:
+                out.append(text[i:])
+                break
+            if match.start() > i:
+                out.append(text[i:match.start()])
+                i = match.start()
+                c = text[i]
+            if c == '\\':
+                if i + 1 < n:
+                    out.append(text[i:i + 2])
+                i += 2
+                continue
+            if c == '"':
+                if _quote_closes_string(text, i, bool(stack) and stack[-1][0] == '['):
+                    in_string = False
+                    out.append('"')
+                    last = '"'
+                    last_was_key = string_is_key
+                else:
+                    out.append('\\"')
+            elif c in _STRING_ESCAPES:
+                out.append(_STRING_ESCAPES[c])
+            elif ord(c) >= 0x20:
+                out.append(c)
+            i += 1
+            continue
+
+        if c == '"':
+            in_object = bool(stack) and stack[-1][0] == '{'
+            if in_object and not stack[-1][1] and last and (last in '"}]' or last.isalnum()):
+                # Previous member ended without a comma - this string is the next key
+                out.append(',')
+                last = ','
+                stack[-1][1] = True
+            is_key = in_object and stack[-1][1] and not last_was_key
+            if not is_key:
+                begin_value()
+            last_was_key = False
+            in_string = True
+            string_is_key = is_key
+            out.append('"')
+        elif c == '{' or c == '[':
+            begin_value()
+            last_was_key = False
+            stack.append([c, c == '{'])
+            out.append(c)
+            last = c
+        elif c == '}' or c == ']':
+            fill_missing_value()
+            drop_trailing_comma()
+            last_was_key = False
+            if stack:
+                opener = stack.pop()[0]
+                out.append('}' if opener == '{' else ']')
+                last = out[-1]
+            if not stack:
+                return ''.join(out)
+        elif c == ',':
+            fill_missing_value()
+            drop_trailing_comma()
+            last_was_key = False
+            if last and last not in '{[':
+                out.append(',')
+                last = ','
+                if stack and stack[-1][0] == '{':
+                    stack[-1][1] = True
+        elif c == ':':
+            if last_was_key:
+                out.append(':')
+                last = ':'
+                last_was_key = False
+                stack[-1][1] = False
+        elif c in _WHITESPACE:
+            pass
+        else:
+            # Bare token: number or literal - anything else (e.g. "...") is dropped
+            j = i
+            while j < n and text[j] not in ',:{}[]"' and text[j] not in _WHITESPACE:
+                j += 1
+            token = text[i:j]
+            literal = _LITERALS.get(token) or (token if _NUMBER.match(token) else None)
+            if literal is not None and not (stack and stack[-1][0] == '{' and stack[-1][1]):
+                begin_value()
+                last_was_key = False
+                out.append(literal)
+                last = literal[-1]
+            i = j
+            continue
+        i += 1
+
+    # Truncated output: close what is still open
+    if in_string:
+        out.append('"')
+        last = '"'
+        last_was_key = string_is_key
+    if last_was_key:
+        out.append(':')
+        last = ':'
+    fill_missing_value()
+    drop_trailing_comma()
+    while stack:
+        out.append('}' if stack.pop()[0] == '{' else ']')
+    return ''.join(out)
+
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for one streamed top-level JSON object.
+
+    feed() takes the next chunk and returns the events that completed in it:
+        ("partial", key, text)       - decoded prefix of a top-level string that is still
+                                       being written (only for keys listed in partial_keys)
+        ("item", key, index, value)  - an element of a top-level array finished
+        ("member", key, value)       - a top-level member finished
+
+    Text before the first '{' (markdown fences, chatter) is skipped and each character
+    is scanned exactly once, so the cost of a feed() is proportional to the chunk.
+    Elements that don't decode are dropped; the caller still has the full text to
+    fall back on.
+    """
+
+    def __init__(self, partial_keys: Iterable[str] = ()):
+        self.partial_keys = set(partial_keys)
+        self.text = ''
+        self.pos = 0
+        self.started = False
+        self.finished = False
+
+        self.stack = []  # open containers: '{' or '['
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.primitive_start = None
+
+        # Top-level object state
+        self.expect_key = False
+        self.key_start = None
+        self.current_key = None
+        self.member_start = None
+        self.last_partial = None
+
+        # State for elements of a top-level array
+        self.item_start = None
+        self.item_index = 0
+
+    def feed(self, chunk: str) -> list:
+        """Consume a chunk and return the completed events"""
+        if self.finished or not chunk:
+            return []
+        self.text += chunk
+        events = []
+
+        text = self.text
+        for i in range(self.pos, len(text)):
+            c = text[i]
+
+            if not self.started:
+                if c == '{':
+                    self.started = True
+                    self.stack.append('{')
+                    self.expect_key = True
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == '\\':
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    self._string_closed(i, events)
+                continue
+
+            if c == '"':
+                self._value_started(i)
+                self.in_string = True
+                self.string_start = i
+                if self._depth_is_member() and self.expect_key:
+                    self.key_start = i
+                continue
+
+            if c == '{' or c == '[':
+                self._end_primitive(i, events)
+                self._value_started(i)
+                self.stack.append(c)
+                if c == '[' and self._depth_is_item():
+                    self.item_index = 0
+                continue
+
+            if c == '}' or c == ']':
+                self._end_primitive(i, events)
+                if self.stack:
+                    self.stack.pop()
+                self._container_closed(i, events)
+                if not self.stack:
+                    self.finished = True
+                    self.pos = i + 1
+                    return events
+                continue
+
+            if c == ',':
+                self._end_primitive(i, events)
+                if self._depth_is_member():
+                    self.expect_key = True
+                continue
+
+            if c == ':':
+                if self._depth_is_member():
+                    self.expect_key = False
+                continue
+
+            if c in _WHITESPACE:
+                self._end_primitive(i, events)
+                continue
+
+            # Part of a number / true / false / null
+            if self.primitive_start is None:
+                self._value_started(i)
+                self.primitive_start = i
+
+        self.pos = len(text)
+
+        # Surface the prefix of a string value that is still being written
+        if (self.in_string and self.string_start is not None and self._depth_is_member()
+                and self.member_start == self.string_start
+                and self.current_key in self.partial_keys):
+            prefix = _decode_string_prefix(text[self.string_start + 1:])
+            if prefix is not None and prefix != self.last_partial:
+                self.last_partial = prefix
+                events.append(("partial", self.current_key, prefix))
+
+        return events
+
+    def _depth_is_member(self) -> bool:
+        return len(self.stack) == 1
+
+    def _depth_is_item(self) -> bool:
+        return len(self.stack) == 2 and self.stack[1] == '['
+
+    def _value_started(self, i: int):
+        if self._depth_is_member():
+            if not self.expect_key and self.member_start is None:
+                self.member_start = i
+        elif self._depth_is_item() and self.item_start is None:
+            self.item_start = i
+
+    def _string_closed(self, i: int, events: list):
+        if self._depth_is_member():
+            if self.expect_key and self.key_start == self.string_start:
+                self.current_key = _decode(self.text[self.key_start:i + 1])
+                self.key_start = None
+            elif self.member_start == self.string_start:
+                self._emit_member(i + 1, events)
+        elif self._depth_is_item() and self.item_start == self.string_start:
+            self._emit_item(i + 1, events)
+
+    def _container_closed(self, i: int, events: list):
+        if self._depth_is_member() and self.member_start is not None:
+            self._emit_member(i + 1, events)
+        elif self._depth_is_item() and self.item_start is not None:
+            self._emit_item(i + 1, events)
+
+    def _end_primitive(self, i: int, events: list):
+        if self.primitive_start is None:
+            return
+        if self._depth_is_member() and self.member_start == self.primitive_start:
+            self._emit_member(i, events)
+        elif self._depth_is_item() and self.item_start == self.primitive_start:
+            self._emit_item(i, events)
+        self.primitive_start = None
+
+    def _emit_member(self, end: int, events: list):
+        raw = self.text[self.member_start:end]
+        self.member_start = None
+        self.last_partial = None
+        value = _decode(raw)
+        if value is not None and self.current_key is not None:
+            events.append(("member", self.current_key, value))
+
+    def _emit_item(self, end: int, events: list):
+        raw = self.text[self.item_start:end]
+        self.item_start = None
+        value = _decode(raw)
+        if value is not None:
+            events.append(("item", self.current_key, self.item_index, value))
+        self.item_index += 1
@@ -0,0 +1,159 @@
+"""
+Highlighted-term alignment for translated lyrics
+Maps terms the LLM highlighted in the English translation back onto the original-language
+lyrics, so non-English tracks get highlighted_terms_original without a second Groq call.
+
+DeepL translates with preserve_formatting, so the translation keeps the original's line
+breaks: the n-th lyric line of one is the n-th line of the other. A term is aligned by
+  1. finding the English line(s) it was taken from and the matching original line(s),
+  2. fuzzy character n-gram matching inside those lines (catches names, numbers, cognates
+     and loanwords - "corazón"/"heart" won't match, "chocolate"/"chocolate" will),
+  3. otherwise projecting the term's word position in the English line onto the original
+     line (the whole line when the term covers most of it).
+Every returned term is copied verbatim from the original lyrics, so the frontend finds it.
+"""
+
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+# Min Dice similarity (character trigrams, accents folded) for a fuzzy match
+FUZZY_MATCH_THRESHOLD = 0.55
+# ... when the term isn't in the translation, so there is no line to narrow the search to
+FUZZY_MATCH_THRESHOLD_ANYWHERE = 0.8
+
+# A term covering this share of its English line highlights the whole original line
+WHOLE_LINE_SHARE = 0.6
+
+# When line counts differ, also look this many lines either side of the projected line
+LINE_WINDOW = 1
+
+_WORDS = re.compile(r"\w+(?:['’]\w+)*")
+
+
+def _fold(text: str) -> str:
+    """Lowercase with accents stripped ("Corazón" -> "corazon")"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(a: str, b: str) -> float:
+    """Dice coefficient of character trigrams"""
+    grams_a, grams_b = _trigrams(a), _trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+def _lyric_lines(lyrics: str) -> List[str]:
+    """Non-blank lines (section breaks differ more between languages than lyric lines do)"""
+    return [line for line in lyrics.split('\n') if _WORDS.search(line)]
+
+
+def _words(line: str) -> List[Tuple[int, int]]:
+    """(start, end) character offsets of each word in line"""
+    return [match.span() for match in _WORDS.finditer(line)]
+
+
+def _candidate_lines(index: int, english_count: int, original_count: int) -> List[int]:
+    """Original line indexes matching English line `index`"""
+    if english_count == original_count:
+        return [index]
+    # Formatting wasn't preserved exactly - project by position and search a small window
+    center = round(index * (original_count - 1) / max(1, english_count - 1))
+    return [i for i in range(center - LINE_WINDOW, center + LINE_WINDOW + 1) if 0 <= i < original_count]
+
+
+def _fuzzy_span(term: str, line: str) -> Tuple[float, Optional[str]]:
+    """Best (similarity, verbatim span) of line's word n-grams against term"""
+    folded_term = _fold(term)
+    term_length = len(_WORDS.findall(term)) or 1
+    words = _words(line)
+    best = (0.0, None)
+    for size in range(max(1, term_length - 1), term_length + 2):
+        for start in range(0, len(words) - size + 1):
+            span = line[words[start][0]:words[start + size - 1][1]]
+            score = _similarity(folded_term, _fold(span))
+            if score > best[0]:
+                best = (score, span)
+    return best
+
+
+def _projected_span(term_start: int, term_end: int, english_line: str, original_line: str) -> Optional[str]:
+    """The original words at the same relative position as the term in the English line"""
+    english_words = _words(english_line)
+    original_words = _words(original_line)
+    if not english_words or not original_words:
+        return None
+    # Word indexes the term covers in the English line
+    first = next((i for i, (s, e) in enumerate(english_words) if e > term_start), 0)
+    last = next((i for i, (s, e) in reversed(list(enumerate(english_words))) if s < term_end), first)
+    covered = last - first + 1
+    if covered / len(english_words) >= WHOLE_LINE_SHARE:
+        return original_line[original_words[0][0]:original_words[-1][1]]
+
+    ratio = len(original_words) / len(english_words)
+    start = min(len(original_words) - 1, int(first * ratio))
+    end = max(start, min(len(original_words) - 1, round((last + 1) * ratio) - 1))
+    return original_line[original_words[start][0]:original_words[end][1]]
+
+
+def align_term(term: str, translated_lyrics: str, original_lyrics: str) -> Optional[str]:
+    """Original-language counterpart of one term highlighted in the translated lyrics (None if unsure)"""
+    english_lines = _lyric_lines(translated_lyrics)
+    original_lines = _lyric_lines(original_lyrics)
+    if not english_lines or not original_lines or not term.strip():
+        return None
+
+    term_lower = term.lower()
+    sources = [(i, line) for i, line in enumerate(english_lines) if term_lower in line.lower()]
+
+    # Names, numbers and cognates survive translation - look for them where the term came from
+    search_lines = set()
+    for index, _ in sources:
+        search_lines.update(_candidate_lines(index, len(english_lines), len(original_lines)))
+    best = (0.0, None)
+    for i in sorted(search_lines) or range(len(original_lines)):
+        best = max(best, _fuzzy_span(term, original_lines[i]), key=lambda item: item[0])
+    if best[0] >= (FUZZY_MATCH_THRESHOLD if sources else FUZZY_MATCH_THRESHOLD_ANYWHERE):
+        return best[1]
+
+    if not sources:
+        return None
+    # Same place in the same line: the first occurrence is enough, the frontend highlights every repeat
+    index, english_line = sources[0]
+    candidates = _candidate_lines(index, len(english_lines), len(original_lines))
+    original_line = original_lines[candidates[len(candidates) // 2]]
+    term_start = english_line.lower().index(term_lower)
+    return _projected_span(term_start, term_start + len(term), english_line, original_line)
+
+
+def align_highlighted_terms(terms: List[str], translated_lyrics: str, original_lyrics: str) -> List[str]:
+    """
+    Map highlighted terms from the English translation onto the original lyrics.
+
+    Args:
+        terms: Terms highlighted in translated_lyrics
+        translated_lyrics: English lyrics the terms were taken from
+        original_lyrics: Original-language lyrics (same line structure)
+
+    Returns:
+        Verbatim spans of original_lyrics, deduplicated, in the order of terms
+    """
+    if not terms or not translated_lyrics or not original_lyrics:
+        return []
+    aligned = []
+    seen = set()
+    for term in terms:
+        if not isinstance(term, str):
+            continue
+        span = align_term(term, translated_lyrics, original_lyrics)
+        if span and span.lower() not in seen:
+            seen.add(span.lower())
+            aligned.append(span)
+    return aligned
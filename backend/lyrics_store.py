@@ -0,0 +1,185 @@
+"""
+Lyrics repository for AI DJ
+Stores cleaned Genius lyrics, detected language and English translation so the
+same songs are not scraped and translated again for every user and every restart.
+
+Layout (both tiers go through redis_cache.TieredCache, so there is always a hot
+in-memory tier and Redis persistence when available):
+    lyrics_track:{track_id}      -> {"lyrics_hash": "..."}  or a negative "no lyrics" entry
+    lyrics_content:{lyrics_hash} -> {"original": "...", "translated": "...", "language": "es"}
+
+Lyrics content is addressed by the SHA-256 of the cleaned text, so the same lyrics
+reached through different track IDs (single vs. album release, remasters, markets)
+share one entry and one translation.
+"""
+
+import os
+import hashlib
+from typing import Optional
+
+from redis_cache import TieredCache, invalidate_track
+
+# Lyrics rarely change - keep them for a month; retry "no lyrics" after a day
+LYRICS_TTL = int(os.getenv("LYRICS_TTL", 30 * 24 * 3600))
+LYRICS_NEGATIVE_TTL = int(os.getenv("LYRICS_NEGATIVE_TTL", 24 * 3600))
+
+
+def clean_genius_lyrics(lyrics: str) -> str:
+    """Clean up Genius lyrics (remove "Lyrics" header and extra whitespace)"""
+    if lyrics.startswith("Lyrics"):
+        lyrics = lyrics.split("\n", 1)[1] if "\n" in lyrics else lyrics
+    return lyrics.strip()
+
+
+def lyrics_content_hash(lyrics: str) -> str:
+    """Content address of cleaned lyrics"""
+    return hashlib.sha256(lyrics.encode('utf-8')).hexdigest()
+
+
+class LyricsStore:
+    """Per-track lyrics lookup with content-addressed storage and negative caching"""
+
+    def __init__(self):
+        self.tracks = TieredCache(
+            "lyrics_track",
+            ttl=LYRICS_TTL,
+            negative_ttl=LYRICS_NEGATIVE_TTL,
+            local_max_entries=5000,
+            local_ttl=3600
+        )
+        self.contents = TieredCache(
+            "lyrics_content",
+            ttl=LYRICS_TTL,
+            local_max_entries=500,  # Lyrics are a few KB each
+            local_ttl=3600
+        )
+
+    def get(self, track_id: str) -> tuple[bool, Optional[dict]]:
+        """
+        Look up stored lyrics for a track.
+
+        Returns:
+            (hit, entry) - entry is None for a cached "no lyrics" result, otherwise a dict
+            with 'original', 'translated' and 'language' (the last two are None until
+            the lyrics have been through translation)
+        """
+        hit, pointer = self.tracks.get(track_id)
+        if not hit:
+            return False, None
+        if pointer is None:
+            return True, None
+
+        hit, entry = self.contents.get(pointer['lyrics_hash'])
+        if not hit or entry is None:
+            # Content expired or was evicted independently - treat as a miss
+            return False, None
+        return True, entry
+
+    def get_many(self, track_ids: list) -> dict:
+        """
+        Look up stored lyrics for several tracks - two round trips (pointers, then contents)
+        however many tracks there are.
+
+        Returns:
+            {track_id: entry} for hits only - entry is None for a cached "no lyrics" result
+        """
+        pointers = self.tracks.get_many(track_ids)
+        hashes = [pointer['lyrics_hash'] for pointer in pointers.values() if pointer is not None]
+        entries = self.contents.get_many(hashes) if hashes else {}
+
+        found = {}
+        for track_id, pointer in pointers.items():
+            if pointer is None:
+                found[track_id] = None
+            elif entries.get(pointer['lyrics_hash']) is not None:
+                # Content expired or was evicted independently - left out, i.e. a miss
+                found[track_id] = entries[pointer['lyrics_hash']]
+        return found
+
+    def put_lyrics(self, track_id: str, lyrics: str) -> dict:
+        """
+        Store freshly scraped lyrics for a track.
+        Returns the content entry, which already carries a translation if the same text was seen before.
+        """
+        lyrics_hash = lyrics_content_hash(lyrics)
+        hit, entry = self.contents.get(lyrics_hash)
+        if not hit or entry is None:
+            entry = {'original': lyrics, 'translated': None, 'language': None}
+            self.contents.set(lyrics_hash, entry)
+        self.tracks.set(track_id, {'lyrics_hash': lyrics_hash})
+        return entry
+
+    def put_translation(self, lyrics: str, translated: str, language: str, track_id: Optional[str] = None):
+        """
+        Store the translation and detected language for lyrics (shared by every track with this text).
+        If it replaces a different translation, track_id's cached explanations - generated from
+        the old one - are dropped.
+        """
+        lyrics_hash = lyrics_content_hash(lyrics)
+        if track_id:
+            hit, previous = self.contents.get(lyrics_hash)
+            if hit and previous and previous.get('translated') and previous['translated'] != translated:
+                invalidate_track(track_id)
+        self.contents.set(lyrics_hash, {
+            'original': lyrics,
+            'translated': translated,
+            'language': language
+        })
+
+    def put_missing(self, track_id: str):
+        """Remember that Genius has no lyrics for this track"""
+        self.tracks.set_negative(track_id)
+
+
+def song_key(track_name: str, artist_name: str) -> str:
+    """Store key for lookups that don't have a Spotify track ID (e.g. main.get_lyrics)"""
+    raw = f"{track_name.strip().casefold()}|{artist_name.strip().casefold()}"
+    return "song:" + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def fetch_lyrics(genius, track_id: str, track_name: str, artist_name: str,
+                 stored: Optional[tuple] = None) -> tuple[Optional[dict], bool]:
+    """
+    Get lyrics for a track, from the store if possible, otherwise from Genius.
+
+    Args:
+        genius: lyricsgenius client (or None if not configured)
+        track_id: Spotify track ID (or song_key(...) when there is no ID)
+        track_name: Name of the track
+        artist_name: Name of the artist (can be comma-separated)
+        stored: (hit, entry) already looked up with lyrics_store.get_many (skips the lookup)
+
+    Returns:
+        (entry, from_store) - entry is None if no lyrics exist, otherwise a dict with
+        'original', 'translated' and 'language' (translation fields may be None)
+    """
+    hit, entry = stored if stored is not None else lyrics_store.get(track_id)
+    if hit:
+        if entry is None:
+            print(f"    💾 No lyrics (cached)")
+        else:
+            print(f"    💾 Using stored lyrics ({len(entry['original'])} chars, language: {entry.get('language') or 'pending'})")
+        return entry, True
+
+    if not genius:
+        return None, False
+
+    # Get primary artist (first one if comma-separated)
+    primary_artist = artist_name.split(',')[0].strip() if ',' in artist_name else artist_name.strip()
+    print(f"    🔍 Searching Genius for: '{track_name}' by {primary_artist}")
+
+    # Exceptions propagate so network errors are not cached as "no lyrics"
+    song = genius.search_song(track_name, primary_artist)
+
+    if song and song.lyrics:
+        lyrics = clean_genius_lyrics(song.lyrics)
+        print(f"    ✅ Found lyrics ({len(lyrics)} chars)")
+        return lyrics_store.put_lyrics(track_id, lyrics), False
+
+    print(f"    ⚠️  No lyrics found")
+    lyrics_store.put_missing(track_id)
+    return None, False
+
+
+# Global lyrics store
+lyrics_store = LyricsStore()
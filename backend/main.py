@@ -2,22 +2,33 @@ import os
 import sys
 from pathlib import Path
 import json
-import requests
+import hashlib
 from typing import Optional, Union, Tuple
 import concurrent.futures
 import time
 
-from flask import Flask, session, url_for, redirect, request, jsonify
+from flask import Flask, session, url_for, redirect, request, jsonify, g
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 from spotipy import Spotify
 from spotipy.oauth2 import SpotifyOAuth
 from spotipy.cache_handler import CacheHandler
-from ai_service import GroqRecommendationService
-from db import store_token, get_token, delete_token
+from ai_service import GroqRecommendationService, LYRICS_ANALYSIS_TOKEN_BUDGET
+from db import store_token, get_token, delete_token, get_session_stats
 from chat_db import chat_db
-from rate_limiter import get_rate_limit_status
+from db_pool import get_pool_stats
+from http_clients import http_clients, get_http_stats
+from rate_limiter import get_rate_limit_status, groq_rate_limiter, PRIORITY_SCORING
+from lyrics_alignment import align_highlighted_terms
+from token_usage import approx_token_count, get_token_usage_stats
+from track_resolver import ResolutionBatch
+from pipeline import StageGraph
+from llm_json import parse_llm_json, LLMJSONError
+from streaming import create_streaming_route
+from redis_cache import get_cache_stats, LocalCache, get_cached_lyrics_explanations, cache_lyrics_explanations, invalidate_user
+from lyrics_store import lyrics_store, fetch_lyrics, song_key
+from translation_cache import get_cached_translations, cache_translations
 
 # Genius API for lyrics
 try:
@@ -26,6 +37,11 @@ try:
     genius = lyricsgenius.Genius(GENIUS_API_KEY, timeout=10, remove_section_headers=True) if GENIUS_API_KEY else None
     if genius:
         genius.verbose = False  # Disable verbose output
+        # Keep lyricsgenius's own session (it carries the auth header) but pool its connections
+        genius_session = getattr(genius, '_session', None)
+        if genius_session is not None:
+            http_clients.mount(genius_session, "https://api.genius.com")
+            http_clients.mount(genius_session, "https://genius.com")
         print("✅ Genius API initialized")
     else:
         print("⚠️  GENIUS_API_KEY not found - lyrics will not be available")
@@ -79,7 +95,7 @@ def get_weather_data(lat=None, lon=None, city=None):
         print(f"🌤️ [WEATHER DEBUG] Request params: {dict((k, v if k != 'appid' else '***') for k, v in params.items())}", flush=True)
         sys.stdout.flush()
         
-        response = requests.get(WEATHER_BASE_URL, params=params, timeout=5)
+        response = http_clients.get(WEATHER_BASE_URL, params=params)
         print(f"🌤️ [WEATHER DEBUG] API response status: {response.status_code}", flush=True)
         sys.stdout.flush()
         
@@ -141,14 +157,19 @@ scope = 'user-read-private user-read-email playlist-read-private playlist-read-c
 
 # Use database-based cache handler
 class DBCacheHandler(CacheHandler):
-    def __init__(self, session_id):
+    def __init__(self, session_id, token_info=None):
         self.session_id = session_id
+        # spotipy asks for the token before every API call - keep the copy this request already read
+        self.token_info = token_info
     
     def get_cached_token(self):
-        return get_token(self.session_id)
+        if self.token_info is None:
+            self.token_info = get_token(self.session_id)
+        return self.token_info
     
     def save_token_to_cache(self, token_info):
         store_token(self.session_id, token_info)
+        self.token_info = token_info
 
 # We'll get session_id from request
 def get_session_id():
@@ -170,49 +191,133 @@ def get_clerk_user_id():
 # Initialize AI service
 ai_service = GroqRecommendationService()
 
-def create_spotify_oauth(session_id):
-    """Create Spotify OAuth instance"""
-    cache_handler = DBCacheHandler(session_id)
+# "fanout" (default): one scoring call, then an explanation call per selected track - explanations
+#     stream in one by one, the lowest latency while Groq has headroom
+# "combined": score + explain + highlight all candidates in 1-2 Groq calls - far fewer calls and
+#     tokens, but explanations arrive together after one long decode (~2x the stage latency when idle)
+# "auto": combined only while the main model's limiter is under pressure, fan-out otherwise
+LYRICS_ANALYSIS_MODE = os.getenv("LYRICS_ANALYSIS_MODE", "fanout").lower()
+
+def use_combined_analysis():
+    """Whether this request analyzes lyrics in combined mode (see LYRICS_ANALYSIS_MODE)"""
+    if LYRICS_ANALYSIS_MODE != "auto":
+        return LYRICS_ANALYSIS_MODE == "combined"
+    # Pressure: a burst the size of an analysis budget would already have to wait for the limiter
+    return groq_rate_limiter.for_model(ai_service.model).estimated_wait(LYRICS_ANALYSIS_TOKEN_BUDGET) > 0
+
+# Spotify identity per session and token ({id, country, display_name}), so handlers don't call /me just for the market
+SESSION_USER_CACHE_TTL = int(os.getenv("SESSION_USER_CACHE_TTL", 3600))
+session_user_cache = LocalCache(max_entries=10000, default_ttl=SESSION_USER_CACHE_TTL)
+
+def create_spotify_oauth(session_id, token_info=None):
+    """Create Spotify OAuth instance (optionally seeded with an already-loaded token)"""
+    cache_handler = DBCacheHandler(session_id, token_info)
     return SpotifyOAuth(
         client_id=client_id,
         client_secret=client_secret,
         redirect_uri=redirect_url,
         scope=scope,
         cache_handler=cache_handler,
-        show_dialog=True
+        show_dialog=True,
+        # spotipy infers bool from the default, but it accepts a requests.Session
+        requests_session=http_clients.session_for("https://accounts.spotify.com")  # type: ignore[arg-type]
     )
 
-def get_authenticated_spotify():
+def get_auth_context():
     """
-    Helper function to get authenticated Spotify client.
-    Returns tuple: (Spotify client, None) or (None, error_response)
+    Resolve the request's Spotify auth once and memoize it on flask.g.
+    The token is read (and refreshed if expired) a single time per request; every
+    later helper call reuses the same validated client.
+    
+    Returns dict: {'session_id', 'token_info', 'sp'} - 'sp' is None if not authenticated
     """
+    if 'auth_context' in g:
+        return g.auth_context
+    
     session_id = get_session_id()
-    sp_oauth = create_spotify_oauth(session_id)
     token_info = get_token(session_id)
+    sp = None
+    if token_info:
+        sp_oauth = create_spotify_oauth(session_id, token_info)
+        # Refreshes (and stores) the token if it has expired, None if it is unusable
+        token_info = sp_oauth.validate_token(token_info)
+        if token_info:
+            sp = Spotify(
+                auth_manager=sp_oauth,
+                # spotipy infers bool from the default, but it accepts a requests.Session
+                requests_session=http_clients.session_for("https://api.spotify.com"),  # type: ignore[arg-type]
+                requests_timeout=int(http_clients.policy("api.spotify.com").timeout)
+            )
     
-    if not token_info or not sp_oauth.validate_token(token_info):
+    g.auth_context = {'session_id': session_id, 'token_info': token_info, 'sp': sp}
+    return g.auth_context
+
+def get_authenticated_spotify():
+    """
+    Helper function to get authenticated Spotify client.
+    Returns tuple: (Spotify client, None) or (None, error_response)
+    """
+    sp = get_auth_context()['sp']
+    if sp is None:
         # Return error dict instead of redirect
         return None, {'error': 'Not authenticated'}
-    
-    sp = Spotify(auth_manager=sp_oauth)
     return sp, None
 
+def get_session_user():
+    """
+    Get the authenticated user's Spotify identity: {'id', 'country', 'display_name'}.
+    Cached with the session, so /me is called once per session instead of once per request.
+    Returns None if not authenticated or the lookup fails.
+    """
+    ctx = get_auth_context()
+    if ctx['sp'] is None:
+        return None
+    if ctx.get('user') is None:
+        ctx['user'] = lookup_session_user(ctx)
+    return ctx['user']
+
+def session_user_key(auth):
+    """
+    Identity cache key for an auth context: the session plus a digest of its refresh token.
+    Connecting another Spotify account on the same session stores a new token, so every
+    worker misses and asks /me again instead of serving the previous account's identity.
+    """
+    token_info = auth['token_info'] or {}
+    token = token_info.get('refresh_token') or token_info.get('access_token') or ''
+    return f"{auth['session_id']}:{hashlib.sha256(token.encode()).hexdigest()[:16]}"
+
+def lookup_session_user(auth):
+    """Session identity from the cache, falling back to /me (safe to call off the request thread)"""
+    user = session_user_cache.get(session_user_key(auth))
+    if user is None:
+        try:
+            me = auth['sp'].current_user() or {}
+        except Exception as e:
+            print(f"Error fetching Spotify user: {e}")
+            return None
+        user = remember_session_user(auth, me)
+    return user
+
+def remember_session_user(auth, me):
+    """Cache the identity fields of a /me response for this session's token"""
+    user = {'id': me.get('id'), 'country': me.get('country'), 'display_name': me.get('display_name')}
+    session_user_cache.set(session_user_key(auth), user)
+    return user
+
 def is_authenticated():
     """
     Check if user is authenticated without creating Spotify client.
     Returns True if authenticated, False otherwise.
     """
     try:
+        if 'auth_context' in g:
+            return g.auth_context['token_info'] is not None
         session_id = get_session_id()
         token_info = get_token(session_id)
         return token_info is not None
     except:
         return False
 
-# Translation cache to avoid redundant API calls
-_translation_cache = {}
-
 def quick_language_detect(lyrics: str) -> Optional[str]:
     """
     Fast language detection using simple heuristics before API call.
@@ -261,10 +366,13 @@ def quick_language_detect(lyrics: str) -> Optional[str]:
     
     return None  # Need API detection (or likely English)
 
+TRANSLATION_FALLBACK_MODEL = "llama-3.1-8b-instant"
+
 def batch_detect_and_translate(lyrics_list: list) -> list:
     """
     Translate lyrics using DeepL API with batch processing (high quality, fast).
-    Groups lyrics by language and makes batch API calls for better performance.
+    Checks the shared translation cache first, then groups the misses by language
+    and makes batch API calls for better performance.
     Falls back to Groq LLM if DeepL fails.
     
     Args:
@@ -300,7 +408,19 @@ def batch_detect_and_translate(lyrics_list: list) -> list:
     # Map indices for later reconstruction
     lyrics_metadata = []  # [(index, lyrics, detected_lang), ...]
     
-    for i, lyrics in enumerate(lyrics_list):
+    # Initialize output array with placeholders
+    output: list[Union[Tuple[str, str], None]] = [None] * len(lyrics_list)
+    cached_indices = set()
+    
+    # Only cache misses are sent to DeepL / Groq (one cache lookup for the whole batch)
+    for i, (lyrics, cached) in enumerate(zip(lyrics_list, get_cached_translations(lyrics_list))):
+        if cached:
+            output[i] = cached
+            cached_indices.add(i)
+            lyrics_metadata.append((i, lyrics, cached[1]))
+            print(f"    💾 [Lyrics {i+1}]: Cached translation ({cached[1]})")
+            continue
+        
         detected_lang = quick_language_detect(lyrics)
         if not detected_lang:
             detected_lang = 'unknown'
@@ -313,8 +433,8 @@ def batch_detect_and_translate(lyrics_list: list) -> list:
         else:
             print(f"    🔍 [Lyrics {i+1}]: Unknown language (will use DeepL auto-detect)")
     
-    # Initialize output array with placeholders
-    output: list[Union[Tuple[str, str], None]] = [None] * len(lyrics_list)
+    if cached_indices:
+        print(f"💾 {len(cached_indices)}/{len(lyrics_list)} lyrics served from translation cache")
     
     # Step 2: Handle English lyrics (no translation needed)
     if language_groups['en']:
@@ -356,11 +476,11 @@ def batch_detect_and_translate(lyrics_list: list) -> list:
                 for text in texts:
                     deepl_params.append(("text", text))
                 
-                translate_response = requests.post(
+                # Pooled session: 30s timeout for batches, retried on 429/5xx (see http_clients)
+                translate_response = http_clients.post(
                     translate_url,
                     data=deepl_params,
-                    headers=deepl_headers,
-                    timeout=30  # Longer timeout for batch
+                    headers=deepl_headers
                 )
                 
                 if translate_response.ok:
@@ -410,8 +530,6 @@ def batch_detect_and_translate(lyrics_list: list) -> list:
     
     if failed_count > 0:
         print(f"⚠️  Found {failed_count} failed translations, using Groq LLM fallback...")
-        from groq import Groq
-        groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
         
         for i, item in enumerate(output):
             if item is None:
@@ -431,12 +549,16 @@ def batch_detect_and_translate(lyrics_list: list) -> list:
 
 {lyrics_for_groq}"""
                         
-                        groq_response = groq_client.chat.completions.create(
-                            model="llama-3.1-8b-instant",
-                            messages=[{"role": "user", "content": translation_prompt}],
-                temperature=0.3,
-                max_tokens=2000
-            )
+                        # The translation comes out about as long as the lyrics going in
+                        groq_response = ai_service.complete(
+                            "translation_fallback",
+                            TRANSLATION_FALLBACK_MODEL,
+                            [{"role": "user", "content": translation_prompt}],
+                            priority=PRIORITY_SCORING,  # Scoring waits on these translations
+                            expected_completion=approx_token_count(lyrics_for_groq),
+                            temperature=0.3,
+                            max_tokens=2000
+                        )
             
                         content = groq_response.choices[0].message.content
                         translated_text = content.strip() if content else ""
@@ -456,6 +578,16 @@ def batch_detect_and_translate(lyrics_list: list) -> list:
                     output[i] = (original_lyrics, 'en')
                     print(f"    ✅ [Lyrics {i+1}]: English (fallback)")
     
+    # Step 5: Remember new results (failed translations are not cached so they get retried)
+    new_translations = []
+    for i, item in enumerate(output):
+        if i in cached_indices or item is None:
+            continue
+        translated_text, detected_lang = item
+        if detected_lang == 'en' or translated_text != lyrics_list[i]:
+            new_translations.append((lyrics_list[i], translated_text, detected_lang))
+    cache_translations(new_translations)
+    
     return output
 
 def translate_lyrics(lyrics: str) -> tuple[str, Optional[str]]:
@@ -467,145 +599,73 @@ def translate_lyrics(lyrics: str) -> tuple[str, Optional[str]]:
     if not lyrics:
         return lyrics, None
     
-    # Check cache first
-    import hashlib
-    lyrics_hash = hashlib.md5(lyrics[:500].encode()).hexdigest()
-    if lyrics_hash in _translation_cache:
-        cached = _translation_cache[lyrics_hash]
-        print(f"    💾 Using cached translation")
-        return cached
-    
-    # Use batch function for single item
+    # Use batch function for single item (it consults the translation cache)
     result = batch_detect_and_translate([lyrics])
     if result:
         translated, lang = result[0]
-        _translation_cache[lyrics_hash] = (translated, lang)
         return translated, lang
     
     # Fallback: return original lyrics if batch translation fails
     return lyrics, None
 
-def get_lyrics(track_name, artist_name):
+def get_lyrics(track_name, artist_name, track_id=None):
     """
-    Fetch lyrics from Genius API and translate to English if needed.
+    Fetch lyrics from the lyrics store or Genius API and translate to English if needed.
     
     Args:
         track_name: Name of the track
         artist_name: Name of the artist (can be comma-separated)
+        track_id: Spotify track ID (optional, used as the lyrics store key)
     
     Returns:
         Dict with keys: 'original', 'translated', 'language', or None if not found
     """
-    if not genius:
-        return None
-    
     try:
-        # Get primary artist (first one if comma-separated)
-        primary_artist = artist_name.split(',')[0].strip() if ',' in artist_name else artist_name.strip()
+        store_key = track_id or song_key(track_name, artist_name)
+        entry, _ = fetch_lyrics(genius, store_key, track_name, artist_name)
         
-        print(f"    🔍 Searching Genius for: '{track_name}' by {primary_artist}")
-        
-        # Search for the song
-        song = genius.search_song(track_name, primary_artist)
+        if not entry:
+            return None
         
-        if song and song.lyrics:
-            # Clean up lyrics (remove "Lyrics" header and extra whitespace)
-            lyrics = song.lyrics
-            # Remove common headers
-            if lyrics.startswith("Lyrics"):
-                lyrics = lyrics.split("\n", 1)[1] if "\n" in lyrics else lyrics
-            lyrics = lyrics.strip()
-            
-            print(f"    ✅ Found lyrics ({len(lyrics)} chars)")
-            
-            # Translate if needed
-            translated_lyrics, detected_lang = translate_lyrics(lyrics)
-            
-            # If detected_lang is None (error during detection), default to 'en'
-            # But if detected_lang is set, use it even if translation failed
-            final_language = detected_lang if detected_lang else 'en'
-            
-            # Check if translation actually happened (original ≠ translated)
-            was_translated = translated_lyrics != lyrics
-            
-            if was_translated:
-                print(f"    ✅ Translation successful: {final_language} → en")
-            elif detected_lang and detected_lang != 'en':
-                print(f"    ⚠️  Translation failed, but detected language is: {final_language}")
-            else:
-                print(f"    ℹ️  Lyrics are in English or could not detect language")
-            
-            result = {
+        lyrics = entry['original']
+        if entry.get('language'):
+            # Already detected/translated on an earlier request
+            return {
                 'original': lyrics,
-                'translated': translated_lyrics,
-                'language': final_language
+                'translated': entry.get('translated') or lyrics,
+                'language': entry['language']
             }
-            
-            return result
-        else:
-            print(f"    ⚠️  No lyrics found")
-            return None
-            
-    except Exception as e:
-        print(f"    ❌ Error fetching lyrics: {e}")
-        return None
-
-def get_itunes_preview_url(track_name, artist_name):
-    """
-    Fetch 30-second preview URL from iTunes API as fallback when Spotify preview is unavailable.
-    
-    Args:
-        track_name: Name of the track
-        artist_name: Name of the artist (can be comma-separated for multiple artists)
-    
-    Returns:
-        Preview URL string or None if not found
-    """
-    try:
-        # Clean artist name - take first artist if comma-separated
-        primary_artist = artist_name.split(',')[0].strip() if ',' in artist_name else artist_name.strip()
-        
-        # Build search query: "artist track" format works best
-        search_term = f"{primary_artist} {track_name}"
         
-        # iTunes Search API endpoint
-        url = "https://itunes.apple.com/search"
-        params = {
-            'term': search_term,
-            'media': 'music',
-            'entity': 'song',
-            'limit': 1
-        }
+        # Translate if needed
+        translated_lyrics, detected_lang = translate_lyrics(lyrics)
         
-        # Make request (no authentication needed)
-        response = requests.get(url, params=params, timeout=3)
-        response.raise_for_status()
+        # If detected_lang is None (error during detection), default to 'en'
+        # But if detected_lang is set, use it even if translation failed
+        final_language = detected_lang if detected_lang else 'en'
         
-        data = response.json()
+        # Check if translation actually happened (original ≠ translated)
+        was_translated = translated_lyrics != lyrics
         
-        # Check if results exist
-        if data.get('resultCount', 0) > 0:
-            result = data['results'][0]
-            preview_url = result.get('previewUrl')
-            
-            if preview_url:
-                print(f"    ✓ iTunes preview found: {preview_url[:50]}...")
-                return preview_url
-            else:
-                print(f"    ⚠️  iTunes found track but no preview URL")
-                return None
+        if was_translated:
+            print(f"    ✅ Translation successful: {final_language} → en")
+        elif detected_lang and detected_lang != 'en':
+            print(f"    ⚠️  Translation failed, but detected language is: {final_language}")
         else:
-            print(f"    ⚠️  iTunes: No results found")
-            return None
+            print(f"    ℹ️  Lyrics are in English or could not detect language")
+        
+        if detected_lang and (detected_lang == 'en' or was_translated):
+            lyrics_store.put_translation(lyrics, translated_lyrics, detected_lang, track_id=track_id)
+        
+        result = {
+            'original': lyrics,
+            'translated': translated_lyrics,
+            'language': final_language
+        }
+        
+        return result
             
-    except requests.exceptions.Timeout:
-        print(f"    ⚠️  iTunes API timeout")
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"    ⚠️  iTunes API error: {e}")
-        return None
     except Exception as e:
-        print(f"    ⚠️  Unexpected error fetching iTunes preview: {e}")
+        print(f"    ❌ Error fetching lyrics: {e}")
         return None
 
 @app.route('/')
@@ -714,7 +774,7 @@ def get_user():
                     print(f"Extracted session_id from Cookie header: {session_id_from_header}")
                     session_id = session_id_from_header
         
-        token_info = get_token(session_id)
+        token_info = get_auth_context()['token_info']
         print(f"Has token: {token_info is not None}")
         if token_info:
             print(f"Token expires at: {token_info.get('expires_at', 'N/A')}")
@@ -727,6 +787,7 @@ def get_user():
             return jsonify({'authenticated': False, 'error': 'Not authenticated'}), 401
         
         user = sp.current_user()
+        remember_session_user(get_auth_context(), user)
         print(f"SUCCESS: Authenticated user: {user['display_name']}")  # type: ignore
         return jsonify({
             'authenticated': True,
@@ -747,6 +808,10 @@ def get_user():
 @app.route('/logout')
 def logout():
     session.clear()
+    # The next login may connect another Spotify account - drop everything cached for this user
+    clerk_id = request.headers.get('X-Clerk-User-Id')
+    if clerk_id:
+        invalidate_user(clerk_id)
     return redirect(url_for('home'))
 
 @app.route('/playlist/<playlist_id>/tracks')
@@ -1028,17 +1093,17 @@ def get_user_profile():
 def get_user_profile_data(sp, clerk_id=None):
     """
     Helper to get user profile data for AI recommendations
-    Uses Redis caching to reduce API calls and improve speed
+    Uses Redis caching to reduce API calls and improve speed: concurrent requests share one
+    Spotify fetch, and a stale profile is returned at once while it refreshes in the background
     """
-    from redis_cache import get_cached_user_profile, cache_user_profile
+    from redis_cache import get_user_profile
     
-    # Try to get from cache first
     if clerk_id:
-        cached_profile = get_cached_user_profile(clerk_id)
-        if cached_profile:
-            print(f"✅ Using cached user profile for {clerk_id}")
-            return cached_profile
-    
+        return get_user_profile(clerk_id, lambda: fetch_user_profile_data(sp))
+    return fetch_user_profile_data(sp)
+
+def fetch_user_profile_data(sp):
+    """Fetch the user's profile (top tracks, artists, genres) from Spotify"""
     try:
         print(f"\n=== FETCHING REAL SPOTIFY USER PROFILE ===")
         
@@ -1086,11 +1151,6 @@ def get_user_profile_data(sp, clerk_id=None):
         print(f"  Genres: {profile_data['genres'][:10]}")
         print(f"====================================\n")
         
-        # Cache the profile for future requests
-        if clerk_id:
-            cache_user_profile(clerk_id, profile_data)
-            print(f"✅ Cached user profile for {clerk_id}")
-        
         return profile_data
         
     except Exception as e:
@@ -1195,6 +1255,40 @@ def api_status():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/token_usage', methods=['GET'])
+def api_token_usage():
+    """Get per-endpoint Groq token usage histograms (prompt / completion / total)"""
+    try:
+        return jsonify(get_token_usage_stats())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/db_stats', methods=['GET'])
+def api_db_stats():
+    """Get Postgres connection pool metrics plus session token cache / reaper stats"""
+    try:
+        stats = get_pool_stats()
+        stats["sessions"] = get_session_stats()
+        return jsonify(stats)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/http_stats', methods=['GET'])
+def api_http_stats():
+    """Get outbound HTTP connection reuse metrics per upstream host"""
+    try:
+        return jsonify(get_http_stats())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/cache_stats', methods=['GET'])
+def api_cache_stats():
+    """Get Redis and in-process cache statistics (hit/miss counters per cache)"""
+    try:
+        return jsonify(get_cache_stats())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # === USER EMOTIONS ENDPOINTS ===
 
 @app.route('/user_emotions', methods=['GET'])
@@ -1262,42 +1356,71 @@ def delete_user_emotion(emotion_id):
         print(f"Error deleting user emotion: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/dj_recommend', methods=['POST'])
-def dj_recommend():
-    """Get Musify recommendations: LLM recommends songs, then we fetch from Spotify"""
-    sp, redirect_response = get_authenticated_spotify()
-    if redirect_response:
-        return redirect_response
-    if sp is None:
-        return jsonify({"error": "Not authenticated"}), 401
+class RecommendationError(Exception):
+    """Recommendation pipeline failure that maps to an HTTP error response"""
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+def run_dj_pipeline(sp, data, graph):
+    """
+    The full recommendation pipeline as a generator of progress events.
+    Shared by /dj_recommend (which only keeps the final payload) and
+    /dj_recommend_stream (which forwards every event as SSE).
+    Must run inside the request context (reads headers, session and flask.g).
+    
+    Yields, in order:
+        {"type": "intro_delta", "delta": "..."}              - intro text as the LLM writes it
+        {"type": "intro", "content": "..."}                  - the complete intro
+        {"type": "track", "index": i, "data": {...}}         - each track as its Spotify search finishes
+                                                               (songs start resolving while the LLM is still streaming)
+        {"type": "lyrics_scores", "data": {track_id: 1-5}}
+        {"type": "selection", "track_ids": [...]}            - final tracks, best first
+        {"type": "explanation", "data": {...}}              - each explanation as it completes
+        {"type": "complete", "data": {...}}                 - the /dj_recommend response payload
+    
+    Raises:
+        RecommendationError: for failures that map to an HTTP error (e.g. no Spotify profile)
+    """
+    user_message = data.get('message', '') or 'recommend me some great songs'
+    selected_tool = data.get('tool')
     
+    # Identity is read from the request here - graph stages run on worker threads
+    clerk_id = None
     try:
-        import json
-        
-        data = request.json
-        if data is None:
-            return jsonify({"error": "JSON body is required"}), 400
-        user_message = data.get('message', '') or 'recommend me some great songs'
-        selected_tool = data.get('tool')
-        
-        # Check for custom emotion definitions in input text FIRST (before any tool modifications)
+        clerk_id = get_clerk_user_id()
+    except Exception as e:
+        print(f"⚠️  Could not get Clerk user ID: {e}")
+    # Get Clerk user ID for caching
+    profile_cache_id = session.get('clerk_user_id')
+    auth = get_auth_context()
+    conversation_history = session.get('conversation_history', [])
+    original_message = user_message
+
+    # === PREFETCH STAGE GRAPH ===
+    # emotions -> message -> similar_tracks ─┐
+    # weather, profile, audio_profile ───────┼─> LLM (request thread)
+    # recent_tracks, country ─────────────────┴─> Spotify resolve
+    # Everything except the LLM call's inputs keeps loading while the LLM runs.
+
+    def load_emotion_context():
+        """Check for custom emotion definitions in input text FIRST (before any tool modifications)"""
         emotion_context_to_add = None
         try:
-            clerk_id = get_clerk_user_id()
             if chat_db and clerk_id:
                 # Get all user-defined emotions
                 emotions = chat_db.get_user_emotions(clerk_id)
-                
+
                 if emotions:
                     import re
                     # Check if any emotion term appears in the user message
-                    original_message_lower = user_message.lower()
+                    original_message_lower = original_message.lower()
                     found_emotions = []
-                    
+
                     for emotion_data in emotions:
                         emotion_term = emotion_data['emotion'].lower()
                         definition = emotion_data['definition']
-                        
+
                         # Use word boundaries to match whole words only (case-insensitive)
                         # This prevents matching "happy" inside "unhappy"
                         pattern = r'\b' + re.escape(emotion_term) + r'\b'
@@ -1307,23 +1430,23 @@ def dj_recommend():
                                 'definition': definition
                             })
                             print(f"✅ Detected emotion term '{emotion_data['emotion']}' in user message")
-                    
+
                     # If emotion terms were found, prepare context to add
                     if found_emotions:
                         emotion_contexts = []
                         for emo in found_emotions:
                             emotion_contexts.append(f"'{emo['emotion']}' (my personal definition: {emo['definition']})")
-                        
+
                         context_text = " | ".join(emotion_contexts)
                         emotion_context_to_add = f" [Important context: When I mention these emotions, use my personal definitions: {context_text}]"
                         print(f"📝 Detected emotion terms in input: {', '.join([e['emotion'] for e in found_emotions])}")
-                
+
                 # Also check for emotion tool (legacy support)
                 if selected_tool and selected_tool.startswith('emotion-'):
                     emotion_name = selected_tool.replace('emotion-', '').lower()
                     # Find matching emotion (case-insensitive)
                     definition = next((e['definition'] for e in emotions if e['emotion'].lower() == emotion_name), None)
-                    
+
                     if definition:
                         print(f"✅ Found custom definition for emotion tool '{emotion_name}': {definition}")
                         # Add to emotion context
@@ -1333,231 +1456,212 @@ def dj_recommend():
                             emotion_context_to_add = f" (Context: I am feeling {emotion_name}. My personal definition of this emotion is: {definition})"
         except Exception as e:
             print(f"⚠️ Error checking custom emotion definitions: {e}")
-        
+        return emotion_context_to_add
+
+    def build_user_message(emotion_context_to_add):
+        """Final prompt: discover override plus any emotion context"""
+        message = original_message
         # Modify prompt for discover tool - recommend based only on user data
         if selected_tool == 'discover':
-            user_message = "Recommend songs based solely on my music taste and listening history. Use my top artists, genres, and audio preferences to discover new music that matches my style. Don't use any specific request - just analyze my profile and recommend the best matches."
-        
+            message = "Recommend songs based solely on my music taste and listening history. Use my top artists, genres, and audio preferences to discover new music that matches my style. Don't use any specific request - just analyze my profile and recommend the best matches."
+
         # Add emotion context if any emotions were detected
         if emotion_context_to_add:
-            user_message = user_message + emotion_context_to_add
-        
-        # Get weather data if weather tool is selected
-        weather_data = None
-        print(f"🌤️ [WEATHER DEBUG] Checking tool: selected_tool={selected_tool}", flush=True)
+            message = message + emotion_context_to_add
+        return message
+
+    def load_weather():
+        """Get weather data for the weather tool"""
+        print("🌤️ [WEATHER DEBUG] ✅ Weather tool selected - fetching weather data...", flush=True)
         sys.stdout.flush()
-        
-        if selected_tool == 'weather':
-            print("🌤️ [WEATHER DEBUG] ✅ Weather tool selected - fetching weather data...", flush=True)
+        # Get location from request if available
+        location = data.get('location')
+        print(f"🌤️ [WEATHER DEBUG] Location from request: {location}", flush=True)
+        print(f"🌤️ [WEATHER DEBUG] Location type: {type(location)}", flush=True)
+        sys.stdout.flush()
+
+        lat = location.get('lat') if location and isinstance(location, dict) else None
+        lon = location.get('lon') if location and isinstance(location, dict) else None
+
+        print(f"🌤️ [WEATHER DEBUG] Extracted coordinates: lat={lat}, lon={lon}", flush=True)
+        sys.stdout.flush()
+
+        if lat and lon:
+            print(f"🌤️ [WEATHER DEBUG] 📍 Using user location: {lat}, {lon}", flush=True)
             sys.stdout.flush()
-            # Get location from request if available
-            location = data.get('location')
-            print(f"🌤️ [WEATHER DEBUG] Location from request: {location}", flush=True)
-            print(f"🌤️ [WEATHER DEBUG] Location type: {type(location)}", flush=True)
+            weather_data = get_weather_data(lat=lat, lon=lon)
+        else:
+            print("🌤️ [WEATHER DEBUG] 📍 No user location provided, using default (New York)", flush=True)
             sys.stdout.flush()
-            
-            lat = location.get('lat') if location and isinstance(location, dict) else None
-            lon = location.get('lon') if location and isinstance(location, dict) else None
-            
-            print(f"🌤️ [WEATHER DEBUG] Extracted coordinates: lat={lat}, lon={lon}", flush=True)
+            weather_data = get_weather_data()
+
+        if weather_data:
+            print(f"🌤️ [WEATHER DEBUG] ✅ Weather data fetched successfully:", flush=True)
+            print(f"   - {weather_data['description']}, {weather_data['temperature']}°C in {weather_data['city']}", flush=True)
+            print(f"🌤️ [WEATHER DEBUG] Weather data object: {weather_data}", flush=True)
             sys.stdout.flush()
-            
-            if lat and lon:
-                print(f"🌤️ [WEATHER DEBUG] 📍 Using user location: {lat}, {lon}", flush=True)
-                sys.stdout.flush()
-                weather_data = get_weather_data(lat=lat, lon=lon)
-            else:
-                print("🌤️ [WEATHER DEBUG] 📍 No user location provided, using default (New York)", flush=True)
-                sys.stdout.flush()
-                weather_data = get_weather_data()
-            
-            if weather_data:
-                print(f"🌤️ [WEATHER DEBUG] ✅ Weather data fetched successfully:", flush=True)
-                print(f"   - {weather_data['description']}, {weather_data['temperature']}°C in {weather_data['city']}", flush=True)
-                print(f"🌤️ [WEATHER DEBUG] Weather data object: {weather_data}", flush=True)
-                sys.stdout.flush()
-            else:
-                print("🌤️ [WEATHER DEBUG] ⚠️  Failed to fetch weather data - weather_data is None", flush=True)
-                sys.stdout.flush()
         else:
-            print(f"🌤️ [WEATHER DEBUG] Weather tool not selected (tool: {selected_tool}), skipping weather fetch", flush=True)
+            print("🌤️ [WEATHER DEBUG] ⚠️  Failed to fetch weather data - weather_data is None", flush=True)
             sys.stdout.flush()
-        
-        # Get Clerk user ID for caching
-        clerk_id = session.get('clerk_user_id')
-        
-        # Get user profile - MUST use real Spotify data (with caching)
-        try:
-            user_profile = get_user_profile_data(sp, clerk_id)
-        except ValueError as e:
-            # If get_user_profile_data fails, return error (no mock data)
-            print(f"❌ Failed to get user profile: {e}")
-            return jsonify({"error": str(e)}), 500
-        
-        # Get Clerk user ID for database operations
-        clerk_id = None
-        try:
-            clerk_id = get_clerk_user_id()
-        except Exception as e:
-            print(f"⚠️  Could not get Clerk user ID: {e}")
-        
-        # Get previously recommended tracks to avoid duplicates (RELAXED filtering)
+        return weather_data
+
+    def load_similar_tracks(message):
+        """Tracks from very similar prompts only (higher threshold = more strict)"""
+        return set(chat_db.get_previously_recommended_tracks(
+            user_id=clerk_id,
+            user_message=message,
+            similarity_threshold=0.8,  # Higher threshold = only very similar prompts
+            days_limit=3  # Only exclude tracks from last 3 days
+        ))
+
+    def load_recent_tracks():
+        """Recently recommended tracks - only last 15 messages and only from last 3 days"""
+        return set(chat_db.get_all_recently_recommended_tracks(
+            user_id=clerk_id,
+            limit=15,  # Reduced from 50 to 15
+            days_limit=3  # Only last 3 days
+        ))
+
+    def load_country():
+        """User's country for the market parameter (cached with the session)"""
+        return (lookup_session_user(auth) or {}).get('country')
+
+    has_user_db = bool(chat_db and clerk_id)
+    graph.add("emotions", load_emotion_context, default=None)
+    graph.add("message", build_user_message, deps=["emotions"])
+    if selected_tool == 'weather':
+        graph.add("weather", load_weather, default=None)
+    else:
+        print(f"🌤️ [WEATHER DEBUG] Weather tool not selected (tool: {selected_tool}), skipping weather fetch", flush=True)
+    # Get user profile - MUST use real Spotify data (with caching)
+    graph.add("profile", lambda: get_user_profile_data(sp, profile_cache_id))
+    # Get audio profile from database (liked tracks) as fallback
+    if has_user_db:
+        graph.add("audio_profile", lambda: chat_db.get_user_audio_profile(clerk_id), default=None)
+        # Previously recommended tracks to avoid duplicates (RELAXED filtering) -
+        # only needed by the Spotify resolve stage, so these overlap with the LLM call
+        graph.add("similar_tracks", load_similar_tracks, deps=["message"], default=set())
+        graph.add("recent_tracks", load_recent_tracks, default=set())
+    graph.add("country", load_country, default=None)
+
+    user_message = graph.result("message")
+    weather_data = graph.result("weather") if selected_tool == 'weather' else None
+
+    try:
+        user_profile = graph.result("profile")
+    except ValueError as e:
+        # If get_user_profile_data fails, return error (no mock data)
+        print(f"❌ Failed to get user profile: {e}")
+        raise RecommendationError(str(e), 500)
+
+    if has_user_db:
+        db_audio_profile = graph.result("audio_profile")
+        if db_audio_profile:
+            user_profile['db_audio_profile'] = db_audio_profile
+            print(f"✅ Loaded database audio profile: {db_audio_profile['track_count']} liked tracks")
+            print(f"   Energy: {db_audio_profile.get('energy', 0):.2f}, "
+                  f"Danceability: {db_audio_profile.get('danceability', 0):.2f}, "
+                  f"Valence: {db_audio_profile.get('valence', 0):.2f}")
+        else:
+            print("⚠️  No database audio profile available (user has no liked tracks with audio features)")
+
+    # Log user profile data
+    print(f"\n=== USER PROFILE DATA ===")
+    print(f"User message: {user_message}")
+    print(f"Genres: {user_profile.get('genres', [])[:10]}")
+    print(f"Top Artists: {[a['name'] for a in user_profile.get('top_artists', [])[:5]]}")
+    print(f"Top Tracks: {[t['name'] for t in user_profile.get('top_tracks', [])[:5]]}")
+    print(f"Audio Features (Spotify): {user_profile.get('audio_features_avg', {})}")
+    print(f"Audio Features (Database): {user_profile.get('db_audio_profile', {})}")
+    print(f"=========================\n")
+
+    # Get AI recommendations (JSON with intro + songs list)
+    print(f"🌤️ [WEATHER DEBUG] Calling AI service with weather_data: {weather_data is not None}", flush=True)
+    if weather_data:
+        print(f"🌤️ [WEATHER DEBUG] Weather data being passed to AI: {weather_data}", flush=True)
+    sys.stdout.flush()
+
+    def start_resolution():
+        """Spotify resolution starts with the first streamed song - dedup sets and market must be ready by then"""
         previously_recommended_track_ids = set()
-        if chat_db and clerk_id:
-            try:
-                # Get tracks from very similar prompts only (higher threshold = more strict)
-                similar_tracks = chat_db.get_previously_recommended_tracks(
-                    user_id=clerk_id,
-                    user_message=user_message,
-                    similarity_threshold=0.8,  # Higher threshold = only very similar prompts
-                    days_limit=3  # Only exclude tracks from last 3 days
-                )
-                previously_recommended_track_ids.update(similar_tracks)
-                
-                # Also get recently recommended tracks but with reduced limit
-                # Only check last 15 messages and only from last 3 days
-                all_recent_tracks = chat_db.get_all_recently_recommended_tracks(
-                    user_id=clerk_id,
-                    limit=15,  # Reduced from 50 to 15
-                    days_limit=3  # Only last 3 days
-                )
-                previously_recommended_track_ids.update(all_recent_tracks)
-                
-                if len(previously_recommended_track_ids) > 0:
-                    print(f"🚫 Excluding {len(previously_recommended_track_ids)} recently recommended tracks (last 3 days)")
-            except Exception as e:
-                print(f"⚠️  Could not load previously recommended tracks: {e}")
-                # Continue without duplicate prevention
-        
-        # Get audio profile from database (liked tracks) as fallback
-        if chat_db and clerk_id:
-            try:
-                db_audio_profile = chat_db.get_user_audio_profile(clerk_id)
-                if db_audio_profile:
-                    user_profile['db_audio_profile'] = db_audio_profile
-                    print(f"✅ Loaded database audio profile: {db_audio_profile['track_count']} liked tracks")
-                    print(f"   Energy: {db_audio_profile.get('energy', 0):.2f}, "
-                          f"Danceability: {db_audio_profile.get('danceability', 0):.2f}, "
-                          f"Valence: {db_audio_profile.get('valence', 0):.2f}")
-                else:
-                    print("⚠️  No database audio profile available (user has no liked tracks with audio features)")
-            except Exception as e:
-                print(f"⚠️  Could not load database audio profile: {e}")
-                # Continue without database profile
-        
-        # Log user profile data
-        print(f"\n=== USER PROFILE DATA ===")
-        print(f"User message: {user_message}")
-        print(f"Genres: {user_profile.get('genres', [])[:10]}")
-        print(f"Top Artists: {[a['name'] for a in user_profile.get('top_artists', [])[:5]]}")
-        print(f"Top Tracks: {[t['name'] for t in user_profile.get('top_tracks', [])[:5]]}")
-        print(f"Audio Features (Spotify): {user_profile.get('audio_features_avg', {})}")
-        print(f"Audio Features (Database): {user_profile.get('db_audio_profile', {})}")
-        print(f"=========================\n")
-        
-        # Get conversation history
-        conversation_history = session.get('conversation_history', [])
+        if has_user_db:
+            previously_recommended_track_ids.update(graph.result("similar_tracks"))
+            previously_recommended_track_ids.update(graph.result("recent_tracks"))
+        country = graph.result("country")
         
-        # Get AI recommendations (JSON with intro + songs list)
-        print(f"🌤️ [WEATHER DEBUG] Calling AI service with weather_data: {weather_data is not None}", flush=True)
-        if weather_data:
-            print(f"🌤️ [WEATHER DEBUG] Weather data being passed to AI: {weather_data}", flush=True)
-        sys.stdout.flush()
-        
-        # ⏱️ TIMING: Main AI recommendation generation
-        start_time = time.time()
-        ai_response_raw = ai_service.get_recommendations(
+        # Search Spotify for each recommended song
+        # Exclude previously recommended tracks to avoid duplicates
+        print(f"\n=== SPOTIFY SEARCH (filtering duplicates) ===")
+        if previously_recommended_track_ids:
+            print(f"🚫 Excluding {len(previously_recommended_track_ids)} previously recommended tracks to prevent duplicates (last 3 days)")
+        else:
+            print(f"ℹ️  No previously recommended tracks found - all recommendations will be new")
+        print(f"================================================\n")
+        return ResolutionBatch(sp, market=country, excluded_track_ids=previously_recommended_track_ids)
+    
+    def resolved_track_events(resolution: ResolutionBatch):
+        """Emit tracks whose search has finished (each Spotify track once)"""
+        for llm_index, track in resolution.completed():
+            if track['id'] not in emitted_ids:
+                emitted_ids.add(track['id'])
+                yield {"type": "track", "index": llm_index, "data": track}
+    
+    # ⏱️ TIMING: Main AI recommendation generation (streamed)
+    # The intro is sent as soon as it is written, and each song starts resolving on
+    # Spotify while the model is still writing the next one
+    ai_start = time.time()
+    ai_response_raw = ''
+    intro_sent = False
+    streamed_intro = None
+    streamed_songs = {}  # LLM index -> song
+    resolution: Optional[ResolutionBatch] = None
+    resolution_start = 0.0
+    emitted_ids = set()
+    # The batch's searches are cancelled if the stream or parsing fails (or the client goes away)
+    try:
+        for event in ai_service.stream_recommendations(
             user_message,
             user_profile,
             conversation_history,
             weather_data=weather_data
-        )
-        ai_recommendation_time = time.time() - start_time
-        print(f"⏱️  [TIMING] AI Recommendations: {ai_recommendation_time:.2f}s")
-        
+        ):
+            if event['type'] in ('intro_delta', 'intro'):
+                if event['type'] == 'intro':
+                    intro_sent = True
+                    streamed_intro = event['content']
+                yield event
+            elif event['type'] == 'song':
+                if resolution is None:
+                    resolution_start = time.time()
+                    resolution = start_resolution()
+                streamed_songs[event['index']] = event['data']
+                resolution.submit(event['index'], event['data'])
+            elif event['type'] == 'done':
+                ai_response_raw = event['raw']
+            if resolution:
+                yield from resolved_track_events(resolution)
+        ai_recommendation_time = time.time() - ai_start
+        graph.record("ai_recommendations", ai_recommendation_time)
+        print(f"⏱️  [TIMING] AI Recommendations: {ai_recommendation_time:.2f}s ({len(streamed_songs)} songs streamed)")
+
         # Log raw AI response
         print(f"\n=== AI RAW RESPONSE ===")
         print(f"{ai_response_raw}")
         print(f"=======================\n")
-        
-        # Parse JSON response from LLM
+
+        # Parse JSON response from LLM (strips fences/chatter, repairs quotes, commas and truncation)
         try:
-            # Try to extract JSON from response (in case LLM adds extra text)
-            ai_response_json = json.loads(ai_response_raw)
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
-            print(f"Response length: {len(ai_response_raw)}")
-            print(f"Response type: {type(ai_response_raw)}")
-            
-            # Try to extract JSON from markdown code blocks or plain text
-            import re
-            json_match = re.search(r'\{.*\}', ai_response_raw, re.DOTALL)
-            if json_match:
-                try:
-                    json_str = json_match.group()
-                    # Try to fix common JSON issues: unescaped quotes in strings
-                    # This is a simple fix - replace unescaped quotes in string values
-                    # More robust would be to use a JSON repair library, but this should handle most cases
-                    ai_response_json = json.loads(json_str)
-                except json.JSONDecodeError as e2:
-                    print(f"Failed to parse extracted JSON: {e2}")
-                    print(f"Extracted text: {json_str[:500]}")
-                    # Try to manually fix common issues
-                    try:
-                        # Replace unescaped quotes in the intro field
-                        fixed_json = re.sub(
-                            r'"intro":\s*"([^"]*(?:\\.[^"]*)*)"',
-                            lambda m: f'"intro": {json.dumps(m.group(1))}',
-                            json_str,
-                            flags=re.DOTALL
-                        )
-                        ai_response_json = json.loads(fixed_json)
-                        print("✅ Fixed JSON by escaping quotes in intro field")
-                    except Exception as e3:
-                        print(f"Failed to fix JSON: {e3}")
-                        # Last resort: try to extract just the intro and songs manually
-                        # More flexible regex to handle unescaped quotes
-                        intro_match_result: re.Match[str] | None = re.search(r'"intro":\s*"((?:[^"\\]|\\.|"(?!"))*(?:"|$))', json_str, re.DOTALL)
-                        intro_match: re.Match[str] | None = intro_match_result
-                        if not intro_match:
-                            # Try even more flexible: find intro field and extract until we hit ", "songs"
-                            intro_start = json_str.find('"intro":')
-                            if intro_start != -1:
-                                intro_start = json_str.find('"', intro_start + 8) + 1
-                                songs_start = json_str.find('"songs":', intro_start)
-                                if songs_start != -1:
-                                    intro_text = json_str[intro_start:songs_start-2].strip().rstrip('",')
-                                    # Clean up the intro text
-                                    intro_text = intro_text.strip('"').replace('\\"', '"').replace('\\n', '\n')
-                                    # Create a simple match-like object
-                                    class MockMatch:
-                                        def __init__(self, text: str):
-                                            self._text = text
-                                        def group(self, n: int) -> str:
-                                            return self._text if n == 1 else ""
-                                    intro_match = MockMatch(intro_text)  # type: ignore
-                        
-                        songs_match = re.search(r'"songs":\s*\[(.*?)\]', json_str, re.DOTALL)
-                        
-                        if intro_match and songs_match:
-                            intro_text_str = intro_match.group(1) if hasattr(intro_match, 'group') and callable(getattr(intro_match, 'group', None)) else str(intro_match)
-                            intro_text = intro_text_str.replace('\\"', '"').replace('\\n', '\n').strip('"')
-                            # Try to parse songs array
-                            try:
-                                songs_str = '[' + songs_match.group(1) + ']'
-                                songs = json.loads(songs_str)
-                                ai_response_json = {"intro": intro_text, "songs": songs}
-                                print("✅ Manually extracted intro and songs")
-                            except Exception as e4:
-                                print(f"Failed to parse songs: {e4}")
-                                # If songs parsing fails, at least return the intro
-                                ai_response_json = {"intro": intro_text, "songs": []}
-                                print("⚠️  Extracted intro but failed to parse songs, using empty list")
-                        else:
-                            raise ValueError(f"Could not parse JSON from LLM response. Response was: {ai_response_raw[:500]}")
-            else:
-                raise ValueError(f"Could not find JSON in LLM response. Response was: {ai_response_raw[:500]}")
-        
+            ai_response_json = parse_llm_json(ai_response_raw)
+        except LLMJSONError:
+            if not streamed_songs:
+                raise
+            # The stream already surfaced complete songs - keep them rather than failing the request
+            print(f"⚠️  Could not parse the full LLM response, using the {len(streamed_songs)} streamed songs")
+            ai_response_json = {
+                "intro": streamed_intro or 'Check out these amazing tracks!',
+                "songs": [streamed_songs[index] for index in sorted(streamed_songs)]
+            }
+    
         # Extract intro and songs
         # Handle both "songs" and "recommendations" keys (for backward compatibility)
         dj_intro = ai_response_json.get('intro', 'Check out these amazing tracks!')
@@ -1572,667 +1676,635 @@ def dj_recommend():
                     for rec in recommendations
                 ]
                 print(f"✅ Converted {len(llm_songs)} recommendations to songs format")
-        
+        # Repaired output can contain stray non-song elements
+        llm_songs = [song for song in llm_songs if isinstance(song, dict)]
+
         print(f"\n=== PARSED LLM RECOMMENDATIONS ===")
         print(f"DJ Intro: {dj_intro}")
         print(f"Songs to search: {len(llm_songs)}")
         for i, song in enumerate(llm_songs[:7], 1):  # Show first 7 (we requested 7)
             print(f"  {i}. {song.get('title', 'Unknown')} by {song.get('artist', 'Unknown')}")
         print(f"==================================\n")
-        
-        # Get user's country for market parameter
-        country = None
+    
+        if not intro_sent:
+            yield {"type": "intro", "content": dj_intro}
+    
+        # Songs the incremental parser couldn't surface (e.g. malformed JSON repaired above) resolve now
+        if resolution is None:
+            resolution_start = time.time()
+            resolution = start_resolution()
+        unresolved = [(index, song_data) for index, song_data in enumerate(llm_songs) if index not in streamed_songs]
+        # One resolution-cache round trip for all of them (streamed songs each start as soon as they're written)
+        resolution.prefetch([song_data for _, song_data in unresolved])
+        for index, song_data in unresolved:
+            resolution.submit(index, song_data)
+    
+        # Wait for the remaining searches, emitting each track as soon as its own search finishes
+        for llm_index, track in resolution.completed(wait=True):
+            if track['id'] not in emitted_ids:
+                emitted_ids.add(track['id'])
+                yield {"type": "track", "index": llm_index, "data": track}
+        # The rest of the pipeline works in LLM order
+        tracks = resolution.tracks()
+        graph.record("spotify_search", time.time() - resolution_start)
+    finally:
+        if resolution is not None:
+            resolution.close()
+    found_count = len(tracks)
+
+    print(f"\n=== SPOTIFY SEARCH RESULTS ===")
+    print(f"Found {found_count} out of {len(llm_songs)} recommended songs")
+    if found_count < len(llm_songs):
+        print(f"⚠️  Could not find {len(llm_songs) - found_count} song(s) on Spotify")
+    print(f"==============================\n")
+
+    # Try to fetch audio features for recommended tracks
+    # Note: Audio features API may not be available for new apps (deprecated Nov 2024)
+    # Skip audio features fetch if API is restricted (403) - not critical for recommendations
+    print(f"\n=== FETCHING AUDIO FEATURES FOR RECOMMENDED TRACKS ===")
+    if tracks:
+        track_ids = [track['id'] for track in tracks]
         try:
-            me = sp.current_user()
-            country = (me or {}).get('country')
-        except Exception:
-            country = None
-        
-        # Search Spotify for each recommended song
-        # Exclude previously recommended tracks to avoid duplicates
-        # ⏱️ TIMING: Spotify search
-        spotify_search_start = time.time()
-        tracks = []
-        found_count = 0
-        
-        print(f"\n=== SPOTIFY SEARCH (filtering duplicates) ===")
-        if previously_recommended_track_ids:
-            print(f"🚫 Excluding {len(previously_recommended_track_ids)} previously recommended tracks to prevent duplicates")
-        else:
-            print(f"ℹ️  No previously recommended tracks found - all recommendations will be new")
-        print(f"================================================\n")
-        
-        for song_data in llm_songs:
-            title = song_data.get('title', '').strip()
-            artist = song_data.get('artist', '').strip()
-            
-            if not title or not artist:
-                continue
-            
-            try:
-                # Search for the song using both title and artist
-                query = f"track:{title} artist:{artist}"
-                print(f"Searching Spotify: {query}")
-                
-                search_results = sp.search(
-                    q=query,
-                    type='track',
-                    limit=1,
-                    market=country or 'US'
-                )
-                
-                if search_results and search_results['tracks']['items']:  # type: ignore
-                    track = search_results['tracks']['items'][0]  # type: ignore
-                    track_id = track['id']  # type: ignore
-                    
-                    # Skip if this track was already recommended
-                    if track_id in previously_recommended_track_ids:
-                        print(f"  ⏭️  Skipping duplicate: {track['name']} by {', '.join([a['name'] for a in track['artists']])} (already recommended)")  # type: ignore
-                        continue
-                    
-                    found_count += 1
-                    
-                    preview_url = track.get('preview_url')  # type: ignore
-                    print(f"  ✓ Found: {track['name']} by {', '.join([a['name'] for a in track['artists']])}")  # type: ignore
-                    print(f"    Preview URL: {preview_url if preview_url else 'NULL/None'}")
-                    
-                    # If Spotify preview is missing, try iTunes as fallback
-                    if not preview_url:
-                        print(f"    Trying iTunes API fallback...")
-                        artist_name = ', '.join([a['name'] for a in track['artists']])  # type: ignore
-                        itunes_preview = get_itunes_preview_url(track['name'], artist_name)  # type: ignore
-                        if itunes_preview:
-                            preview_url = itunes_preview
-                    
-                    tracks.append({
-                        'position': len(tracks) + 1,
-                        'id': track['id'],  # type: ignore
-                        'name': track['name'],  # type: ignore
-                        'artist': ', '.join([a['name'] for a in track['artists']]),  # type: ignore
-                        'artists': [{'name': a['name'], 'id': a['id']} for a in track['artists']],  # type: ignore
-                        'album': {
-                            'name': track['album']['name'],  # type: ignore
-                            'images': track['album']['images']  # type: ignore
-                        },
-                        'preview_url': preview_url,  # This will be Spotify or iTunes URL
-                        'external_url': track['external_urls']['spotify'],  # type: ignore
-                        'duration_ms': track['duration_ms'],  # type: ignore
-                        'popularity': track['popularity']  # type: ignore
-                    })
-                else:
-                    # Try searching with just the title
-                    search_results = sp.search(
-                        q=f"track:{title}",
-                        type='track',
-                        limit=1,
-                        market=country or 'US'
-                    )
-                    
-                    if search_results and search_results['tracks']['items']:  # type: ignore
-                        track = search_results['tracks']['items'][0]  # type: ignore
-                        track_id = track['id']  # type: ignore
-                        
-                        # Skip if this track was already recommended
-                        if track_id in previously_recommended_track_ids:
-                            print(f"  ⏭️  Skipping duplicate: {track['name']} by {', '.join([a['name'] for a in track['artists']])} (already recommended)")  # type: ignore
-                            continue
-                        
-                        found_count += 1
-                        
-                        preview_url = track.get('preview_url')  # type: ignore
-                        print(f"  ✓ Found (title only): {track['name']} by {', '.join([a['name'] for a in track['artists']])}")  # type: ignore
-                        print(f"    Preview URL: {preview_url if preview_url else 'NULL/None'}")
-                        
-                        # If Spotify preview is missing, try iTunes as fallback
-                        if not preview_url:
-                            print(f"    Trying iTunes API fallback...")
-                            artist_name = ', '.join([a['name'] for a in track['artists']])  # type: ignore
-                            itunes_preview = get_itunes_preview_url(track['name'], artist_name)  # type: ignore
-                            if itunes_preview:
-                                preview_url = itunes_preview
-                        
-                        tracks.append({
-                            'position': len(tracks) + 1,
-                            'id': track['id'],  # type: ignore
-                            'name': track['name'],  # type: ignore
-                            'artist': ', '.join([a['name'] for a in track['artists']]),  # type: ignore
-                            'artists': [{'name': a['name'], 'id': a['id']} for a in track['artists']],  # type: ignore
-                            'album': {
-                                'name': track['album']['name'],
-                                'images': track['album']['images']
-                            },
-                            'preview_url': preview_url,  # This will be Spotify or iTunes URL
-                            'external_url': track['external_urls']['spotify'],
-                            'duration_ms': track['duration_ms'],
-                            'popularity': track['popularity']
-                        })
-                    else:
-                        print(f"  ✗ Not found: {title} by {artist}")
-                        
-            except Exception as e:
-                print(f"  ✗ Error searching for {title} by {artist}: {e}")
-                continue
-        
-        print(f"\n=== SPOTIFY SEARCH RESULTS ===")
-        print(f"Found {found_count} out of {len(llm_songs)} recommended songs")
-        if found_count < len(llm_songs):
-            print(f"⚠️  Could not find {len(llm_songs) - found_count} song(s) on Spotify")
-        print(f"==============================\n")
-        
-        spotify_search_time = time.time() - spotify_search_start
-        print(f"⏱️  [TIMING] Spotify Search: {spotify_search_time:.2f}s")
-        
-        # Try to fetch audio features for recommended tracks
-        # Note: Audio features API may not be available for new apps (deprecated Nov 2024)
-        # Skip audio features fetch if API is restricted (403) - not critical for recommendations
-        print(f"\n=== FETCHING AUDIO FEATURES FOR RECOMMENDED TRACKS ===")
-        if tracks:
-            track_ids = [track['id'] for track in tracks]
-            try:
-                # Try to fetch audio features in batches (Spotify limit is 100 per request)
-                print(f"  Attempting to fetch audio features for {len(track_ids)} tracks...")
-                audio_features = sp.audio_features(track_ids)
-                
-                if audio_features and len(audio_features) > 0:
-                    # Create a mapping of track_id to audio features
-                    features_map = {}
-                    for i, track_id in enumerate(track_ids):
-                        if audio_features and i < len(audio_features) and audio_features[i]:
-                            features_map[track_id] = audio_features[i]
-                    
-                    # Add audio features to each track
-                    features_count = 0
-                    for track in tracks:
-                        if track['id'] in features_map:
-                            features = features_map[track['id']]
-                            track['audio_features'] = {
-                                'energy': features.get('energy'),
-                                'danceability': features.get('danceability'),
-                                'valence': features.get('valence'),
-                                'tempo': features.get('tempo'),
-                                'acousticness': features.get('acousticness'),
-                                'instrumentalness': features.get('instrumentalness'),
-                                'liveness': features.get('liveness'),
-                                'speechiness': features.get('speechiness'),
-                                'loudness': features.get('loudness')
-                            }
-                            features_count += 1
-                    
-                    if features_count > 0:
-                        print(f"  ✅ Successfully fetched audio features for {features_count}/{len(tracks)} tracks")
-                    else:
-                        print(f"  ℹ️  No audio features returned (API may be restricted)")
-                        for track in tracks:
-                            track['audio_features'] = None
+            # Try to fetch audio features in batches (Spotify limit is 100 per request)
+            print(f"  Attempting to fetch audio features for {len(track_ids)} tracks...")
+            audio_features = sp.audio_features(track_ids)
+
+            if audio_features and len(audio_features) > 0:
+                # Create a mapping of track_id to audio features
+                features_map = {}
+                for i, track_id in enumerate(track_ids):
+                    if audio_features and i < len(audio_features) and audio_features[i]:
+                        features_map[track_id] = audio_features[i]
+
+                # Add audio features to each track
+                features_count = 0
+                for track in tracks:
+                    if track['id'] in features_map:
+                        features = features_map[track['id']]
+                        track['audio_features'] = {
+                            'energy': features.get('energy'),
+                            'danceability': features.get('danceability'),
+                            'valence': features.get('valence'),
+                            'tempo': features.get('tempo'),
+                            'acousticness': features.get('acousticness'),
+                            'instrumentalness': features.get('instrumentalness'),
+                            'liveness': features.get('liveness'),
+                            'speechiness': features.get('speechiness'),
+                            'loudness': features.get('loudness')
+                        }
+                        features_count += 1
+
+                if features_count > 0:
+                    print(f"  ✅ Successfully fetched audio features for {features_count}/{len(tracks)} tracks")
                 else:
-                    print(f"  ℹ️  Audio features API returned empty response - continuing without audio features")
+                    print(f"  ℹ️  No audio features returned (API may be restricted)")
                     for track in tracks:
                         track['audio_features'] = None
-                        
-            except Exception as e:
-                # Silently skip audio features if API is restricted or unavailable
-                error_msg = str(e)
-                if '403' in error_msg or 'Forbidden' in error_msg or 'HTTP Error' in error_msg:
-                    print(f"  ℹ️  Audio features API is restricted (403) - skipping this step")
-                    print(f"  ℹ️  Will use database audio profile for similarity scoring if available")
-                else:
-                    print(f"  ℹ️  Audio features unavailable - continuing without them")
-                
-                # Set audio_features to None for all tracks
+            else:
+                print(f"  ℹ️  Audio features API returned empty response - continuing without audio features")
                 for track in tracks:
                     track['audio_features'] = None
-        
-        print(f"===============================\n")
-        
-        # Filter tracks based on user's audio feature preferences
-        print(f"\n=== FILTERING TRACKS BY AUDIO FEATURES ===")
-        user_avg = user_profile.get('audio_features_avg', {})
-        
-        # If Spotify API doesn't have audio features, try database profile
-        if not user_avg or len(user_avg) == 0:
-            db_audio_profile = user_profile.get('db_audio_profile')
-            if db_audio_profile and db_audio_profile.get('track_count', 0) > 0:
-                # Use database averages
-                user_avg = {
-                    'energy': db_audio_profile.get('energy'),
-                    'danceability': db_audio_profile.get('danceability'),
-                    'valence': db_audio_profile.get('valence')
-                }
-                print(f"✅ Using database audio profile for similarity scoring (from {db_audio_profile['track_count']} liked tracks)")
-        
-        # Check if user has audio features available (from Spotify or database)
-        if not user_avg or len(user_avg) == 0:
-            print(f"⚠️  User audio features not available - skipping audio feature filtering")
-            print(f"   Will use all found tracks (no filtering by audio features)")
-            # Just use all tracks without filtering
+
+        except Exception as e:
+            # Silently skip audio features if API is restricted or unavailable
+            error_msg = str(e)
+            if '403' in error_msg or 'Forbidden' in error_msg or 'HTTP Error' in error_msg:
+                print(f"  ℹ️  Audio features API is restricted (403) - skipping this step")
+                print(f"  ℹ️  Will use database audio profile for similarity scoring if available")
+            else:
+                print(f"  ℹ️  Audio features unavailable - continuing without them")
+
+            # Set audio_features to None for all tracks
+            for track in tracks:
+                track['audio_features'] = None
+
+    print(f"===============================\n")
+
+    # Filter tracks based on user's audio feature preferences
+    print(f"\n=== FILTERING TRACKS BY AUDIO FEATURES ===")
+    user_avg = user_profile.get('audio_features_avg', {})
+
+    # If Spotify API doesn't have audio features, try database profile
+    if not user_avg or len(user_avg) == 0:
+        db_audio_profile = user_profile.get('db_audio_profile')
+        if db_audio_profile and db_audio_profile.get('track_count', 0) > 0:
+            # Use database averages
+            user_avg = {
+                'energy': db_audio_profile.get('energy'),
+                'danceability': db_audio_profile.get('danceability'),
+                'valence': db_audio_profile.get('valence')
+            }
+            print(f"✅ Using database audio profile for similarity scoring (from {db_audio_profile['track_count']} liked tracks)")
+
+    # Check if user has audio features available (from Spotify or database)
+    if not user_avg or len(user_avg) == 0:
+        print(f"⚠️  User audio features not available - skipping audio feature filtering")
+        print(f"   Will use all found tracks (no filtering by audio features)")
+        # Just use all tracks without filtering
+        tracks = tracks[:10] if len(tracks) > 10 else tracks
+        for i, track in enumerate(tracks, 1):
+            track['position'] = i
+    else:
+        # User has audio features - proceed with filtering
+        user_energy = user_avg.get('energy', 0.5)
+        user_danceability = user_avg.get('danceability', 0.5)
+        user_valence = user_avg.get('valence', 0.5)
+
+        print(f"User's average preferences:")
+        print(f"  Energy: {user_energy:.2f}")
+        print(f"  Danceability: {user_danceability:.2f}")
+        print(f"  Valence: {user_valence:.2f}")
+
+        # Check if tracks have audio features available
+        tracks_with_features = [t for t in tracks if t.get('audio_features')]
+
+        if tracks_with_features and len(tracks_with_features) > 0:
+            # We have audio features for some or all tracks - use them for filtering
+            print(f"✅ Found {len(tracks_with_features)} tracks with audio features")
+            print(f"   Calculating match scores based on audio features...")
+
+            # Calculate match score for each track
+            tracks_with_scores = []
+            for track in tracks:
+                if track.get('audio_features'):
+                    features = track['audio_features']
+                    track_energy = features.get('energy', 0.5) or 0.5
+                    track_danceability = features.get('danceability', 0.5) or 0.5
+                    track_valence = features.get('valence', 0.5) or 0.5
+
+                    # Calculate weighted match score (lower difference = better match)
+                    energy_diff = abs(track_energy - user_energy)
+                    danceability_diff = abs(track_danceability - user_danceability)
+                    valence_diff = abs(track_valence - user_valence)
+
+                    # Match score: lower is better (0 = perfect match, 1 = worst match)
+                    match_score = (
+                        energy_diff * 0.4 +      # 40% weight on energy
+                        danceability_diff * 0.4 +  # 40% weight on danceability
+                        valence_diff * 0.2         # 20% weight on valence
+                    )
+
+                    track['match_score'] = match_score
+                    tracks_with_scores.append(track)
+                    print(f"  {track['name']}: Energy={track_energy:.2f}, Danceability={track_danceability:.2f}, Valence={track_valence:.2f}, Match={match_score:.3f}")
+                else:
+                    # Track without audio features gets a penalty score
+                    track['match_score'] = 1.0
+                    tracks_with_scores.append(track)
+                    print(f"  {track['name']}: No audio features (match_score=1.0)")
+
+            # Sort by match score (best matches first)
+            tracks_with_scores.sort(key=lambda x: x.get('match_score', 1.0))
+
+            # Keep all tracks for now - we'll score and keep top 8 based on lyrics
+            tracks = tracks_with_scores
+            print(f"\n✅ Audio feature filtering complete - {len(tracks)} tracks sorted by match score")
+        else:
+            # No audio features available - skip audio feature filtering
+            print(f"⚠️  Tracks don't have audio features (Spotify API may not be available)")
+            print(f"   Using all tracks without audio feature filtering")
             tracks = tracks[:10] if len(tracks) > 10 else tracks
             for i, track in enumerate(tracks, 1):
                 track['position'] = i
+
+        print(f"===============================\n")
+
+    # If we found fewer than 5 tracks, add a warning
+    # Check if we have enough tracks (we requested 6, need at least 5)
+    if len(tracks) < 5:
+        print(f"⚠️  Only found {len(tracks)} tracks out of {len(llm_songs)} requested. May not reach minimum of 5 tracks.")
+
+    # ⏱️ TIMING: Lyrics fetching (now using BATCH translation)
+    lyrics_fetch_start = time.time()
+    # Fetch lyrics for all tracks with BATCH translation (should be up to 5, will select top 5 later)
+    print(f"\n=== FETCHING LYRICS & BATCH TRANSLATION + SCORING ===")
+    print(f"Processing {len(tracks)} tracks (will select best 5)")
+
+    # Step 1: Fetch all lyrics in parallel (lyrics store first, Genius only on a miss)
+    # One batched store lookup for every track instead of a round trip per track
+    stored_lyrics = lyrics_store.get_many([track['id'] for track in tracks])
+
+    def fetch_genius_lyrics(track_data):
+        """Fetch raw lyrics from the lyrics store or Genius (no translation)"""
+        i, track = track_data
+        try:
+            print(f"\n[{i}/{len(tracks)}] Fetching lyrics: {track['name']} by {track['artist']}")
+            stored = (True, stored_lyrics[track['id']]) if track['id'] in stored_lyrics else (False, None)
+            entry, _ = fetch_lyrics(genius, track['id'], track['name'], track['artist'], stored=stored)
+            return (track, entry)
+        except Exception as e:
+            print(f"    ❌ Error fetching lyrics: {e}")
+            return (track, None)
+
+    def apply_lyrics(track, original_lyrics, translated_lyrics, detected_lang):
+        """Set lyrics fields on a track from its original text, translation and language"""
+        track['lyrics_language'] = detected_lang
+
+        # For English lyrics, both will be the same (so toggle button won't show)
+        # For non-English, translated will be different (toggle button will show)
+        if detected_lang == 'en':
+            # English song - no translation needed
+            # Set lyrics to original, and lyrics_original to None to prevent toggle
+            track['lyrics'] = original_lyrics
+            track['lyrics_original'] = None  # No original needed for English
+            print(f"    ✅ [{track['name']}]: English (no translation needed)")
         else:
-            # User has audio features - proceed with filtering
-            user_energy = user_avg.get('energy', 0.5)
-            user_danceability = user_avg.get('danceability', 0.5)
-            user_valence = user_avg.get('valence', 0.5)
-            
-            print(f"User's average preferences:")
-            print(f"  Energy: {user_energy:.2f}")
-            print(f"  Danceability: {user_danceability:.2f}")
-            print(f"  Valence: {user_valence:.2f}")
-            
-            # Check if tracks have audio features available
-            tracks_with_features = [t for t in tracks if t.get('audio_features')]
-            
-            if tracks_with_features and len(tracks_with_features) > 0:
-                # We have audio features for some or all tracks - use them for filtering
-                print(f"✅ Found {len(tracks_with_features)} tracks with audio features")
-                print(f"   Calculating match scores based on audio features...")
-                
-                # Calculate match score for each track
-                tracks_with_scores = []
-                for track in tracks:
-                    if track.get('audio_features'):
-                        features = track['audio_features']
-                        track_energy = features.get('energy', 0.5) or 0.5
-                        track_danceability = features.get('danceability', 0.5) or 0.5
-                        track_valence = features.get('valence', 0.5) or 0.5
-                        
-                        # Calculate weighted match score (lower difference = better match)
-                        energy_diff = abs(track_energy - user_energy)
-                        danceability_diff = abs(track_danceability - user_danceability)
-                        valence_diff = abs(track_valence - user_valence)
-                        
-                        # Match score: lower is better (0 = perfect match, 1 = worst match)
-                        match_score = (
-                            energy_diff * 0.4 +      # 40% weight on energy
-                            danceability_diff * 0.4 +  # 40% weight on danceability
-                            valence_diff * 0.2         # 20% weight on valence
-                        )
-                        
-                        track['match_score'] = match_score
-                        tracks_with_scores.append(track)
-                        print(f"  {track['name']}: Energy={track_energy:.2f}, Danceability={track_danceability:.2f}, Valence={track_valence:.2f}, Match={match_score:.3f}")
-                    else:
-                        # Track without audio features gets a penalty score
-                        track['match_score'] = 1.0
-                        tracks_with_scores.append(track)
-                        print(f"  {track['name']}: No audio features (match_score=1.0)")
-                
-                # Sort by match score (best matches first)
-                tracks_with_scores.sort(key=lambda x: x.get('match_score', 1.0))
-                
-                # Keep all tracks for now - we'll score and keep top 8 based on lyrics
-                tracks = tracks_with_scores
-                print(f"\n✅ Audio feature filtering complete - {len(tracks)} tracks sorted by match score")
+            # Non-English song - check if translation actually succeeded
+            was_translated = translated_lyrics != original_lyrics
+
+            if was_translated:
+                # Translation succeeded - store both original and translated
+                track['lyrics_original'] = original_lyrics
+                track['lyrics'] = translated_lyrics
+                print(f"    ✅ [{track['name']}]: {detected_lang} → en (translated)")
             else:
-                # No audio features available - skip audio feature filtering
-                print(f"⚠️  Tracks don't have audio features (Spotify API may not be available)")
-                print(f"   Using all tracks without audio feature filtering")
-                tracks = tracks[:10] if len(tracks) > 10 else tracks
-                for i, track in enumerate(tracks, 1):
-                    track['position'] = i
-            
-            print(f"===============================\n")
-        
-        # If we found fewer than 5 tracks, add a warning
-        # Check if we have enough tracks (we requested 6, need at least 5)
-        if len(tracks) < 5:
-            print(f"⚠️  Only found {len(tracks)} tracks out of {len(llm_songs)} requested. May not reach minimum of 5 tracks.")
-        
-        # ⏱️ TIMING: Lyrics fetching (now using BATCH translation)
-        lyrics_fetch_start = time.time()
-        # Fetch lyrics for all tracks with BATCH translation (should be up to 5, will select top 5 later)
-        print(f"\n=== FETCHING LYRICS & BATCH TRANSLATION + SCORING ===")
-        print(f"Processing {len(tracks)} tracks (will select best 5)")
-        
-        # Step 1: Fetch all lyrics from Genius in parallel (no translation yet)
-        def fetch_genius_lyrics(track_data):
-            """Fetch raw lyrics from Genius (no translation)"""
-            i, track = track_data
-            try:
-                print(f"\n[{i}/{len(tracks)}] Fetching lyrics: {track['name']} by {track['artist']}")
-                
-                if not genius:
-                    return (track, None, False)
-                
-                primary_artist = track['artist'].split(',')[0].strip() if ',' in track['artist'] else track['artist'].strip()
-                print(f"    🔍 Searching Genius for: '{track['name']}' by {primary_artist}")
-                
-                song = genius.search_song(track['name'], primary_artist)
-                
-                if song and song.lyrics:
-                    # Clean up lyrics
-                    lyrics = song.lyrics
-                    if lyrics.startswith("Lyrics"):
-                        lyrics = lyrics.split("\n", 1)[1] if "\n" in lyrics else lyrics
-                    lyrics = lyrics.strip()
-                    
-                    print(f"    ✅ Found lyrics ({len(lyrics)} chars)")
-                    return (track, lyrics, True)
-                else:
-                    print(f"    ⚠️  No lyrics found")
-                    return (track, None, False)
-                    
-            except Exception as e:
-                print(f"    ❌ Error fetching lyrics: {e}")
-                return (track, None, False)
-        
-        # Fetch all lyrics in parallel
-        tracks_with_raw_lyrics = []
-        lyrics_to_translate = []
-        lyrics_indices = []
-        non_english_tracks = []
-        
-        track_indices = [(i+1, track) for i, track in enumerate(tracks)]
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            results = executor.map(fetch_genius_lyrics, track_indices)
-            
-            for track, lyrics, found in results:
-                if found and lyrics:
-                    tracks_with_raw_lyrics.append(track)
-                    lyrics_to_translate.append(lyrics)
-                    lyrics_indices.append(len(tracks_with_raw_lyrics) - 1)
-                else:
-                    # No lyrics available
-                    track['lyrics'] = None
-                    track['lyrics_original'] = None
-                    track['lyrics_language'] = None
-                    track['lyrics_score'] = 3  # Default score (1-5 scale)
-                    tracks_with_raw_lyrics.append(track)
-        
-        print(f"\n✅ Fetched {len(lyrics_to_translate)} lyrics from Genius")
-        
-        # Step 2: BATCH translate all lyrics in ONE API call
-        if lyrics_to_translate:
-            print(f"\n🌐 Batch translating {len(lyrics_to_translate)} lyrics...")
-            
-            # Use batch translation function
-            translation_results = batch_detect_and_translate(lyrics_to_translate)
-            
-            # Apply results back to tracks
-            # lyrics_indices and translation_results are in the same order as lyrics_to_translate
-            for i, (idx, (translated_lyrics, detected_lang)) in enumerate(zip(lyrics_indices, translation_results)):
-                track = tracks_with_raw_lyrics[idx]
-                original_lyrics = lyrics_to_translate[i]  # Use enumerate index, not lyrics_indices.index(idx)
-                
-                track['lyrics_language'] = detected_lang
-                
-                # For English lyrics, both will be the same (so toggle button won't show)
-                # For non-English, translated will be different (toggle button will show)
-                if detected_lang == 'en':
-                    # English song - no translation needed
-                    # Set lyrics to original, and lyrics_original to None to prevent toggle
-                    track['lyrics'] = original_lyrics
-                    track['lyrics_original'] = None  # No original needed for English
-                    print(f"    ✅ [{track['name']}]: English (no translation needed)")
-                else:
-                    # Non-English song - check if translation actually succeeded
-                    was_translated = translated_lyrics != original_lyrics
-                    
-                    if was_translated:
-                        # Translation succeeded - store both original and translated
-                        track['lyrics_original'] = original_lyrics
-                        track['lyrics'] = translated_lyrics
-                        print(f"    ✅ [{track['name']}]: {detected_lang} → en (translated)")
-                    else:
-                        # Translation failed (API unreachable) but language is non-English
-                        # Still set lyrics_original so EN toggle shows (user can see original lyrics)
-                        # The toggle won't switch to English (since translation failed), but original will be available
-                        track['lyrics'] = original_lyrics  # Keep original as main lyrics
-                        track['lyrics_original'] = original_lyrics  # Set to same so toggle shows original
-                        print(f"    ⚠️  [{track['name']}]: {detected_lang} detected, but translation API failed (keeping original, EN toggle will show original)")
-                    
-                        non_english_tracks.append({
-                            'name': track['name'],
-                            'artist': track['artist'],
-                        'language': detected_lang,
-                        'was_translated': was_translated
-                    })
-                    
-        tracks_with_lyrics = tracks_with_raw_lyrics
-        
-        lyrics_fetch_time = time.time() - lyrics_fetch_start
-        print(f"⏱️  [TIMING] Lyrics Fetching (Parallel): {lyrics_fetch_time:.2f}s")
-        
-        # Print summary of non-English tracks
-        if non_english_tracks:
-            print(f"\n{'='*60}")
-            print(f"🌍 NON-ENGLISH TRACKS SUMMARY ({len(non_english_tracks)} found)")
-            print(f"{'='*60}")
-            for t in non_english_tracks:
-                print(f"  🎵 {t['name']} by {t['artist']}")
-                print(f"     Language: {t['language']} | Translated: {t['was_translated']}")
-            print(f"{'='*60}\n")
-        
-        # ⏱️ TIMING: Batch lyrics scoring
-        batch_score_start = time.time()
-        batch_score_time = 0
-        # Batch score all tracks with lyrics in a single API call
-        # Filter to only tracks that actually have lyrics (not None)
-        tracks_with_valid_lyrics = [track for track in tracks_with_lyrics if track.get('lyrics')]
-        
-        if tracks_with_valid_lyrics:
-            print(f"\n📊 Batch scoring {len(tracks_with_valid_lyrics)} tracks with lyrics...")
-            batch_data = [
-                {
-                    'track_id': track['id'],
-                    'lyrics': track['lyrics'],
-                    'track_name': track['name'],
-                    'artist_name': track['artist']
-                }
-                for track in tracks_with_valid_lyrics
-            ]
-            
-            scores_by_id = ai_service.batch_score_lyrics_relevance(batch_data, user_message)
-            batch_score_time = time.time() - batch_score_start
-            print(f"⏱️  [TIMING] Batch Lyrics Scoring: {batch_score_time:.2f}s")
-            
-            # Apply scores to tracks
-            for track in tracks:
-                if track['id'] in scores_by_id:
-                    score = scores_by_id[track['id']]
-                    # Ensure score is between 1 and 5
-                    score = max(1, min(5, int(score)))
-                    track['lyrics_score'] = score
-                    print(f"  📊 {track['name']}: lyrics score {track['lyrics_score']}/5")
-        
-        # Collect all tracks
-        tracks_with_scores = tracks
-        
-        # Combine audio feature match score with lyrics score
-        print(f"\n=== COMBINING AUDIO FEATURES & LYRICS SCORES ===")
-        for track in tracks_with_scores:
-            # Get existing match_score from audio features (0-1 scale, lower is better)
-            audio_match_score = track.get('match_score', 0.5)
-            # Convert to 0-10 scale (invert so higher is better)
-            audio_score = (1 - audio_match_score) * 10
-            
-            # Get lyrics score (1-5 scale) - ensure it's clamped
-            lyrics_score_raw = track.get('lyrics_score', 3)  # Default to 3 (midpoint)
-            lyrics_score_raw = max(1, min(5, int(lyrics_score_raw)))  # Clamp to 1-5
-            track['lyrics_score'] = lyrics_score_raw  # Update with clamped value
-            # Normalize lyrics score to 0-10 scale for combination with audio score
-            lyrics_score = ((lyrics_score_raw - 1) / 4) * 10  # Convert 1-5 to 0-10
-            
-            # Weighted combination: 40% audio features, 60% lyrics (lyrics is more important for strict selection)
-            combined_score = (audio_score * 0.4) + (lyrics_score * 0.6)
-            track['combined_score'] = combined_score
-            
-            print(f"  {track['name']}: Audio={audio_score:.1f}, Lyrics={lyrics_score_raw}/5 (normalized: {lyrics_score:.1f}), Combined={combined_score:.1f}")
-        
-        # Sort by combined score (highest first) - best scores first
-        tracks_with_scores.sort(key=lambda x: x.get('combined_score', 0), reverse=True)
-        
-        # Always select exactly 7 tracks (remove worst ones if we have more than 7)
-        if len(tracks_with_scores) > 7:
-            selected_tracks = tracks_with_scores[:7]
-            removed_count = len(tracks_with_scores) - 7
-            print(f"\n✅ Selected top 7 tracks (removed {removed_count} lowest scoring track(s))")
-            if removed_count > 0:
-                print(f"   Removed tracks: {', '.join([t['name'] for t in tracks_with_scores[7:]])}")
-        else:
-            selected_tracks = tracks_with_scores[:min(7, len(tracks_with_scores))]
-            print(f"\n✅ Selected {len(selected_tracks)} tracks (all available)")
-        
-        for i, track in enumerate(selected_tracks, 1):
-            print(f"  {i}. {track['name']} - Score: {track.get('combined_score', 0):.1f}")
-        
-        # ⏱️ TIMING: Explanations generation (parallel)
-        explanations_start = time.time()
-        # ⏱️ TIMING: Explanations generation (parallel)
-        explanations_start = time.time()
-        # Generate explanations only for the final 5 selected tracks (PARALLEL)
-        print(f"\n=== GENERATING EXPLANATIONS FOR SELECTED TRACKS (PARALLEL) ===")
-        print(f"Processing {len(selected_tracks)} tracks for explanations in parallel...")
-        
-        def generate_track_explanation(track_data):
-            """Helper function to generate explanation for a single track in parallel"""
-            track, user_message, ai_service = track_data
-            track_id = track['id']
-            track_name = track['name']
-            
-            result = {
-                'track_id': track_id,
-                'explanation': None,
-                'highlighted_terms': [],
-                'highlighted_terms_original': [],
-                'error': None
-            }
-            
-            if not track.get('lyrics'):
-                print(f"  ⚠️ {track_name}: No lyrics available")
-                return result
-            
-            try:
-                # Generate explanation from English lyrics
-                explanation, highlighted_terms = ai_service.explain_lyrics_relevance(
-                    lyrics=track['lyrics'],
-                    track_name=track_name,
-                    artist_name=track['artist'],
-                    user_prompt=user_message
-                )
-                result['explanation'] = explanation
-                result['highlighted_terms'] = highlighted_terms if highlighted_terms else []
-                
-                # If original lyrics exist and are different, generate highlighted terms for them too
-                if track.get('lyrics_original') and track['lyrics_original'] != track['lyrics']:
-                    try:
-                        _, highlighted_terms_original = ai_service.explain_lyrics_relevance(
-                            lyrics=track['lyrics_original'],
-                            track_name=track_name,
-                            artist_name=track['artist'],
-                            user_prompt=user_message
-                        )
-                        result['highlighted_terms_original'] = highlighted_terms_original if highlighted_terms_original else []
-                    except Exception as e:
-                        print(f"  ⚠️ {track_name}: Could not generate terms for original lyrics: {e}")
-                        result['highlighted_terms_original'] = []
-                
-                if explanation:
-                    print(f"  ✅ {track_name}: Generated explanation ({len(explanation)} chars) with {len(result['highlighted_terms'])} terms")
-                else:
-                    print(f"  ⚠️ {track_name}: Explanation returned None")
-            except Exception as e:
-                print(f"  ⚠️ {track_name}: Could not generate explanation: {e}")
-                result['explanation'] = None
-                result['highlighted_terms'] = []
-            
-            return result
-        
-        # Execute all explanations in parallel using ThreadPoolExecutor
-        track_data_list = [(track, user_message, ai_service) for track in selected_tracks]
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            # Submit all tasks and get results
-            results = list(executor.map(generate_track_explanation, track_data_list))
-        
-        explanations_time = time.time() - explanations_start
-        print(f"⏱️  [TIMING] Explanations Generation (Parallel): {explanations_time:.2f}s")
-        
+                # Translation failed (API unreachable) but language is non-English
+                # Still set lyrics_original so EN toggle shows (user can see original lyrics)
+                # The toggle won't switch to English (since translation failed), but original will be available
+                track['lyrics'] = original_lyrics  # Keep original as main lyrics
+                track['lyrics_original'] = original_lyrics  # Set to same so toggle shows original
+                print(f"    ⚠️  [{track['name']}]: {detected_lang} detected, but translation API failed (keeping original, EN toggle will show original)")
+
+                non_english_tracks.append({
+                    'name': track['name'],
+                    'artist': track['artist'],
+                'language': detected_lang,
+                'was_translated': was_translated
+            })
+
+    # Fetch all lyrics in parallel
+    tracks_with_raw_lyrics = []
+    lyrics_to_translate = []
+    tracks_to_translate = []
+    non_english_tracks = []
+    stored_count = 0
+
+    track_indices = [(i+1, track) for i, track in enumerate(tracks)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+        results = executor.map(fetch_genius_lyrics, track_indices)
+
+        for track, entry in results:
+            tracks_with_raw_lyrics.append(track)
+            if entry and entry.get('language'):
+                # Detected (and translated) on an earlier request - no Genius or DeepL call needed
+                stored_count += 1
+                apply_lyrics(track, entry['original'], entry.get('translated') or entry['original'], entry['language'])
+            elif entry:
+                lyrics_to_translate.append(entry['original'])
+                tracks_to_translate.append(track)
+            else:
+                # No lyrics available
+                track['lyrics'] = None
+                track['lyrics_original'] = None
+                track['lyrics_language'] = None
+                track['lyrics_score'] = 3  # Default score (1-5 scale)
+
+    print(f"\n✅ Fetched {len(lyrics_to_translate) + stored_count} lyrics ({stored_count} fully served from lyrics store)")
+
+    # Step 2: BATCH translate all lyrics in ONE API call
+    if lyrics_to_translate:
+        print(f"\n🌐 Batch translating {len(lyrics_to_translate)} lyrics...")
+
+        # Use batch translation function
+        translation_results = batch_detect_and_translate(lyrics_to_translate)
+
         # Apply results back to tracks
-        for result in results:
-            track = next((t for t in selected_tracks if t['id'] == result['track_id']), None)
-            if track:
-                track['lyrics_explanation'] = result['explanation']
-                track['highlighted_terms'] = result['highlighted_terms']
-                track['highlighted_terms_original'] = result['highlighted_terms_original']
-        
-        print(f"\n✅ Finished generating explanations for {len(selected_tracks)} tracks in parallel")
-        
-        # ⏱️ Print total timing summary (with flush to ensure it appears in logs)
-        total_time = time.time() - start_time
+        # tracks_to_translate and translation_results are in the same order as lyrics_to_translate
+        for track, original_lyrics, (translated_lyrics, detected_lang) in zip(tracks_to_translate, lyrics_to_translate, translation_results):
+            apply_lyrics(track, original_lyrics, translated_lyrics, detected_lang)
+
+            # Persist detection/translation (but not failed translations, so they get retried)
+            if detected_lang == 'en' or translated_lyrics != original_lyrics:
+                lyrics_store.put_translation(original_lyrics, translated_lyrics, detected_lang, track_id=track['id'])
+
+    tracks_with_lyrics = tracks_with_raw_lyrics
+
+    lyrics_fetch_time = time.time() - lyrics_fetch_start
+    graph.record("lyrics_fetch", lyrics_fetch_time)
+    print(f"⏱️  [TIMING] Lyrics Fetching (Parallel): {lyrics_fetch_time:.2f}s")
+
+    # Print summary of non-English tracks
+    if non_english_tracks:
         print(f"\n{'='*60}")
-        print(f"⏱️  [TIMING SUMMARY]")
+        print(f"🌍 NON-ENGLISH TRACKS SUMMARY ({len(non_english_tracks)} found)")
         print(f"{'='*60}")
-        print(f"  AI Recommendations:      {ai_recommendation_time:.2f}s ({ai_recommendation_time/total_time*100:.1f}%)")
-        print(f"  Spotify Search:          {spotify_search_time:.2f}s ({spotify_search_time/total_time*100:.1f}%)")
-        print(f"  Lyrics Fetching:         {lyrics_fetch_time:.2f}s ({lyrics_fetch_time/total_time*100:.1f}%)")
-        print(f"  Batch Lyrics Scoring:    {batch_score_time:.2f}s ({batch_score_time/total_time*100:.1f}%)")
-        print(f"  Explanations:            {explanations_time:.2f}s ({explanations_time/total_time*100:.1f}%)")
-        print(f"  ───────────────────────────────────────────")
-        print(f"  TOTAL:                   {total_time:.2f}s")
+        for t in non_english_tracks:
+            print(f"  🎵 {t['name']} by {t['artist']}")
+            print(f"     Language: {t['language']} | Translated: {t['was_translated']}")
         print(f"{'='*60}\n")
-        
-        # Force flush to ensure timing summary appears in logs before response
-        sys.stdout.flush()
-        
-        # Update positions for final tracks
-        for i, track in enumerate(selected_tracks, 1):
-            track['position'] = i
-        
-        tracks = selected_tracks
-        print(f"================================================\n")
-        
-        # Update conversation history
-        conversation_history.append({"role": "user", "content": user_message})
-        conversation_history.append({"role": "assistant", "content": dj_intro})
-        session['conversation_history'] = conversation_history[-6:]  # Keep last 6 messages (optimized for token usage)
-        
-        # Save messages to database
-        user_message_db_id = None
-        assistant_message_db_id = None
-        
-        if chat_db:
-            try:
-                # Get Clerk user ID from header
-                clerk_id = get_clerk_user_id()
-                session_id = get_session_id()
-                
-                # Save user message
-                user_message_db_id = chat_db.save_message(
-                    user_id=None,  # No longer using Spotify user_id
-                    session_id=session_id,
-                    role='user',
-                    content=user_message,
-                    tracks=None,
-                    clerk_id=clerk_id  # Use Clerk ID
-                )
-                
-                # Save assistant message with tracks
-                assistant_message_db_id = chat_db.save_message(
-                    user_id=None,  # No longer using Spotify user_id
-                    session_id=session_id,
-                    role='assistant',
-                    content=dj_intro,
-                    tracks=tracks,
-                    clerk_id=clerk_id  # Use Clerk ID
+
+    # ⏱️ TIMING: Batch lyrics scoring
+    batch_score_start = time.time()
+    batch_score_time = 0
+    # Explanations/highlights from the cache or the combined analysis, by track id (reused after selection)
+    analyses_by_id = {}
+    # Tracks whose lyrics_score came from a real scoring response, not a fallback (only those are cached)
+    scored_ids = set()
+    # Batch score all tracks with lyrics in a single API call
+    # Filter to only tracks that actually have lyrics (not None)
+    tracks_with_valid_lyrics = [track for track in tracks_with_lyrics if track.get('lyrics')]
+
+    if tracks_with_valid_lyrics:
+        batch_data = [
+            {
+                'track_id': track['id'],
+                'lyrics': track['lyrics'],
+                'lyrics_original': track.get('lyrics_original'),
+                'track_name': track['name'],
+                'artist_name': track['artist']
+            }
+            for track in tracks_with_valid_lyrics
+        ]
+
+        # Same prompt + same lyrics seen before: reuse its analysis (one MGET for every candidate)
+        analyses_by_id = get_cached_lyrics_explanations(user_message, batch_data)
+        if analyses_by_id:
+            print(f"\n✅ Cached lyrics analysis for {len(analyses_by_id)}/{len(batch_data)} tracks")
+        scores_by_id = {
+            track_id: analysis['score'] for track_id, analysis in analyses_by_id.items()
+            if analysis.get('score') is not None
+        }
+
+        to_analyze = [item for item in batch_data if item['track_id'] not in scores_by_id]
+        if to_analyze and use_combined_analysis():
+            # Score, explain and highlight every candidate at once - selection then needs no more calls
+            print(f"\n📊 Analyzing {len(to_analyze)} tracks with lyrics (combined)...")
+            fresh = ai_service.batch_analyze_lyrics(to_analyze, user_message)
+            analyses_by_id.update(fresh)
+            scores_by_id.update({track_id: analysis['score'] for track_id, analysis in fresh.items()})
+            cache_lyrics_explanations(user_message, [
+                {**item, **fresh[item['track_id']]} for item in to_analyze if item['track_id'] in fresh
+            ])
+
+        scored_ids.update(scores_by_id)  # Cached and combined scores are all real
+        missing = [item for item in batch_data if item['track_id'] not in scores_by_id]
+        if missing:
+            # Fan-out mode, or tracks the combined analysis didn't cover
+            print(f"\n📊 Batch scoring {len(missing)} tracks with lyrics...")
+            scores_by_id.update(ai_service.batch_score_lyrics_relevance(missing, user_message, scored_ids))
+        batch_score_time = time.time() - batch_score_start
+        graph.record("lyrics_analysis" if analyses_by_id else "batch_scoring", batch_score_time)
+        print(f"⏱️  [TIMING] Batch Lyrics Scoring: {batch_score_time:.2f}s")
+
+        # Apply scores to tracks
+        for track in tracks:
+            if track['id'] in scores_by_id:
+                score = scores_by_id[track['id']]
+                # Ensure score is between 1 and 5
+                score = max(1, min(5, int(score)))
+                track['lyrics_score'] = score
+                print(f"  📊 {track['name']}: lyrics score {track['lyrics_score']}/5")
+        
+        yield {
+            "type": "lyrics_scores",
+            "data": {track['id']: track['lyrics_score'] for track in tracks if 'lyrics_score' in track}
+        }
+
+    # Collect all tracks
+    tracks_with_scores = tracks
+
+    # Combine audio feature match score with lyrics score
+    print(f"\n=== COMBINING AUDIO FEATURES & LYRICS SCORES ===")
+    for track in tracks_with_scores:
+        # Get existing match_score from audio features (0-1 scale, lower is better)
+        audio_match_score = track.get('match_score', 0.5)
+        # Convert to 0-10 scale (invert so higher is better)
+        audio_score = (1 - audio_match_score) * 10
+
+        # Get lyrics score (1-5 scale) - ensure it's clamped
+        lyrics_score_raw = track.get('lyrics_score', 3)  # Default to 3 (midpoint)
+        lyrics_score_raw = max(1, min(5, int(lyrics_score_raw)))  # Clamp to 1-5
+        track['lyrics_score'] = lyrics_score_raw  # Update with clamped value
+        # Normalize lyrics score to 0-10 scale for combination with audio score
+        lyrics_score = ((lyrics_score_raw - 1) / 4) * 10  # Convert 1-5 to 0-10
+
+        # Weighted combination: 40% audio features, 60% lyrics (lyrics is more important for strict selection)
+        combined_score = (audio_score * 0.4) + (lyrics_score * 0.6)
+        track['combined_score'] = combined_score
+
+        print(f"  {track['name']}: Audio={audio_score:.1f}, Lyrics={lyrics_score_raw}/5 (normalized: {lyrics_score:.1f}), Combined={combined_score:.1f}")
+
+    # Sort by combined score (highest first) - best scores first
+    tracks_with_scores.sort(key=lambda x: x.get('combined_score', 0), reverse=True)
+
+    # Always select exactly 7 tracks (remove worst ones if we have more than 7)
+    if len(tracks_with_scores) > 7:
+        selected_tracks = tracks_with_scores[:7]
+        removed_count = len(tracks_with_scores) - 7
+        print(f"\n✅ Selected top 7 tracks (removed {removed_count} lowest scoring track(s))")
+        if removed_count > 0:
+            print(f"   Removed tracks: {', '.join([t['name'] for t in tracks_with_scores[7:]])}")
+    else:
+        selected_tracks = tracks_with_scores[:min(7, len(tracks_with_scores))]
+        print(f"\n✅ Selected {len(selected_tracks)} tracks (all available)")
+
+    for i, track in enumerate(selected_tracks, 1):
+        print(f"  {i}. {track['name']} - Score: {track.get('combined_score', 0):.1f}")
+    
+    yield {"type": "selection", "track_ids": [track['id'] for track in selected_tracks]}
+
+    # ⏱️ TIMING: Explanations generation (parallel)
+    explanations_start = time.time()
+    # Generate explanations only for the final 5 selected tracks (PARALLEL)
+    print(f"\n=== GENERATING EXPLANATIONS FOR SELECTED TRACKS (PARALLEL) ===")
+    print(f"Processing {len(selected_tracks)} tracks for explanations in parallel...")
+
+    def generate_track_explanation(track_data):
+        """Helper function to generate explanation for a single track in parallel"""
+        track, user_message, ai_service = track_data
+        track_id = track['id']
+        track_name = track['name']
+
+        result = {
+            'track_id': track_id,
+            'explanation': None,
+            'highlighted_terms': [],
+            'highlighted_terms_original': [],
+            'error': None
+        }
+
+        if not track.get('lyrics'):
+            print(f"  ⚠️ {track_name}: No lyrics available")
+            return result
+
+        try:
+            # Generate explanation from English lyrics
+            explanation, highlighted_terms = ai_service.explain_lyrics_relevance(
+                lyrics=track['lyrics'],
+                track_name=track_name,
+                artist_name=track['artist'],
+                user_prompt=user_message
+            )
+            result['explanation'] = explanation
+            result['highlighted_terms'] = highlighted_terms if highlighted_terms else []
+
+            # If original lyrics exist and are different, map the terms onto them (no second LLM call)
+            if track.get('lyrics_original') and track['lyrics_original'] != track['lyrics']:
+                result['highlighted_terms_original'] = align_highlighted_terms(
+                    result['highlighted_terms'], track['lyrics'], track['lyrics_original']
                 )
-                
-                print(f"✅ Saved messages to database (user: {user_message_db_id}, assistant: {assistant_message_db_id})")
-            except Exception as e:
-                print(f"⚠️  Failed to save messages to database: {e}")
-        
-        return jsonify({
-            "dj_response": dj_intro,
-            "tracks": tracks,
-            "total_tracks": len(tracks),
-            "user_message_db_id": user_message_db_id,
-            "assistant_message_db_id": assistant_message_db_id
-        })
+
+            if explanation:
+                print(f"  ✅ {track_name}: Generated explanation ({len(explanation)} chars) with {len(result['highlighted_terms'])} terms")
+            else:
+                print(f"  ⚠️ {track_name}: Explanation returned None")
+        except Exception as e:
+            print(f"  ⚠️ {track_name}: Could not generate explanation: {e}")
+            result['explanation'] = None
+            result['highlighted_terms'] = []
+
+        return result
+
+    results = []
+    # Tracks that were cached or explained by the combined analysis are emitted straight away
+    for track in selected_tracks:
+        analysis = analyses_by_id.get(track['id'])
+        if analysis and analysis.get('explanation'):
+            result = {
+                'track_id': track['id'],
+                'explanation': analysis['explanation'],
+                'highlighted_terms': analysis.get('highlighted_terms') or [],
+                'highlighted_terms_original': analysis.get('highlighted_terms_original') or [],
+                'error': None
+            }
+            results.append(result)
+            yield {"type": "explanation", "data": result}
+    explained_ids = {result['track_id'] for result in results}
+
+    # Execute the remaining explanations in parallel using ThreadPoolExecutor
+    track_data_list = [(track, user_message, ai_service) for track in selected_tracks if track['id'] not in explained_ids]
+
+    generated = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+        # Emit each explanation as soon as it is ready
+        futures = [executor.submit(generate_track_explanation, item) for item in track_data_list]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            results.append(result)
+            generated.append(result)
+            yield {"type": "explanation", "data": result}
+
+    # Cache what the fan-out generated (with the track's score, so a repeat request skips scoring too -
+    # unless the score is a fallback, which must not outlive this request)
+    tracks_by_id = {track['id']: track for track in selected_tracks}
+    cache_lyrics_explanations(user_message, [
+        {
+            **result,
+            'lyrics': tracks_by_id[result['track_id']]['lyrics'],
+            'lyrics_original': tracks_by_id[result['track_id']].get('lyrics_original'),
+            'score': tracks_by_id[result['track_id']].get('lyrics_score') if result['track_id'] in scored_ids else None
+        }
+        for result in generated if result['explanation']
+    ])
+
+    explanations_time = time.time() - explanations_start
+    graph.record("explanations", explanations_time)
+    print(f"⏱️  [TIMING] Explanations Generation (Parallel): {explanations_time:.2f}s")
+
+    # Apply results back to tracks
+    for result in results:
+        track = next((t for t in selected_tracks if t['id'] == result['track_id']), None)
+        if track:
+            track['lyrics_explanation'] = result['explanation']
+            track['highlighted_terms'] = result['highlighted_terms']
+            track['highlighted_terms_original'] = result['highlighted_terms_original']
+
+    print(f"\n✅ Finished generating explanations for {len(selected_tracks)} tracks in parallel")
+
+    # ⏱️ Print per-stage timing summary (with flush to ensure it appears in logs)
+    graph.log_timings()
+
+    # Force flush to ensure timing summary appears in logs before response
+    sys.stdout.flush()
+
+    # Update positions for final tracks
+    for i, track in enumerate(selected_tracks, 1):
+        track['position'] = i
+
+    tracks = selected_tracks
+    print(f"================================================\n")
+
+    # Update conversation history
+    # (only persisted by /dj_recommend - a streamed response has already sent its session cookie)
+    conversation_history.append({"role": "user", "content": user_message})
+    conversation_history.append({"role": "assistant", "content": dj_intro})
+    session['conversation_history'] = conversation_history[-6:]  # Keep last 6 messages (optimized for token usage)
+
+    # Save messages to database
+    user_message_db_id = None
+    assistant_message_db_id = None
+
+    if chat_db:
+        try:
+            # Get Clerk user ID from header
+            clerk_id = get_clerk_user_id()
+            session_id = get_session_id()
+
+            # Save user message
+            user_message_db_id = chat_db.save_message(
+                user_id=None,  # No longer using Spotify user_id
+                session_id=session_id,
+                role='user',
+                content=user_message,
+                tracks=None,
+                clerk_id=clerk_id  # Use Clerk ID
+            )
+
+            # Save assistant message with tracks
+            assistant_message_db_id = chat_db.save_message(
+                user_id=None,  # No longer using Spotify user_id
+                session_id=session_id,
+                role='assistant',
+                content=dj_intro,
+                tracks=tracks,
+                clerk_id=clerk_id  # Use Clerk ID
+            )
+
+            print(f"✅ Saved messages to database (user: {user_message_db_id}, assistant: {assistant_message_db_id})")
+        except Exception as e:
+            print(f"⚠️  Failed to save messages to database: {e}")
+
+    yield {"type": "complete", "data": {
+        "dj_response": dj_intro,
+        "tracks": tracks,
+        "total_tracks": len(tracks),
+        "user_message_db_id": user_message_db_id,
+        "assistant_message_db_id": assistant_message_db_id,
+        "timings": graph.timings()
+    }}
+
+@app.route('/dj_recommend', methods=['POST'])
+def dj_recommend():
+    """Get Musify recommendations: LLM recommends songs, then we fetch from Spotify"""
+    sp, redirect_response = get_authenticated_spotify()
+    if redirect_response:
+        return redirect_response
+    if sp is None:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    data = request.json
+    if data is None:
+        return jsonify({"error": "JSON body is required"}), 400
+    
+    graph = StageGraph("dj_recommend")
+    try:
+        payload = None
+        for event in run_dj_pipeline(sp, data, graph):
+            if event['type'] == 'complete':
+                payload = event['data']
+        return jsonify(payload)
+    except RecommendationError as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         print(f"Error in dj_recommend: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        graph.close()
+
+# Same pipeline, streamed as Server-Sent Events
+create_streaming_route(app, run_dj_pipeline, get_authenticated_spotify)
 
 
 # === CHAT HISTORY & LIKES ENDPOINTS ===
@@ -2357,8 +2429,10 @@ def get_chat_history():
         return jsonify({"error": "Database not configured"}), 500
     
     try:
-        user = sp.current_user()
-        user_id = user['id']  # type: ignore
+        user = get_session_user()
+        if not user:
+            return jsonify({"error": "Could not load Spotify user"}), 502
+        user_id = user['id']
         
         limit = int(request.args.get('limit', 50))
         offset = int(request.args.get('offset', 0))
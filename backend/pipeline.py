@@ -0,0 +1,154 @@
+"""
+Stage graph for AI DJ request pipelines
+Runs independent I/O stages (DB lookups, weather, Spotify profile, ...) concurrently,
+starting each stage as soon as the stages it depends on have finished, and records
+per-stage timings so the slow step of a request shows up in logs and responses.
+"""
+
+import time
+import threading
+import concurrent.futures
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Optional
+
+# Sentinel: a failing stage without a default re-raises when its result is read
+_RAISE = object()
+
+
+class StageGraph:
+    """
+    Dependency graph of named stages executed on a per-request thread pool.
+
+    Usage:
+        graph = StageGraph("dj_recommend")
+        graph.add("profile", load_profile)
+        graph.add("history", load_history, default=set())      # errors -> default
+        graph.add("excluded", merge_ids, deps=["history"])      # gets history's result
+        profile = graph.result("profile")                       # blocks until done
+        with graph.timed("llm"):                                 # inline stage
+            ...
+        graph.log_timings()
+        graph.close()
+
+    A stage never occupies a worker while waiting for its dependencies - it is only
+    submitted once they have all finished, so the pool size bounds concurrency,
+    not graph depth.
+    """
+
+    def __init__(self, name: str, max_workers: int = 6):
+        self.name = name
+        self.started_at = time.monotonic()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=name
+        )
+        self._futures = {}
+        self._timings = {}  # stage name -> (start offset, duration) in seconds
+        self._lock = threading.Lock()
+
+    def add(self, name: str, fn: Callable, deps: Iterable[str] = (), default: Any = _RAISE):
+        """
+        Schedule a stage.
+
+        Args:
+            name: Stage name (used by deps, result() and timings)
+            fn: Called with the results of deps, in order
+            deps: Names of stages that must finish first
+            default: If given, a failing stage logs the error and yields this instead of raising
+        """
+        dep_futures = [self._futures[dep] for dep in deps]
+        stage_future = concurrent.futures.Future()
+        self._futures[name] = stage_future
+
+        def run():
+            try:
+                args = [f.result() for f in dep_futures]
+            except Exception as e:
+                # A dependency failed - this stage cannot run either
+                stage_future.set_exception(e)
+                return
+
+            start = time.monotonic()
+            try:
+                stage_future.set_result(fn(*args))
+            except Exception as e:
+                if default is _RAISE:
+                    stage_future.set_exception(e)
+                else:
+                    print(f"⚠️  [{self.name}] Stage '{name}' failed, using default: {e}")
+                    stage_future.set_result(default)
+            finally:
+                self._record(name, start, time.monotonic() - start)
+
+        def submit():
+            try:
+                self._executor.submit(run)
+            except RuntimeError as e:
+                # Graph was closed (request already finished or failed)
+                stage_future.set_exception(e)
+
+        if not dep_futures:
+            submit()
+            return
+
+        remaining = [len(dep_futures)]
+        remaining_lock = threading.Lock()
+
+        def on_dep_done(_):
+            with remaining_lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                submit()
+
+        for dep_future in dep_futures:
+            dep_future.add_done_callback(on_dep_done)
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Any:
+        """Wait for a stage and return its result (re-raises its exception)"""
+        return self._futures[name].result(timeout=timeout)
+
+    @contextmanager
+    def timed(self, name: str):
+        """Time an inline stage that runs on the calling thread"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record(name, start, time.monotonic() - start)
+
+    def record(self, name: str, duration: float):
+        """Record a stage timed elsewhere (duration in seconds, ending now)"""
+        now = time.monotonic()
+        self._record(name, now - duration, duration)
+
+    def _record(self, name: str, start: float, duration: float):
+        with self._lock:
+            self._timings[name] = (start - self.started_at, duration)
+
+    def timings(self) -> dict:
+        """Per-stage durations in ms (in start order) plus the graph's total wall time"""
+        with self._lock:
+            ordered = sorted(self._timings.items(), key=lambda item: item[1][0])
+        result = {name: round(duration * 1000, 1) for name, (_, duration) in ordered}
+        result['total'] = round((time.monotonic() - self.started_at) * 1000, 1)
+        return result
+
+    def log_timings(self):
+        """Print a timing summary (start offset shows which stages overlapped)"""
+        with self._lock:
+            ordered = sorted(self._timings.items(), key=lambda item: item[1][0])
+        total = time.monotonic() - self.started_at
+        print(f"\n{'='*60}")
+        print(f"⏱️  [TIMING SUMMARY] {self.name}")
+        print(f"{'='*60}")
+        for name, (offset, duration) in ordered:
+            share = duration / total * 100 if total else 0
+            print(f"  {name:<24} {duration:6.2f}s ({share:5.1f}%)  starts at +{offset:.2f}s")
+        print(f"  ───────────────────────────────────────────")
+        print(f"  {'TOTAL':<24} {total:6.2f}s")
+        print(f"{'='*60}\n")
+
+    def close(self):
+        """Release the worker threads (stages still running are allowed to finish)"""
+        self._executor.shutdown(wait=False)
@@ -3,126 +3,466 @@ Rate limiter and request queue for Groq API
 Ensures we stay within Groq's limits:
 - Free tier: 30 RPM, 14,400 TPM (llama-3.1-8b-instant)
 - Free tier: 30 RPM, 30,000 TPM (llama-3.3-70b-versatile)
+
+Each model has its own request and token buckets. Callers reserve capacity under a
+short lock and sleep outside it, so a throttled call never blocks other models,
+status reads or other callers' bookkeeping. Reservations are taken in arrival order,
+so waiting callers are served first-come, first-served.
+
+With Redis available the buckets live in Redis (GCRA via Lua), so all worker processes
+share one budget per model; while it is down each process limits itself.
+
+Configuration (environment variables):
+    RATE_LIMIT_BACKEND "redis" (default, local if Redis is down) or "local"
+    GROQ_RATE_LIMITS   Per-model overrides, e.g. "llama-3.3-70b-versatile=30/30000,llama-3.1-8b-instant=30/14400"
 """
 
+import os
 import time
+import heapq
 import threading
-from collections import deque
-from datetime import datetime, timedelta
-from typing import Callable, Any
+from typing import Callable, Any, Optional
 import functools
 
+import redis
+
+from redis_cache import redis_client, redis_available, redis_health
+
+# (requests per minute, tokens per minute)
+DEFAULT_MODEL_LIMITS = {
+    "llama-3.1-8b-instant": (30, 14400),
+    "llama-3.3-70b-versatile": (30, 30000),
+}
+DEFAULT_LIMITS = (30, 14400)  # Models not listed above
+
+
+def _parse_model_limits(raw: str) -> dict:
+    """Parse GROQ_RATE_LIMITS ("model=rpm/tpm,...")"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in raw.split(','))):
+        try:
+            model, values = item.split('=', 1)
+            rpm, tpm = values.split('/', 1)
+            limits[model.strip()] = (int(rpm), int(tpm))
+        except ValueError:
+            print(f"⚠️  Ignoring malformed GROQ_RATE_LIMITS entry: {item}")
+    return limits
+
+
+MODEL_LIMITS = {**DEFAULT_MODEL_LIMITS, **_parse_model_limits(os.getenv("GROQ_RATE_LIMITS", ""))}
+
+# "redis" (default when Redis is up) shares limits across worker processes; "local" keeps them per process
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "redis").lower()
+
+
+class TokenBucket:
+    """
+    Continuously refilling bucket (capacity per `period` seconds).
+    The level may go negative: a reservation is taken immediately and the caller
+    waits off the debt, so later reservations queue up behind earlier ones.
+    """
+
+    def __init__(self, capacity: int, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.level = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` and return the seconds until it is actually available"""
+        self._refill(now)
+        wait = max(0.0, (amount - self.level) / self.rate)
+        self.level -= amount
+        return wait
+
+    def adjust(self, amount: float, now: float):
+        """Give back (positive) or take extra (negative) capacity after the fact"""
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return self.level
+
+
+class Reservation:
+    """
+    Capacity reserved for one Groq call: sleep() until it is available, make the call,
+    then reconcile() it with the real usage
+    """
+
+    def __init__(self, limiter: 'RateLimiter', tokens: int, waited: float):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.waited = waited
+        self.ready_at = time.monotonic() + waited
+        self.reconciled = False
+
+    def sleep(self):
+        """Wait (without any lock) until the reserved capacity is available - no-op once it is"""
+        wait = self.ready_at - time.monotonic()
+        if wait <= 0:
+            return
+        print(f"⏳ Rate limit ({self.limiter.name}): waiting {wait:.1f}s for {self.tokens} tokens")
+        with self.limiter.lock:
+            self.limiter.waiting += 1
+        try:
+            time.sleep(wait)
+        finally:
+            with self.limiter.lock:
+                self.limiter.waiting -= 1
+
+    def reconcile(self, actual_tokens):
+        """Replace the estimate with the tokens Groq actually counted (no-op if unknown)"""
+        if self.reconciled or actual_tokens is None:
+            return
+        self.reconciled = True
+        self.limiter.update_token_usage(actual_tokens, self.tokens)
+
+    def release(self):
+        """Give the reserved tokens back - the call never ran (its request still counts)"""
+        if self.reconciled:
+            return
+        self.reconciled = True
+        self.limiter._adjust_tokens(self.tokens)
+
+
 class RateLimiter:
     """
-    Rate limiter for Groq API requests
-    Limits: 30 requests per minute, 14,400 tokens per minute (free tier)
+    Request + token buckets for one Groq model (in this process)
+    Limits: 30 requests per minute, 14,400 tokens per minute (free tier default)
     """
     
-    def __init__(self, max_requests_per_minute: int = 30, max_tokens_per_minute: int = 14400):
+    backend = "local"
+    
+    def __init__(self, max_requests_per_minute: int = 30, max_tokens_per_minute: int = 14400, name: str = "groq"):
+        self.name = name
         self.max_rpm = max_requests_per_minute
         self.max_tpm = max_tokens_per_minute
         
-        # Track requests in the last minute
-        self.request_times = deque()
-        self.token_usage = deque()  # (timestamp, token_count) tuples
+        self.request_bucket = TokenBucket(max_requests_per_minute)
+        self.token_bucket = TokenBucket(max_tokens_per_minute)
+        self.blocked_until = 0.0  # Set when Groq answers 429
         
+        # Only guards bucket arithmetic - nobody sleeps while holding it
         self.lock = threading.Lock()
         
-        print(f"✅ Rate limiter initialized: {max_requests_per_minute} RPM, {max_tokens_per_minute} TPM")
-    
-    def _clean_old_entries(self):
-        """Remove entries older than 1 minute"""
-        cutoff_time = datetime.now() - timedelta(minutes=1)
-        
-        # Clean request times
-        while self.request_times and self.request_times[0] < cutoff_time:
-            self.request_times.popleft()
+        # Metrics
+        self.total_requests = 0
+        self.waiting = 0
+        self.throttled_requests = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.estimated_tokens = 0
+        self.reconciled_requests = 0
+        self.reconciled_estimate_tokens = 0
+        self.actual_tokens = 0
+        self.backoffs = 0
         
-        # Clean token usage
-        while self.token_usage and self.token_usage[0][0] < cutoff_time:
-            self.token_usage.popleft()
+        print(f"✅ Rate limiter initialized ({name}, {self.backend}): "
+              f"{max_requests_per_minute} RPM, {max_tokens_per_minute} TPM")
+    
+    # Bucket operations - overridden by RedisRateLimiter to share state across processes
+    
+    def _reserve(self, tokens: int) -> float:
+        """Take one request and `tokens`; return seconds until they're available"""
+        with self.lock:
+            now = time.monotonic()
+            return max(
+                self.request_bucket.reserve(1, now),
+                self.token_bucket.reserve(tokens, now),
+                self.blocked_until - now,
+                0.0
+            )
+    
+    def _adjust_tokens(self, delta: int):
+        with self.lock:
+            self.token_bucket.adjust(delta, time.monotonic())
+    
+    def _block(self, seconds: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+    
+    def _available(self) -> tuple:
+        """(requests available, tokens available, seconds still blocked by a 429) right now"""
+        with self.lock:
+            now = time.monotonic()
+            return (self.request_bucket.available(now), self.token_bucket.available(now),
+                    max(0.0, self.blocked_until - now))
+    
+    def estimated_wait(self, estimated_tokens: int = 500) -> float:
+        """Seconds a call of this size would wait if it reserved now (nothing is reserved)"""
+        tokens = max(0, min(int(estimated_tokens), self.max_tpm))
+        requests_available, tokens_available, blocked = self._available()
+        return max(
+            (1 - requests_available) / self.max_rpm * 60,
+            (tokens - tokens_available) / self.max_tpm * 60,
+            blocked,
+            0.0
+        )
+    
+    def reserve(self, estimated_tokens: int = 500) -> Reservation:
+        """Reserve one request and estimated_tokens now; the caller sleep()s off any wait"""
+        # A single call can never need more than a full minute of tokens
+        tokens = max(0, min(int(estimated_tokens), self.max_tpm))
+        wait = self._reserve(tokens)
+        with self.lock:
+            self.total_requests += 1
+            self.estimated_tokens += tokens
+            if wait > 0:
+                self.throttled_requests += 1
+                self.total_wait_time += wait
+                self.max_wait_time = max(self.max_wait_time, wait)
+        return Reservation(self, tokens, wait)
+    
+    def acquire(self, estimated_tokens: int = 500) -> Reservation:
+        """Reserve one request and estimated_tokens, sleeping (without the lock) until they're available"""
+        reservation = self.reserve(estimated_tokens)
+        reservation.sleep()
+        return reservation
+    
+    def wait_if_needed(self, estimated_tokens: int = 500) -> float:
+        """
+        Wait if we're approaching rate limits
+        Returns: seconds waited
+        """
+        return self.acquire(estimated_tokens).waited
+    
+    def update_token_usage(self, actual_tokens: int, reserved_tokens: int):
+        """Correct the token bucket once the real usage of a reserved call is known"""
+        self._adjust_tokens(reserved_tokens - actual_tokens)
+        with self.lock:
+            self.reconciled_requests += 1
+            self.reconciled_estimate_tokens += reserved_tokens
+            self.actual_tokens += actual_tokens
+    
+    def backoff(self, seconds: float):
+        """Groq rejected a call (429) - hold every new reservation for `seconds`"""
+        self._block(seconds)
+        with self.lock:
+            self.backoffs += 1
+        print(f"⏳ Rate limit ({self.name}): Groq returned 429, backing off {seconds:.1f}s")
     
     def get_current_usage(self) -> dict:
         """Get current rate limit usage"""
+        requests_available, tokens_available, blocked = self._available()
         with self.lock:
-            self._clean_old_entries()
-            
-            current_requests = len(self.request_times)
-            current_tokens = sum(tokens for _, tokens in self.token_usage)
-            
+            reconciled = self.reconciled_estimate_tokens
             return {
-                "requests": current_requests,
+                "backend": self.backend,
+                "requests": round(self.max_rpm - requests_available, 1),
                 "max_requests": self.max_rpm,
-                "tokens": current_tokens,
+                "tokens": round(self.max_tpm - tokens_available),
                 "max_tokens": self.max_tpm,
-                "requests_available": self.max_rpm - current_requests,
-                "tokens_available": self.max_tpm - current_tokens
+                "requests_available": round(requests_available, 1),
+                "tokens_available": round(tokens_available),
+                "blocked_seconds": round(blocked, 1),
+                "waiting": self.waiting,
+                "total_requests": self.total_requests,
+                "throttled_requests": self.throttled_requests,
+                "avg_wait_ms": round(self.total_wait_time / self.throttled_requests * 1000, 1) if self.throttled_requests else 0.0,
+                "max_wait_ms": round(self.max_wait_time * 1000, 1),
+                "backoffs": self.backoffs,
+                # actual / estimated over reconciled calls: > 1 means estimates are too low
+                "usage_vs_estimate": round(self.actual_tokens / reconciled, 2) if reconciled else None
             }
+
+
+# GCRA over Redis: each bucket is a single "theoretical arrival time" (TAT) key.
+# A reservation always advances the TAT (so callers across processes queue in order)
+# and returns how long the caller must wait. Times come from the Redis server clock,
+# so workers on different hosts agree.
+_GCRA_RESERVE = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local period = tonumber(ARGV[1])
+local function reserve(key, cost, interval)
+    local tat = tonumber(redis.call('GET', key)) or now
+    if tat < now then tat = now end
+    local new_tat = tat + cost * interval
+    redis.call('SET', key, tostring(new_tat), 'PX', math.max(1, math.ceil((new_tat - now) * 1000)))
+    return new_tat - period - now
+end
+local wait = math.max(0,
+    reserve(KEYS[1], 1, tonumber(ARGV[2])),
+    reserve(KEYS[2], tonumber(ARGV[4]), tonumber(ARGV[3])),
+    (tonumber(redis.call('GET', KEYS[3])) or 0) - now)
+return tostring(wait)
+"""
+
+# Shift a bucket's TAT by `delta` seconds (negative gives capacity back)
+_GCRA_ADJUST = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat then
+    if tonumber(ARGV[1]) <= 0 then return 0 end
+    tat = now
+end
+local new_tat = math.max(tat, now) + tonumber(ARGV[1])
+if new_tat <= now then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.max(1, math.ceil((new_tat - now) * 1000)))
+end
+return 1
+"""
+
+# Push the "blocked until" time forward (never back)
+_GCRA_BLOCK = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local until_at = now + tonumber(ARGV[1])
+local current = tonumber(redis.call('GET', KEYS[1])) or 0
+if until_at > current then
+    redis.call('SET', KEYS[1], tostring(until_at), 'PX', math.max(1, math.ceil(tonumber(ARGV[1]) * 1000)))
+end
+return 1
+"""
+
+# Seconds of debt on both buckets (TAT - now) and of 429 block left, for status reads
+_GCRA_PEEK = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local req = (tonumber(redis.call('GET', KEYS[1])) or now) - now
+local tok = (tonumber(redis.call('GET', KEYS[2])) or now) - now
+local blocked = (tonumber(redis.call('GET', KEYS[3])) or now) - now
+return {tostring(math.max(req, 0)), tostring(math.max(tok, 0)), tostring(math.max(blocked, 0))}
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    RateLimiter whose buckets live in Redis (GCRA, one atomic Lua script per operation),
+    so every worker process shares one RPM/TPM budget per model. While Redis is down
+    (see redis_available()) calls use this process's local buckets instead, without
+    waiting on a connection; the shared buckets are used again once it is back.
+    """
     
-    def wait_if_needed(self, estimated_tokens: int = 500) -> float:
-        """
-        Wait if we're approaching rate limits
-        Returns: seconds waited
-        """
+    backend = "redis"
+    
+    def __init__(self, max_requests_per_minute: int = 30, max_tokens_per_minute: int = 14400,
+                 name: str = "groq", *, client: redis.Redis):
+        super().__init__(max_requests_per_minute, max_tokens_per_minute, name)
+        self.client = client
+        self.period = 60.0
+        self.request_interval = self.period / max_requests_per_minute  # seconds per request
+        self.token_interval = self.period / max_tokens_per_minute      # seconds per token
+        # Hash tag keeps a model's keys in one cluster slot
+        prefix = f"ratelimit:{{groq:{name}}}"
+        self.keys = (f"{prefix}:requests", f"{prefix}:tokens", f"{prefix}:blocked")
+        self._reserve_script = client.register_script(_GCRA_RESERVE)
+        self._adjust_script = client.register_script(_GCRA_ADJUST)
+        self._block_script = client.register_script(_GCRA_BLOCK)
+        self._peek_script = client.register_script(_GCRA_PEEK)
+        self.redis_errors = 0
+    
+    def _redis_failed(self, error):
         with self.lock:
-            self._clean_old_entries()
-            
-            current_requests = len(self.request_times)
-            current_tokens = sum(tokens for _, tokens in self.token_usage)
-            
-            wait_time = 0.0
-            
-            # Check if we need to wait for request limit
-            if current_requests >= self.max_rpm - 1:
-                # Wait until oldest request is > 1 minute old
-                if self.request_times:
-                    oldest_request = self.request_times[0]
-                    time_to_wait = 61 - (datetime.now() - oldest_request).total_seconds()
-                    if time_to_wait > 0:
-                        print(f"⏳ Rate limit: waiting {time_to_wait:.1f}s (requests: {current_requests}/{self.max_rpm})")
-                        time.sleep(time_to_wait)
-                        wait_time += time_to_wait
-                        self._clean_old_entries()
-            
-            # Check if we need to wait for token limit
-            if current_tokens + estimated_tokens > self.max_tpm:
-                # Wait until we have enough token budget
-                if self.token_usage:
-                    oldest_token_entry = self.token_usage[0][0]
-                    time_to_wait = 61 - (datetime.now() - oldest_token_entry).total_seconds()
-                    if time_to_wait > 0:
-                        print(f"⏳ Token limit: waiting {time_to_wait:.1f}s (tokens: {current_tokens + estimated_tokens}/{self.max_tpm})")
-                        time.sleep(time_to_wait)
-                        wait_time += time_to_wait
-                        self._clean_old_entries()
-            
-            # Record this request
-            now = datetime.now()
-            self.request_times.append(now)
-            self.token_usage.append((now, estimated_tokens))
-            
-            return wait_time
+            self.redis_errors += 1
+        print(f"⚠️  Redis rate limiter error ({self.name}), using local limits: {error}")
+        # Later calls skip Redis until the health check sees it again
+        redis_health.command_failed(error)
+    
+    def _reserve(self, tokens: int) -> float:
+        if not redis_available():
+            return super()._reserve(tokens)
+        try:
+            return float(self._reserve_script(
+                keys=self.keys,
+                args=[self.period, self.request_interval, self.token_interval, tokens]
+            ))
+        except Exception as e:
+            self._redis_failed(e)
+            return super()._reserve(tokens)
+    
+    def _adjust_tokens(self, delta: int):
+        if not redis_available():
+            super()._adjust_tokens(delta)
+            return
+        try:
+            # Returning tokens moves the TAT back
+            self._adjust_script(keys=[self.keys[1]], args=[-delta * self.token_interval])
+        except Exception as e:
+            self._redis_failed(e)
+            super()._adjust_tokens(delta)
+    
+    def _block(self, seconds: float):
+        if not redis_available():
+            super()._block(seconds)
+            return
+        try:
+            self._block_script(keys=[self.keys[2]], args=[seconds])
+        except Exception as e:
+            self._redis_failed(e)
+            super()._block(seconds)
+    
+    def _available(self) -> tuple:
+        if not redis_available():
+            return super()._available()
+        try:
+            request_debt, token_debt, blocked = (float(v) for v in self._peek_script(keys=self.keys))
+        except Exception as e:
+            self._redis_failed(e)
+            return super()._available()
+        # Debt beyond a full period shows up as negative availability (callers are queued)
+        return (self.max_rpm - request_debt / self.request_interval,
+                self.max_tpm - token_debt / self.token_interval,
+                blocked)
+    
+    def get_current_usage(self) -> dict:
+        usage = super().get_current_usage()
+        usage["redis_errors"] = self.redis_errors
+        usage["shared"] = redis_available()
+        return usage
+
+
+class GroqRateLimits:
+    """
+    One RateLimiter per Groq model, created on first use. With the Redis backend the
+    limiter itself switches between shared and local buckets as Redis comes and goes.
+    """
+    
+    def __init__(self, model_limits: dict = MODEL_LIMITS):
+        self.model_limits = model_limits
+        self.limiters = {}
+        self.lock = threading.Lock()
     
-    def update_token_usage(self, actual_tokens: int):
-        """Update the last token usage with actual value"""
+    def for_model(self, model: str) -> RateLimiter:
+        with self.lock:
+            limiter = self.limiters.get(model)
+            if limiter is None:
+                rpm, tpm = self.model_limits.get(model, DEFAULT_LIMITS)
+                if RATE_LIMIT_BACKEND != "local":
+                    limiter = RedisRateLimiter(rpm, tpm, name=model, client=redis_client)
+                else:
+                    limiter = RateLimiter(rpm, tpm, name=model)
+                self.limiters[model] = limiter
+            return limiter
+    
+    def acquire(self, model: str, estimated_tokens: int = 500) -> Reservation:
+        return self.for_model(model).acquire(estimated_tokens)
+    
+    def get_current_usage(self) -> dict:
         with self.lock:
-            if self.token_usage:
-                # Update the last entry with actual token count
-                timestamp, _ = self.token_usage[-1]
-                self.token_usage[-1] = (timestamp, actual_tokens)
+            limiters = dict(self.limiters)
+        return {model: limiter.get_current_usage() for model, limiter in limiters.items()}
 
 
-# Global rate limiter instance
-# Using Groq free tier limits: 30 RPM, 14,400 TPM for llama-3.1-8b-instant
-groq_rate_limiter = RateLimiter(max_requests_per_minute=30, max_tokens_per_minute=14400)
+# Global per-model limiters shared by every Groq caller
+groq_rate_limiter = GroqRateLimits()
 
 
-def rate_limited(estimated_tokens: int = 500):
+def rate_limited(estimated_tokens: int = 500, model: str = "llama-3.1-8b-instant"):
     """
     Decorator to rate limit API calls
     
     Usage:
-        @rate_limited(estimated_tokens=1000)
+        @rate_limited(estimated_tokens=1000, model="llama-3.3-70b-versatile")
         def call_groq_api():
             # API call here
             pass
@@ -131,7 +471,7 @@ def rate_limited(estimated_tokens: int = 500):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             # Wait if needed
-            wait_time = groq_rate_limiter.wait_if_needed(estimated_tokens)
+            wait_time = groq_rate_limiter.acquire(model, estimated_tokens).waited
             
             if wait_time > 0:
                 print(f"   Waited {wait_time:.1f}s for rate limit")
@@ -144,75 +484,231 @@ def rate_limited(estimated_tokens: int = 500):
     return decorator
 
 
-class RequestQueue:
+# Priority classes, highest first (lower number wins)
+PRIORITY_PRIMARY = 0      # Main recommendation call - the user is waiting on it
+PRIORITY_SCORING = 1      # Batch lyrics scoring (decides which tracks are shown)
+PRIORITY_EXPLANATION = 2  # Per-track "why this song" explanation
+PRIORITY_NAMES = {
+    PRIORITY_PRIMARY: "primary",
+    PRIORITY_SCORING: "scoring",
+    PRIORITY_EXPLANATION: "explanation",
+}
+
+# In-flight Groq calls per process; queued calls are granted slots by priority
+GROQ_MAX_CONCURRENT = int(os.getenv("GROQ_MAX_CONCURRENT", 16))
+# How often queued calls re-check the limiter while it has no capacity for them (seconds)
+SCHEDULER_RECHECK_INTERVAL = float(os.getenv("SCHEDULER_RECHECK_INTERVAL", 0.25))
+
+
+class RequestDropped(Exception):
+    """A queued low-priority call was shed because it could not start before its deadline"""
+    pass
+
+
+class Ticket:
+    """One queued Groq call"""
+
+    def __init__(self, priority: int, limiter: RateLimiter, tokens: int, deadline, seq: int):
+        self.priority = priority
+        self.limiter = limiter
+        self.tokens = tokens
+        self.deadline = deadline  # time.monotonic() value, or None to wait indefinitely
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.state = "waiting"  # -> "reserving" -> "granted" | "dropped"
+        self.reservation = None  # Limiter capacity taken at grant time (below primary)
+        self.event = threading.Event()
+
+
+class _ClassStats:
+    def __init__(self):
+        self.queued = 0
+        self.granted = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+
+
+class GroqScheduler:
     """
-    Queue for managing concurrent API requests
-    Processes requests sequentially to avoid rate limit issues
+    Priority scheduler in front of the per-model rate limiters.
+
+    Calls wait here - not in the limiter's reservation queue - until a slot is free.
+    Slots go to the highest priority class first. Below primary, a call is only let through
+    when its model's limiter could serve it without waiting, and its budget is reserved as
+    it is let through (ticket.reservation) - so the next queued call sees that budget gone,
+    and explanations never reserve budget ahead of a recommendation that arrives a moment
+    later. A queued call with a deadline that it can no longer meet is dropped
+    (RequestDropped) instead of delaying others. Callers run their own request; there is
+    no worker thread.
+
+    Usage:
+        ticket = groq_scheduler.admit(PRIORITY_EXPLANATION, limiter, tokens, timeout=8)
+        try:
+            reservation = ticket.reservation or limiter.reserve(tokens)  # primary reserves itself
+            reservation.sleep()
+            ...  # the Groq call
+        finally:
+            groq_scheduler.release(ticket)
     """
-    
-    def __init__(self):
-        self.queue = deque()
+
+    def __init__(self, max_concurrent: int = GROQ_MAX_CONCURRENT):
+        self.max_concurrent = max_concurrent
         self.lock = threading.Lock()
-        self.processing = False
-        print("✅ Request queue initialized")
-    
-    def add_request(self, func: Callable, *args, **kwargs) -> Any:
-        """Add a request to the queue and wait for result"""
-        result_event = threading.Event()
-        result_container = {"value": None, "error": None}
-        
-        def wrapped_func():
-            try:
-                result_container["value"] = func(*args, **kwargs)
-            except Exception as e:
-                result_container["error"] = e
-            finally:
-                result_event.set()
-        
+        # Serializes dispatching, so a limiter check and the reservation that follows it
+        # aren't interleaved with another dispatcher's check (taken before self.lock, never after)
+        self._dispatch_lock = threading.Lock()
+        self._heap = []  # (priority, seq, ticket); tickets that stopped waiting are skipped lazily
+        self._seq = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+        self._stats = {priority: _ClassStats() for priority in PRIORITY_NAMES}
+        print(f"✅ Groq scheduler initialized: {max_concurrent} concurrent calls, "
+              f"priorities {' > '.join(PRIORITY_NAMES.values())}")
+
+    def admit(self, priority: int, limiter: RateLimiter, tokens: int, timeout: Optional[float] = None) -> Ticket:
+        """Wait for a slot; raises RequestDropped if the call can't start within `timeout` seconds"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
         with self.lock:
-            self.queue.append(wrapped_func)
-        
-        # Start processing if not already running
-        self._process_queue()
-        
-        # Wait for result
-        result_event.wait()
-        
-        if result_container["error"]:
-            raise result_container["error"]
-        
-        return result_container["value"]
-    
-    def _process_queue(self):
-        """Process queued requests"""
+            self._seq += 1
+            ticket = Ticket(priority, limiter, tokens, deadline, self._seq)
+            heapq.heappush(self._heap, (priority, ticket.seq, ticket))
+            self._depth[priority] += 1
+            stats = self._stats[priority]
+            stats.queued += 1
+            stats.max_depth = max(stats.max_depth, self._depth[priority])
+
+        while True:
+            self._dispatch()
+            wait = SCHEDULER_RECHECK_INTERVAL
+            if deadline is not None:
+                wait = max(0.0, min(wait, deadline - time.monotonic()))
+            ticket.event.wait(wait)
+            with self.lock:
+                if ticket.state == "granted":
+                    return ticket
+                if ticket.state == "waiting" and deadline is not None and time.monotonic() >= deadline:
+                    self._drop(ticket)
+                if ticket.state == "dropped":
+                    raise RequestDropped(f"{PRIORITY_NAMES[priority]} call shed after "
+                                         f"{time.monotonic() - ticket.enqueued_at:.1f}s in queue")
+
+    def release(self, ticket: Ticket):
+        """Give the slot back once the call has finished"""
         with self.lock:
-            if self.processing or not self.queue:
-                return
-            self.processing = True
-        
-        def worker():
+            self.in_flight -= 1
+        self._dispatch()
+
+    def run(self, priority: int, limiter: RateLimiter, tokens: int, func: Callable, *args,
+            timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run func(*args, **kwargs) in a scheduled slot"""
+        ticket = self.admit(priority, limiter, tokens, timeout)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.release(ticket)
+
+    def _drop(self, ticket: Ticket):
+        # Caller holds the lock
+        ticket.state = "dropped"
+        self._depth[ticket.priority] -= 1
+        self._stats[ticket.priority].dropped += 1
+        ticket.event.set()
+
+    def _grant(self, ticket: Ticket):
+        # Caller holds the lock
+        ticket.state = "granted"
+        self._depth[ticket.priority] -= 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        queue_wait = time.monotonic() - ticket.enqueued_at
+        stats = self._stats[ticket.priority]
+        stats.granted += 1
+        stats.total_queue_wait += queue_wait
+        stats.max_queue_wait = max(stats.max_queue_wait, queue_wait)
+        ticket.event.set()
+
+    def _head(self):
+        # Caller holds the lock
+        while self._heap and self._heap[0][2].state != "waiting":
+            heapq.heappop(self._heap)
+        return self._heap[0][2] if self._heap else None
+
+    def _dispatch(self):
+        """Hand free slots to queued calls, highest priority first"""
+        with self._dispatch_lock:
             while True:
                 with self.lock:
-                    if not self.queue:
-                        self.processing = False
-                        break
-                    func = self.queue.popleft()
-                
-                # Execute the function
-                func()
-        
-        # Start worker thread
-        thread = threading.Thread(target=worker, daemon=True)
-        thread.start()
+                    ticket = self._head()
+                    if ticket is None or self.in_flight >= self.max_concurrent:
+                        return
+                    if ticket.priority == PRIORITY_PRIMARY:
+                        heapq.heappop(self._heap)
+                        self._grant(ticket)
+                        continue
+
+                # Lower classes only start when the limiter has room for them right now
+                # (checked outside the lock - it may be a Redis round trip)
+                limiter_wait = ticket.limiter.estimated_wait(ticket.tokens)
+
+                with self.lock:
+                    if self._head() is not ticket or self.in_flight >= self.max_concurrent:
+                        continue  # Something changed meanwhile - re-evaluate
+                    if limiter_wait > 0:
+                        if ticket.deadline is not None and time.monotonic() + limiter_wait > ticket.deadline:
+                            # Can't start in time even once the budget refills - shed it now
+                            heapq.heappop(self._heap)
+                            self._drop(ticket)
+                            continue
+                        return  # Budget refills over time; queued callers re-check periodically
+                    heapq.heappop(self._heap)
+                    ticket.state = "reserving"  # Its deadline no longer applies
+
+                # Take the budget before the next ticket is checked against the same limiter
+                try:
+                    reservation = ticket.limiter.reserve(ticket.tokens)
+                except Exception as e:
+                    print(f"⚠️  Scheduler could not reserve for a {PRIORITY_NAMES[ticket.priority]} call: {e}")
+                    reservation = None  # The caller reserves for itself
+                with self.lock:
+                    ticket.reservation = reservation
+                    self._grant(ticket)
+
+    def stats(self) -> dict:
+        with self.lock:
+            classes = {}
+            for priority, name in PRIORITY_NAMES.items():
+                s = self._stats[priority]
+                classes[name] = {
+                    "queue_depth": self._depth[priority],
+                    "max_queue_depth": s.max_depth,
+                    "queued": s.queued,
+                    "granted": s.granted,
+                    "dropped": s.dropped,
+                    "avg_queue_wait_ms": round(s.total_queue_wait / s.granted * 1000, 1) if s.granted else 0.0,
+                    "max_queue_wait_ms": round(s.max_queue_wait * 1000, 1)
+                }
+            return {
+                "max_concurrent": self.max_concurrent,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "queue_depth": sum(self._depth.values()),
+                "classes": classes
+            }
 
 
-# Global request queue
-request_queue = RequestQueue()
+# Global scheduler shared by every Groq caller
+groq_scheduler = GroqScheduler()
 
 
 def get_rate_limit_status() -> dict:
-    """Get current rate limit status"""
-    return groq_rate_limiter.get_current_usage()
+    """Get current rate limit status (per-model budgets plus the scheduler's queues)"""
+    return {
+        "models": groq_rate_limiter.get_current_usage(),
+        "scheduler": groq_scheduler.stats()
+    }
 
 
 if __name__ == "__main__":
@@ -1,99 +1,633 @@
 """
 Redis caching module for AI DJ application
 Provides caching for user profiles and API responses to reduce token usage and improve speed
+
+Invalidation never walks the whole keyspace: entries written with tags (e.g. the user or
+track they belong to) are registered in a "tags:<tag>" sorted set scored by their expiry, and
+invalidate_tags() deletes just those members. Every write to a tag also trims members that
+have already expired, so a hot tag's set stays as small as its live entries.
+invalidate_pattern() is for ad-hoc cleanups - it iterates with SCAN
+and deletes with UNLINK, so Redis keeps serving other clients in between batches.
+
+Hot, small values (user profiles, @cached results) can opt into an in-process L1 LRU in
+front of Redis (CacheManager.get(key, local=True) / set(..., local_ttl=...)). Deletes and
+invalidations are published on the "cache:invalidate" channel; every worker process
+listens and drops the keys from its L1 and from the local tiers of its TieredCaches.
+
+get_or_load() adds stampede protection on top: concurrent misses for a key share one
+load (single-flight per process, a short Redis lock across processes), and entries past
+their soft TTL are served stale while one background refresh replaces them, until the
+hard TTL (the Redis expiry) is reached.
+
+Both clients draw from explicitly sized connection pools shared by every thread, and
+get_many() / set_many() / delete_many() cost one round trip (MGET or a pipeline) however
+many keys a request stage needs. Availability is not decided once at import: it is
+re-checked with a PING in the background every REDIS_RECHECK_INTERVAL seconds, and a
+connection error marks Redis down right away so callers fall back without waiting out
+socket timeouts, until the next check sees it back.
+
+Configuration (environment variables):
+    REDIS_MAX_CONNECTIONS   Connections per pool, per process (default: 50)
+    REDIS_POOL_TIMEOUT      Seconds to wait for a free pooled connection (default: 2)
+    REDIS_SOCKET_TIMEOUT    Socket connect/read timeout in seconds (default: 2)
+    REDIS_HEALTH_CHECK_INTERVAL  Seconds a pooled connection may idle before it is PINGed on checkout (default: 30)
+    REDIS_RECHECK_INTERVAL  Seconds between availability checks (default: 10)
+    CACHE_TAG_TTL           Min seconds a tag set outlives its latest write (default: 86400)
+    CACHE_SCAN_COUNT        Keys per SCAN / SSCAN step (default: 1000)
+    CACHE_DELETE_BATCH      Keys per UNLINK call (default: 500)
+    CACHE_L1_MAX_ENTRIES    L1 entries per process (default: 2048)
+    CACHE_L1_MAX_BYTES      L1 size bound per process (default: 16MB)
+    CACHE_L1_TTL            Max seconds an L1 entry is served (default: 30)
+    CACHE_REFRESH_WORKERS   Background refresh threads per process (default: 4)
+    CACHE_LOAD_LOCK_WAIT    Seconds to wait for another process's load before loading too (default: 5)
 """
 
 import os
 import json
+import time
+import copy
+import uuid
+import threading
+import concurrent.futures
 import redis
+from collections import OrderedDict
+from fnmatch import fnmatchcase
 from functools import wraps
 from datetime import timedelta
 from typing import Optional, Any, Callable
 import hashlib
 
-# Initialize Redis client (with fallback to no caching if Redis unavailable)
-try:
-    redis_client = redis.Redis(
+from cache_codec import encode as encode_value, decode as decode_value, codec_info
+
+CACHE_TAG_TTL = int(os.getenv("CACHE_TAG_TTL", 86400))
+CACHE_SCAN_COUNT = int(os.getenv("CACHE_SCAN_COUNT", 1000))
+CACHE_DELETE_BATCH = int(os.getenv("CACHE_DELETE_BATCH", 500))
+
+TAG_PREFIX = "tags:"
+# Plain sets written before tags became sorted sets - still honoured by invalidate_tags()
+# until they expire (CACHE_TAG_TTL after their last write)
+LEGACY_TAG_PREFIX = "tag:"
+
+CACHE_L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", 2048))
+CACHE_L1_MAX_BYTES = int(os.getenv("CACHE_L1_MAX_BYTES", 16 * 1024 * 1024))
+CACHE_L1_TTL = int(os.getenv("CACHE_L1_TTL", 30))
+
+CACHE_REFRESH_WORKERS = int(os.getenv("CACHE_REFRESH_WORKERS", 4))
+CACHE_LOAD_LOCK_WAIT = float(os.getenv("CACHE_LOAD_LOCK_WAIT", 5))
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+# Identifies this process's messages (with the pid, so forked workers don't share it)
+_INSTANCE_ID = uuid.uuid4().hex[:12]
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = int(os.getenv("REDIS_POOL_TIMEOUT", 2))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 2))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+REDIS_RECHECK_INTERVAL = float(os.getenv("REDIS_RECHECK_INTERVAL", 10))
+
+
+def _connection_pool(decode_responses: bool) -> redis.BlockingConnectionPool:
+    """
+    Pool shared by all threads: at most REDIS_MAX_CONNECTIONS sockets, and a caller finding
+    them all busy waits up to REDIS_POOL_TIMEOUT for one instead of opening another
+    """
+    return redis.BlockingConnectionPool(
         host=os.getenv('REDIS_HOST', 'localhost'),
         port=int(os.getenv('REDIS_PORT', 6379)),
         db=int(os.getenv('REDIS_DB', 0)),
         password=os.getenv('REDIS_PASSWORD', None),
-        decode_responses=True,
-        socket_connect_timeout=2,
-        socket_timeout=2
+        decode_responses=decode_responses,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL
     )
-    # Test connection
-    redis_client.ping()
-    REDIS_AVAILABLE = True
-    print("✅ Redis cache connected successfully")
-except Exception as e:
-    redis_client = None
-    REDIS_AVAILABLE = False
-    print(f"⚠️  Redis cache not available: {e}")
-    print("   Continuing without caching (will use API for each request)")
+
+
+# Redis clients - creating them doesn't connect; the app falls back to no caching while
+# redis_available() is False
+redis_client = redis.Redis(connection_pool=_connection_pool(decode_responses=True))
+# Cached payloads are binary (see cache_codec) - read them without decoding to str
+redis_bytes = redis.Redis(connection_pool=_connection_pool(decode_responses=False))
+
+REDIS_AVAILABLE = False
+
+
+class _RedisHealth:
+    """
+    Tracks whether Redis is reachable. The first check runs at import; after that a PING
+    runs in a background thread whenever the last check is older than REDIS_RECHECK_INTERVAL,
+    so callers never wait on it - they see the latest result.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = 0.0
+        self.checking = False
+        self.checks = 0
+        self.outages = 0
+        self.last_error = None
+    
+    def check(self) -> bool:
+        """PING Redis now and record the result"""
+        global REDIS_AVAILABLE
+        try:
+            redis_client.ping()
+            error = None
+        except Exception as e:
+            error = e
+        up = error is None
+        with self.lock:
+            first = self.checks == 0
+            was_up = REDIS_AVAILABLE
+            REDIS_AVAILABLE = up
+            self.checked_at = time.monotonic()
+            self.checking = False
+            self.checks += 1
+            if not up:
+                self.last_error = str(error)
+                if was_up:
+                    self.outages += 1
+        if up and not was_up:
+            print("✅ Redis cache connected successfully")
+            # Started late (or again) - follow other workers' invalidations from now on
+            invalidation_listener.ensure_running()
+        elif not up and first:
+            print(f"⚠️  Redis cache not available: {error}")
+            print("   Continuing without caching (will use API for each request)")
+        elif not up and was_up:
+            print(f"⚠️  Redis unreachable ({error}) - caching disabled, re-checking every {REDIS_RECHECK_INTERVAL:g}s")
+        return up
+    
+    def available(self) -> bool:
+        """Latest known availability (schedules a re-check in the background when it's due)"""
+        with self.lock:
+            due = not self.checking and time.monotonic() - self.checked_at >= REDIS_RECHECK_INTERVAL
+            if due:
+                self.checking = True
+        if due:
+            threading.Thread(target=self.check, name="redis-health", daemon=True).start()
+        return REDIS_AVAILABLE
+    
+    def mark_down(self, error: Exception):
+        """A command failed to reach Redis - stop using it until the next check succeeds"""
+        global REDIS_AVAILABLE
+        with self.lock:
+            if not REDIS_AVAILABLE:
+                return
+            REDIS_AVAILABLE = False
+            self.checked_at = time.monotonic()
+            self.outages += 1
+            self.last_error = str(error)
+        print(f"⚠️  Redis unreachable ({error}) - caching disabled, re-checking every {REDIS_RECHECK_INTERVAL:g}s")
+    
+    def command_failed(self, error: Exception):
+        """A command raised - mark Redis down if it couldn't be reached at all"""
+        # A pool with every connection busy raises ConnectionError too, but Redis itself is fine
+        if isinstance(error, (redis.ConnectionError, redis.TimeoutError)) and "No connection available" not in str(error):
+            self.mark_down(error)
+    
+    def stats(self) -> dict:
+        pools = {
+            name: {
+                "max_connections": client.connection_pool.max_connections,
+                "open": len(getattr(client.connection_pool, '_connections', ()))
+            }
+            for name, client in (("text", redis_client), ("binary", redis_bytes))
+        }
+        with self.lock:
+            return {
+                "available": REDIS_AVAILABLE,
+                "checks": self.checks,
+                "outages": self.outages,
+                "last_error": self.last_error,
+                "recheck_interval": REDIS_RECHECK_INTERVAL,
+                "pools": pools
+            }
+
+
+redis_health = _RedisHealth()
+
+
+def redis_available() -> bool:
+    """Whether Redis is reachable right now (re-checked every REDIS_RECHECK_INTERVAL seconds)"""
+    return redis_health.available()
+
+
+def _redis_error(context: str, error: Exception):
+    """Log a failed Redis command; connection failures also mark Redis down until the next check"""
+    print(f"{context}: {error}")
+    redis_health.command_failed(error)
+
+
+def user_tag(clerk_id: str) -> str:
+    """Tag for everything cached for one user"""
+    return f"user:{clerk_id}"
+
+
+def track_tag(track_id: str) -> str:
+    """Tag for everything cached for one track"""
+    return f"track:{track_id}"
+
+
+class _InvalidationStats:
+    """Calls, keys deleted and time spent per invalidation method"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = {}  # method -> [calls, keys, seconds, max seconds]
+    
+    def record(self, method: str, keys: int, seconds: float):
+        with self.lock:
+            entry = self.methods.setdefault(method, [0, 0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += keys
+            entry[2] += seconds
+            entry[3] = max(entry[3], seconds)
+    
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                method: {
+                    "calls": calls,
+                    "keys_deleted": keys,
+                    "avg_ms": round(seconds / calls * 1000, 2) if calls else 0.0,
+                    "max_ms": round(max_seconds * 1000, 2)
+                }
+                for method, (calls, keys, seconds, max_seconds) in self.methods.items()
+            }
+
+
+invalidation_stats = _InvalidationStats()
+
+
+class _TierStats:
+    """Hits, misses and lookup latency per cache tier"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tiers = {}  # tier -> [hits, misses, seconds]
+    
+    def record(self, tier: str, hit: bool, seconds: float):
+        with self.lock:
+            entry = self.tiers.setdefault(tier, [0, 0, 0.0])
+            entry[0 if hit else 1] += 1
+            entry[2] += seconds
+    
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                tier: {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                    "avg_latency_ms": round(seconds / (hits + misses) * 1000, 3) if hits + misses else 0.0
+                }
+                for tier, (hits, misses, seconds) in self.tiers.items()
+            }
+
+
+tier_stats = _TierStats()
+
+
+def _origin() -> str:
+    return f"{_INSTANCE_ID}:{os.getpid()}"
+
+
+def _drop_local(keys=(), pattern: Optional[str] = None):
+    """Remove Redis keys (or a pattern) from this process's L1 and TieredCache local tiers"""
+    for key in keys:
+        l1_cache.delete(key)
+        for namespace, cache in _tiered_caches.items():
+            if key.startswith(f"{namespace}:"):
+                cache.local.delete(key[len(namespace) + 1:])
+    if pattern:
+        l1_cache.delete_where(lambda key: fnmatchcase(key, pattern))
+        for namespace, cache in _tiered_caches.items():
+            cache.local.delete_where(lambda key: fnmatchcase(f"{namespace}:{key}", pattern))
+
+
+def _publish_invalidation(keys=(), pattern: Optional[str] = None, pipe=None):
+    """Tell the other workers to drop keys / pattern from their local tiers"""
+    message = json.dumps({"origin": _origin(), "keys": list(keys), "pattern": pattern})
+    if pipe is not None:
+        pipe.publish(INVALIDATION_CHANNEL, message)
+        return
+    try:
+        redis_client.publish(INVALIDATION_CHANNEL, message)
+    except Exception as e:
+        print(f"Cache invalidation publish error: {e}")
+
+
+class _InvalidationListener:
+    """Background subscriber applying other workers' invalidations to this process's local tiers"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.received = 0
+        self.errors = 0
+    
+    def ensure_running(self):
+        """Start the listener thread (again after a fork - threads don't survive one)"""
+        if not REDIS_AVAILABLE or self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            threading.Thread(target=self._run, name="cache-invalidation", daemon=True).start()
+    
+    def _run(self):
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        self._apply(message['data'])
+            except Exception as e:
+                self.errors += 1
+                print(f"Cache invalidation listener error: {e} (reconnecting)")
+                # Anything published while disconnected was missed - drop what could be stale
+                l1_cache.clear()
+                time.sleep(1)
+    
+    def _apply(self, data: str):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        if message.get('origin') == _origin():
+            return  # Already applied locally
+        self.received += 1
+        _drop_local(message.get('keys') or (), message.get('pattern'))
+    
+    def stats(self) -> dict:
+        return {"running": self.pid == os.getpid(), "received": self.received, "errors": self.errors}
+
+
+invalidation_listener = _InvalidationListener()
+
+
+def _unlink_batches(keys) -> int:
+    """
+    UNLINK keys (any iterable) in CACHE_DELETE_BATCH chunks - memory is reclaimed off the main
+    thread. Each batch is also dropped from local tiers here and in the other workers.
+    """
+    deleted = 0
+    batch = []
+    for key in keys:
+        batch.append(key)
+        if len(batch) >= CACHE_DELETE_BATCH:
+            deleted += redis_client.unlink(*batch)
+            _drop_local(batch)
+            _publish_invalidation(batch)
+            batch = []
+    if batch:
+        deleted += redis_client.unlink(*batch)
+        _drop_local(batch)
+        _publish_invalidation(batch)
+    return deleted
 
 
 class CacheManager:
     """Manages caching operations with automatic fallback if Redis unavailable"""
     
     # Cache TTL settings (in seconds)
-    USER_PROFILE_TTL = 300  # 5 minutes
+    USER_PROFILE_TTL = 300  # 5 minutes fresh (soft TTL)...
+    USER_PROFILE_HARD_TTL = 3600  # ...then served stale while refreshing, for up to 1 hour
+    USER_PROFILE_LOCAL_TTL = 30  # In-process copy, refreshed from Redis after this
     LYRICS_EXPLANATION_TTL = 3600  # 1 hour
     SPOTIFY_DATA_TTL = 600  # 10 minutes
     
     @staticmethod
-    def get(key: str) -> Optional[Any]:
-        """Get value from cache"""
-        if not REDIS_AVAILABLE:
+    def get(key: str, local: bool = False) -> Optional[Any]:
+        """Get value from cache (checking this process's L1 first if local)"""
+        if local:
+            start = time.perf_counter()
+            value = l1_cache.get(key)
+            tier_stats.record("l1", value is not None, time.perf_counter() - start)
+            if value is not None:
+                return value
+        
+        if not redis_available():
             return None
         
         try:
-            value = redis_client.get(key)
+            start = time.perf_counter()
+            value = redis_bytes.get(key)
+            tier_stats.record("redis", bool(value), time.perf_counter() - start)
             if value:
-                return json.loads(value)
+                value = decode_value(value)
+                if local:
+                    invalidation_listener.ensure_running()
+                    l1_cache.set(key, value, CACHE_L1_TTL)
+                return value
             return None
         except Exception as e:
-            print(f"Cache get error: {e}")
+            _redis_error("Cache get error", e)
             return None
     
     @staticmethod
-    def set(key: str, value: Any, ttl: int = 300) -> bool:
-        """Set value in cache with TTL"""
-        if not REDIS_AVAILABLE:
+    def set(key: str, value: Any, ttl: int = 300, tags: tuple = (), local_ttl: Optional[int] = None) -> bool:
+        """
+        Set value in cache with TTL, registering it under tags for invalidate_tags().
+        With local_ttl, the value is also kept in this process's L1 and other workers drop
+        their (now stale) L1 copy.
+        """
+        if local_ttl:
+            l1_cache.set(key, value, min(local_ttl, ttl, CACHE_L1_TTL))
+        
+        if not redis_available():
             return False
         
         try:
-            serialized = json.dumps(value, default=str)
-            redis_client.setex(key, ttl, serialized)
+            serialized = encode_value(value)
+            if tags or local_ttl:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.setex(key, ttl, serialized)
+                CacheManager.add_tags(pipe, key, ttl, tags)
+                if local_ttl:
+                    invalidation_listener.ensure_running()
+                    _publish_invalidation([key], pipe=pipe)
+                pipe.execute()
+            else:
+                redis_client.setex(key, ttl, serialized)
             return True
         except Exception as e:
-            print(f"Cache set error: {e}")
+            _redis_error("Cache set error", e)
             return False
     
     @staticmethod
     def delete(key: str) -> bool:
-        """Delete key from cache"""
-        if not REDIS_AVAILABLE:
+        """Delete key from cache (Redis, and every worker's local tiers)"""
+        _drop_local([key])
+        if not redis_available():
             return False
         
         try:
-            redis_client.delete(key)
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.delete(key)
+            _publish_invalidation([key], pipe=pipe)
+            pipe.execute()
             return True
         except Exception as e:
-            print(f"Cache delete error: {e}")
+            _redis_error("Cache delete error", e)
             return False
     
     @staticmethod
-    def invalidate_pattern(pattern: str) -> int:
-        """Delete all keys matching pattern"""
-        if not REDIS_AVAILABLE:
+    def get_many(keys, local: bool = False) -> dict:
+        """
+        Get several values with one MGET (checking this process's L1 first if local).
+        Returns a dict of the keys that were found; missing keys are left out.
+        """
+        found = {}
+        remote = []
+        for key in dict.fromkeys(keys):
+            if local:
+                start = time.perf_counter()
+                value = l1_cache.get(key)
+                tier_stats.record("l1", value is not None, time.perf_counter() - start)
+                if value is not None:
+                    found[key] = value
+                    continue
+            remote.append(key)
+        
+        if not remote or not redis_available():
+            return found
+        
+        try:
+            start = time.perf_counter()
+            values = redis_bytes.mget(remote)
+            # One round trip for every key - each lookup is charged its share
+            elapsed = (time.perf_counter() - start) / len(remote)
+        except Exception as e:
+            _redis_error("Cache get_many error", e)
+            return found
+        
+        if local:
+            invalidation_listener.ensure_running()
+        for key, value in zip(remote, values):
+            tier_stats.record("redis", bool(value), elapsed)
+            if not value:
+                continue
+            try:
+                value = decode_value(value)
+            except Exception as e:
+                print(f"Cache decode error ({key}): {e}")
+                continue
+            found[key] = value
+            if local:
+                l1_cache.set(key, value, CACHE_L1_TTL)
+        return found
+    
+    @staticmethod
+    def set_many(mapping: dict, ttl: int = 300, tags=(), local_ttl: Optional[int] = None) -> bool:
+        """
+        Set several values with one pipelined round trip. tags are registered for every key,
+        or, as a dict, per key ({key: tags}). local_ttl works as in set().
+        """
+        if not mapping:
+            return True
+        if local_ttl:
+            for key, value in mapping.items():
+                l1_cache.set(key, value, min(local_ttl, ttl, CACHE_L1_TTL))
+        
+        if not redis_available():
+            return False
+        
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.setex(key, ttl, encode_value(value))
+                CacheManager.add_tags(pipe, key, ttl, tags.get(key, ()) if isinstance(tags, dict) else tags)
+            if local_ttl:
+                invalidation_listener.ensure_running()
+                _publish_invalidation(mapping.keys(), pipe=pipe)
+            pipe.execute()
+            return True
+        except Exception as e:
+            _redis_error("Cache set_many error", e)
+            return False
+    
+    @staticmethod
+    def delete_many(keys) -> int:
+        """Delete several keys (Redis, and every worker's local tiers) in one round trip. Returns keys deleted."""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return 0
+        _drop_local(keys)
+        if not redis_available():
             return 0
         
         try:
-            keys = redis_client.keys(pattern)
-            if keys:
-                return redis_client.delete(*keys)
+            pipe = redis_client.pipeline(transaction=False)
+            for i in range(0, len(keys), CACHE_DELETE_BATCH):
+                pipe.unlink(*keys[i:i + CACHE_DELETE_BATCH])
+            _publish_invalidation(keys, pipe=pipe)
+            return sum(pipe.execute()[:-1])
+        except Exception as e:
+            _redis_error("Cache delete_many error", e)
             return 0
+    
+    @staticmethod
+    def add_tags(pipe, key: str, ttl: int, tags: tuple):
+        """
+        Queue registering key under tags on a pipeline. Members are scored by when the key
+        expires; members already past that are trimmed on the same write.
+        """
+        now = time.time()
+        for tag in tags:
+            tag_key = f"{TAG_PREFIX}{tag}"
+            pipe.zadd(tag_key, {key: now + ttl})
+            pipe.zremrangebyscore(tag_key, "-inf", now)
+            pipe.expire(tag_key, max(ttl, CACHE_TAG_TTL))
+    
+    @staticmethod
+    def invalidate_tags(*tags: str) -> int:
+        """Delete every key registered under any of tags (plus the tag sets). Returns keys deleted."""
+        if not redis_available() or not tags:
+            return 0
+        
+        start = time.perf_counter()
+        try:
+            deleted = 0
+            now = time.time()
+            for tag in tags:
+                tag_key = f"{TAG_PREFIX}{tag}"
+                # ZSCAN so a huge tag set is read in steps too; expired members are already gone
+                members = redis_client.zscan_iter(tag_key, count=CACHE_SCAN_COUNT)
+                deleted += _unlink_batches(key for key, expires_at in members if expires_at > now)
+                legacy_key = f"{LEGACY_TAG_PREFIX}{tag}"
+                deleted += _unlink_batches(redis_client.sscan_iter(legacy_key, count=CACHE_SCAN_COUNT))
+                redis_client.unlink(tag_key, legacy_key)
+            invalidation_stats.record("tags", deleted, time.perf_counter() - start)
+            return deleted
+        except Exception as e:
+            print(f"Cache invalidate error: {e}")
+            return 0
+    
+    @staticmethod
+    def invalidate_pattern(pattern: str) -> int:
+        """
+        Delete all keys matching pattern. Walks the keyspace with SCAN rather than KEYS
+        (which blocks Redis for O(total keys)) - prefer tags for anything on a hot path.
+        """
+        if not redis_available():
+            return 0
+        
+        start = time.perf_counter()
+        try:
+            deleted = _unlink_batches(redis_client.scan_iter(match=pattern, count=CACHE_SCAN_COUNT))
+            # Local tiers may hold matching keys that already expired from Redis
+            _drop_local(pattern=pattern)
+            _publish_invalidation(pattern=pattern)
+            invalidation_stats.record("pattern", deleted, time.perf_counter() - start)
+            return deleted
         except Exception as e:
             print(f"Cache invalidate error: {e}")
             return 0
@@ -107,12 +641,258 @@ class CacheManager:
         return f"{prefix}:{key_hash}"
 
 
-def cached(ttl: int = 300, prefix: str = "cache"):
+def estimate_size(value: Any) -> int:
+    """Approximate memory cost of a cached value (its serialized length in bytes)"""
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    try:
+        return len(json.dumps(value, default=str).encode('utf-8'))
+    except Exception:
+        return 0
+
+
+class LocalCache:
+    """
+    Thread-safe in-process LRU cache with per-entry TTL.
+    Bounded by entry count and optionally by total (estimated) bytes.
+    Used as a hot tier in front of Redis (and on its own when Redis is unavailable).
+    """
+    
+    def __init__(self, max_entries: int = 1024, default_ttl: int = 300, copy_values: bool = True,
+                 max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # Callers mutate the dicts they store/receive (e.g. adding 'position' or lyrics to tracks),
+        # so keep private copies on both write and read
+        self.copy_values = copy_values
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at, value, size)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get value if present and not expired (marks it as recently used)"""
+        with self.lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value, size = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.total_bytes -= size
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value) if self.copy_values else value
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Store value, evicting least recently used entries past max_entries / max_bytes"""
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        size = estimate_size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return  # Would evict everything else - don't cache it at all
+        if self.copy_values:
+            value = copy.deepcopy(value)
+        with self.lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[2]
+            self._data[key] = (expires_at, value, size)
+            self.total_bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes and self.total_bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+    
+    def delete(self, key: str):
+        with self.lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[2]
+    
+    def delete_where(self, predicate: Callable[[str], bool]) -> int:
+        """Delete every key for which predicate(key) is true"""
+        with self.lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                self.total_bytes -= self._data.pop(key)[2]
+        return len(keys)
+    
+    def clear(self):
+        with self.lock:
+            self._data.clear()
+            self.total_bytes = 0
+    
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+# Process-wide L1 in front of Redis for CacheManager calls that opt in (local=True / local_ttl)
+l1_cache = LocalCache(max_entries=CACHE_L1_MAX_ENTRIES, default_ttl=CACHE_L1_TTL, max_bytes=CACHE_L1_MAX_BYTES)
+
+# Marker stored for negative ("not found") entries so they survive the JSON round trip
+NEGATIVE_ENTRY = {"__negative__": True}
+
+# All TieredCache instances by namespace (reported by get_cache_stats)
+_tiered_caches: dict = {}
+
+
+class TieredCache:
+    """
+    Two-tier cache (in-process LRU + Redis) for a single namespace.
+    Supports negative entries with their own (shorter) TTL and keeps hit/miss counters.
+    With use_redis=False only the local tier is used, but delete() still drops the key
+    from every worker's local tier.
+    
+    Usage:
+        cache = TieredCache("track_resolve", ttl=86400, negative_ttl=3600)
+        hit, value = cache.get(key)   # value is None for negative hits
+        cache.set(key, value) / cache.set_negative(key)
+    """
+    
+    def __init__(self, namespace: str, ttl: int, negative_ttl: Optional[int] = None,
+                 local_max_entries: int = 1024, local_ttl: int = 300,
+                 local_max_bytes: Optional[int] = None, use_redis: bool = True):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl if negative_ttl is not None else ttl
+        self.use_redis = use_redis
+        # Local entries never outlive the Redis ones
+        self.local = LocalCache(
+            max_entries=local_max_entries,
+            default_ttl=min(local_ttl, ttl),
+            max_bytes=local_max_bytes
+        )
+        self.lock = threading.Lock()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        _tiered_caches[namespace] = self
+        invalidation_listener.ensure_running()
+    
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+    
+    def _count(self, counter: str, negative: bool = False):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            if negative:
+                self.negative_hits += 1
+    
+    def get(self, key: str) -> tuple[bool, Any]:
+        """
+        Look up key in the local tier, then Redis.
+        Returns: (hit, value) - value is None for negative hits
+        """
+        value = self.local.get(key)
+        if value is not None:
+            negative = value == NEGATIVE_ENTRY
+            self._count("local_hits", negative)
+            return True, None if negative else value
+        
+        value = CacheManager.get(self._redis_key(key)) if self.use_redis else None
+        if value is not None:
+            negative = value == NEGATIVE_ENTRY
+            self.local.set(key, value, min(self.local.default_ttl, self.negative_ttl) if negative else None)
+            self._count("redis_hits", negative)
+            return True, None if negative else value
+        
+        self._count("misses")
+        return False, None
+    
+    def get_many(self, keys) -> dict:
+        """
+        Look up several keys: the local tier, then one MGET for the rest.
+        Returns: {key: value} for hits only - value is None for negative hits
+        """
+        found = {}
+        remote = []
+        for key in dict.fromkeys(keys):
+            value = self.local.get(key)
+            if value is None:
+                remote.append(key)
+                continue
+            negative = value == NEGATIVE_ENTRY
+            self._count("local_hits", negative)
+            found[key] = None if negative else value
+        
+        values = CacheManager.get_many([self._redis_key(key) for key in remote]) if remote and self.use_redis else {}
+        for key in remote:
+            value = values.get(self._redis_key(key))
+            if value is None:
+                self._count("misses")
+                continue
+            negative = value == NEGATIVE_ENTRY
+            self.local.set(key, value, min(self.local.default_ttl, self.negative_ttl) if negative else None)
+            self._count("redis_hits", negative)
+            found[key] = None if negative else value
+        return found
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Store a positive entry in both tiers"""
+        ttl = ttl if ttl is not None else self.ttl
+        self.local.set(key, value, min(self.local.default_ttl, ttl))
+        if self.use_redis:
+            CacheManager.set(self._redis_key(key), value, ttl)
+    
+    def set_many(self, mapping: dict, ttl: Optional[int] = None):
+        """Store several positive entries in both tiers (one Redis round trip)"""
+        ttl = ttl if ttl is not None else self.ttl
+        for key, value in mapping.items():
+            self.local.set(key, value, min(self.local.default_ttl, ttl))
+        if self.use_redis and mapping:
+            CacheManager.set_many({self._redis_key(key): value for key, value in mapping.items()}, ttl)
+    
+    def set_negative(self, key: str):
+        """Remember that key has no value (e.g. song not found) for negative_ttl seconds"""
+        self.local.set(key, NEGATIVE_ENTRY, min(self.local.default_ttl, self.negative_ttl))
+        if self.use_redis:
+            CacheManager.set(self._redis_key(key), NEGATIVE_ENTRY, self.negative_ttl)
+    
+    def delete(self, key: str):
+        self.local.delete(key)
+        if self.use_redis:
+            CacheManager.delete(self._redis_key(key))
+        elif redis_available():
+            _publish_invalidation([self._redis_key(key)])
+    
+    def stats(self) -> dict:
+        with self.lock:
+            hits = self.local_hits + self.redis_hits
+            lookups = hits + self.misses
+            return {
+                "local_hits": self.local_hits,
+                "redis_hits": self.redis_hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "local": self.local.stats()
+            }
+
+
+def cached(ttl: int = 300, prefix: str = "cache", local_ttl: Optional[int] = None):
     """
     Decorator for caching function results
     
     Usage:
-        @cached(ttl=300, prefix="user_profile")
+        @cached(ttl=300, prefix="user_profile", local_ttl=30)   # local_ttl: also keep in the L1
         def get_user_profile(user_id):
             # Expensive operation
             return profile_data
@@ -124,7 +904,7 @@ def cached(ttl: int = 300, prefix: str = "cache"):
             cache_key = CacheManager.get_cache_key(prefix, *args, **kwargs)
             
             # Try to get from cache
-            cached_value = CacheManager.get(cache_key)
+            cached_value = CacheManager.get(cache_key, local=bool(local_ttl))
             if cached_value is not None:
                 print(f"✅ Cache HIT: {func.__name__}")
                 return cached_value
@@ -134,25 +914,214 @@ def cached(ttl: int = 300, prefix: str = "cache"):
             result = func(*args, **kwargs)
             
             # Store in cache
-            CacheManager.set(cache_key, result, ttl)
+            CacheManager.set(cache_key, result, ttl, local_ttl=local_ttl)
             
             return result
         return wrapper
     return decorator
 
 
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs fn, the others
+    wait for and share its result (or exception).
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}  # key -> Future of the call in flight
+        self.coalesced = 0
+    
+    def do(self, key: str, fn: Callable) -> Any:
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self.calls[key] = future
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+    
+    def in_flight(self, key: str) -> bool:
+        with self.lock:
+            return key in self.calls
+
+
+class _StaleWhileRevalidateStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.lock_waits = 0  # Misses that waited for another process's load
+    
+    def count(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+    
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "fresh_hits": self.fresh_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "coalesced": _single_flight.coalesced,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "lock_waits": self.lock_waits
+            }
+
+
+_single_flight = SingleFlight()
+swr_stats = _StaleWhileRevalidateStats()
+_refresh_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=CACHE_REFRESH_WORKERS,
+    thread_name_prefix="cache-refresh"
+)
+
+
+# Delete the lock only while it still holds our token - it may have expired and been taken by another process
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_lock_script = redis_client.register_script(_RELEASE_LOCK)
+
+
+def _acquire_load_lock(key: str, ttl: int) -> Optional[str]:
+    """
+    Cross-process lock for loading key. Returns the token to release it with, "" when there
+    is no Redis to lock in (load anyway), or None if another process holds the lock.
+    """
+    if not redis_available():
+        return ""
+    token = f"{_origin()}:{uuid.uuid4().hex[:8]}"
+    try:
+        return token if redis_client.set(f"lock:{key}", token, nx=True, ex=ttl) else None
+    except Exception:
+        return ""
+
+
+def _release_load_lock(key: str, token: str):
+    """Release a lock taken by _acquire_load_lock (compare-and-delete on its token)"""
+    if token and redis_available():
+        try:
+            _release_lock_script(keys=[f"lock:{key}"], args=[token])
+        except Exception:
+            pass
+
+
+def _store_entry(key: str, value: Any, soft_ttl: int, hard_ttl: int, tags: tuple, local_ttl: Optional[int]):
+    entry = {"value": value, "fresh_until": time.time() + soft_ttl}
+    CacheManager.set(key, entry, hard_ttl, tags=tags, local_ttl=local_ttl)
+
+
+def _load(key: str, loader: Callable, soft_ttl: int, hard_ttl: int, tags: tuple,
+          local_ttl: Optional[int], refresh: bool = False) -> Any:
+    """Run loader under the cross-process lock and store its result (single-flighted by the caller)"""
+    lock_ttl = max(1, int(CACHE_LOAD_LOCK_WAIT * 2))
+    token = _acquire_load_lock(key, lock_ttl)
+    if token is None:
+        if refresh:
+            return None  # Another process is already refreshing it
+        # Another process is loading it - wait for its result instead of loading again
+        swr_stats.count("lock_waits")
+        deadline = time.monotonic() + CACHE_LOAD_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            entry = CacheManager.get(key)
+            if isinstance(entry, dict) and "fresh_until" in entry:
+                return entry["value"]
+        # Gave up waiting: load without the lock (and leave the other process's lock alone)
+    try:
+        value = loader()
+        if value is not None:
+            _store_entry(key, value, soft_ttl, hard_ttl, tags, local_ttl)
+        return value
+    finally:
+        if token:
+            _release_load_lock(key, token)
+
+
+def _refresh(key: str, loader: Callable, soft_ttl: int, hard_ttl: int, tags: tuple, local_ttl: Optional[int]):
+    try:
+        _single_flight.do(key, lambda: _load(key, loader, soft_ttl, hard_ttl, tags, local_ttl, refresh=True))
+        swr_stats.count("refreshes")
+    except Exception as e:
+        swr_stats.count("refresh_errors")
+        print(f"⚠️  Background refresh of {key} failed (keeping stale value): {e}")
+
+
+def get_or_load(key: str, loader: Callable[[], Any], soft_ttl: int, hard_ttl: int,
+                tags: tuple = (), local_ttl: Optional[int] = None) -> Any:
+    """
+    Cached value for key, loading it with loader() on a miss.
+    
+    Fresh for soft_ttl seconds. After that (until hard_ttl, when Redis drops it) the stale
+    value is returned immediately and loader runs once in the background to replace it.
+    Concurrent misses share a single loader call; loader errors propagate to them.
+    """
+    entry = CacheManager.get(key, local=bool(local_ttl))
+    if isinstance(entry, dict) and "fresh_until" in entry:
+        if time.time() < entry["fresh_until"]:
+            swr_stats.count("fresh_hits")
+            return entry["value"]
+        swr_stats.count("stale_hits")
+        if not _single_flight.in_flight(key):
+            _refresh_executor.submit(_refresh, key, loader, soft_ttl, hard_ttl, tags, local_ttl)
+        return entry["value"]
+    
+    swr_stats.count("misses")
+    return _single_flight.do(key, lambda: _load(key, loader, soft_ttl, hard_ttl, tags, local_ttl))
+
+
 # Specific cache functions for common operations
 
 def cache_user_profile(clerk_id: str, profile_data: dict) -> bool:
     """Cache user's Spotify profile"""
     key = f"user_profile:{clerk_id}"
-    return CacheManager.set(key, profile_data, CacheManager.USER_PROFILE_TTL)
+    return CacheManager.set(
+        key, {"value": profile_data, "fresh_until": time.time() + CacheManager.USER_PROFILE_TTL},
+        CacheManager.USER_PROFILE_HARD_TTL, tags=(user_tag(clerk_id),), local_ttl=CacheManager.USER_PROFILE_LOCAL_TTL
+    )
 
 
 def get_cached_user_profile(clerk_id: str) -> Optional[dict]:
-    """Get cached user profile"""
+    """Get cached user profile, fresh or stale (read several times per request, so served from the L1 when warm)"""
     key = f"user_profile:{clerk_id}"
-    return CacheManager.get(key)
+    entry = CacheManager.get(key, local=True)
+    return entry.get("value") if isinstance(entry, dict) else None
+
+
+def get_user_profile(clerk_id: str, loader: Callable[[], dict]) -> dict:
+    """
+    User's profile via get_or_load: one loader call per expired profile no matter how many
+    requests arrive at once, and stale profiles are refreshed in the background.
+    """
+    return get_or_load(
+        f"user_profile:{clerk_id}", loader,
+        soft_ttl=CacheManager.USER_PROFILE_TTL,
+        hard_ttl=CacheManager.USER_PROFILE_HARD_TTL,
+        tags=(user_tag(clerk_id),),
+        local_ttl=CacheManager.USER_PROFILE_LOCAL_TTL
+    )
 
 
 def invalidate_user_profile(clerk_id: str) -> bool:
@@ -161,23 +1130,148 @@ def invalidate_user_profile(clerk_id: str) -> bool:
     return CacheManager.delete(key)
 
 
-def cache_lyrics_explanation(track_id: str, user_prompt: str, explanation: str, highlighted_terms: list) -> bool:
-    """Cache lyrics explanation and highlighted terms"""
-    # Create a hash from user prompt to avoid collisions
-    prompt_hash = hashlib.md5(user_prompt.encode()).hexdigest()[:8]
-    key = f"lyrics_exp:{track_id}:{prompt_hash}"
-    data = {
+def invalidate_user(clerk_id: str) -> int:
+    """Drop everything cached for a user (tagged with user_tag)"""
+    return CacheManager.invalidate_tags(user_tag(clerk_id))
+
+
+def invalidate_track(track_id: str) -> int:
+    """Drop everything cached for a track, e.g. explanations after its lyrics changed"""
+    return CacheManager.invalidate_tags(track_tag(track_id))
+
+
+class _ExplanationCacheStats:
+    """Hit/miss counters for the lyrics explanation cache"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lookups = 0  # Batched lookups (one MGET each)
+        self.hits = 0     # Tracks found
+        self.misses = 0   # Tracks not found
+        self.stores = 0
+        self.errors = 0
+    
+    def count(self, **increments):
+        with self.lock:
+            for counter, amount in increments.items():
+                setattr(self, counter, getattr(self, counter) + amount)
+    
+    def stats(self) -> dict:
+        with self.lock:
+            tracks = self.hits + self.misses
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / tracks, 3) if tracks else 0.0
+            }
+
+
+explanation_cache_stats = _ExplanationCacheStats()
+
+
+def normalize_prompt(user_prompt: str) -> str:
+    """Case, whitespace and trailing punctuation don't change what the user asked for"""
+    return " ".join(user_prompt.lower().split()).rstrip(".!?,;: ")
+
+
+def lyrics_version(lyrics: str, lyrics_original: Optional[str] = None) -> str:
+    """Digest of the lyrics an explanation was generated from (changes when lyrics or translation do)"""
+    return hashlib.sha256(f"{lyrics}\0{lyrics_original or ''}".encode()).hexdigest()
+
+
+def lyrics_explanation_key(track_id: str, user_prompt: str, lyrics: str, lyrics_original: Optional[str] = None) -> str:
+    """Cache key per (track, normalized prompt, lyrics version) - full SHA-256, no truncation"""
+    digest = hashlib.sha256(
+        f"{normalize_prompt(user_prompt)}\0{lyrics_version(lyrics, lyrics_original)}".encode()
+    ).hexdigest()
+    return f"lyrics_exp:{track_id}:{digest}"
+
+
+def cache_lyrics_explanations(user_prompt: str, entries: list) -> int:
+    """
+    Cache explanation/highlight results for several tracks in one pipelined round trip.
+    
+    Args:
+        user_prompt: User's original request/prompt
+        entries: Dicts with 'track_id', 'lyrics', optionally 'lyrics_original', and the
+                 cached fields: 'explanation', 'highlighted_terms',
+                 'highlighted_terms_original' and optionally 'score'
+    
+    Returns:
+        Number of entries stored
+    """
+    entries = [entry for entry in entries if entry.get('explanation')]
+    if not redis_available() or not entries:
+        return 0
+    
+    values = {}
+    tags = {}
+    for entry in entries:
+        key = lyrics_explanation_key(entry['track_id'], user_prompt, entry['lyrics'], entry.get('lyrics_original'))
+        values[key] = {
+            "explanation": entry['explanation'],
+            "highlighted_terms": entry.get('highlighted_terms') or [],
+            "highlighted_terms_original": entry.get('highlighted_terms_original') or [],
+            "score": entry.get('score')
+        }
+        tags[key] = (track_tag(entry['track_id']),)
+    if not CacheManager.set_many(values, CacheManager.LYRICS_EXPLANATION_TTL, tags=tags):
+        explanation_cache_stats.count(errors=1)
+        return 0
+    explanation_cache_stats.count(stores=len(values))
+    return len(values)
+
+
+def get_cached_lyrics_explanations(user_prompt: str, tracks: list) -> dict:
+    """
+    Look up cached explanations for several tracks with a single MGET.
+    
+    Args:
+        user_prompt: User's original request/prompt
+        tracks: Dicts with 'track_id', 'lyrics' and optionally 'lyrics_original'
+    
+    Returns:
+        Dict mapping track_id to {'explanation', 'highlighted_terms',
+        'highlighted_terms_original', 'score'} for the tracks that were cached
+    """
+    tracks = [track for track in tracks if track.get('lyrics')]
+    if not redis_available() or not tracks:
+        return {}
+    
+    keys = [
+        lyrics_explanation_key(track['track_id'], user_prompt, track['lyrics'], track.get('lyrics_original'))
+        for track in tracks
+    ]
+    values = CacheManager.get_many(keys)
+    
+    found = {track['track_id']: values[key] for track, key in zip(tracks, keys) if key in values}
+    explanation_cache_stats.count(lookups=1, hits=len(found), misses=len(tracks) - len(found))
+    return found
+
+
+def cache_lyrics_explanation(track_id: str, user_prompt: str, explanation: str, highlighted_terms: list,
+                             lyrics: str, lyrics_original: Optional[str] = None,
+                             highlighted_terms_original: Optional[list] = None) -> bool:
+    """Cache one track's lyrics explanation and highlighted terms"""
+    return cache_lyrics_explanations(user_prompt, [{
+        "track_id": track_id,
+        "lyrics": lyrics,
+        "lyrics_original": lyrics_original,
         "explanation": explanation,
-        "highlighted_terms": highlighted_terms
-    }
-    return CacheManager.set(key, data, CacheManager.LYRICS_EXPLANATION_TTL)
+        "highlighted_terms": highlighted_terms,
+        "highlighted_terms_original": highlighted_terms_original
+    }]) == 1
 
 
-def get_cached_lyrics_explanation(track_id: str, user_prompt: str) -> Optional[tuple]:
-    """Get cached lyrics explanation"""
-    prompt_hash = hashlib.md5(user_prompt.encode()).hexdigest()[:8]
-    key = f"lyrics_exp:{track_id}:{prompt_hash}"
-    data = CacheManager.get(key)
+def get_cached_lyrics_explanation(track_id: str, user_prompt: str, lyrics: str,
+                                  lyrics_original: Optional[str] = None) -> Optional[tuple]:
+    """Get one track's cached (explanation, highlighted_terms), or None"""
+    data = get_cached_lyrics_explanations(user_prompt, [
+        {"track_id": track_id, "lyrics": lyrics, "lyrics_original": lyrics_original}
+    ]).get(track_id)
     if data:
         return data.get("explanation"), data.get("highlighted_terms", [])
     return None
@@ -185,8 +1279,21 @@ def get_cached_lyrics_explanation(track_id: str, user_prompt: str) -> Optional[t
 
 def get_cache_stats() -> dict:
     """Get cache statistics"""
-    if not REDIS_AVAILABLE:
-        return {"available": False}
+    tiers = {namespace: cache.stats() for namespace, cache in _tiered_caches.items()}
+    explanations = explanation_cache_stats.stats()
+    invalidations = invalidation_stats.stats()
+    cache_manager = {
+        **tier_stats.stats(),
+        "l1_cache": l1_cache.stats(),
+        "invalidation_listener": invalidation_listener.stats(),
+        "stale_while_revalidate": swr_stats.stats(),
+        "codec": codec_info(),
+        "connection": redis_health.stats()
+    }
+    
+    if not redis_available():
+        return {"available": False, "tiers": tiers, "lyrics_explanations": explanations,
+                "invalidations": invalidations, "cache_manager": cache_manager}
     
     try:
         info = redis_client.info()
@@ -194,10 +1301,18 @@ def get_cache_stats() -> dict:
             "available": True,
             "connected_clients": info.get("connected_clients", 0),
             "used_memory_human": info.get("used_memory_human", "0"),
-            "total_keys": redis_client.dbsize()
+            "total_keys": redis_client.dbsize(),
+            "tiers": tiers,
+            "lyrics_explanations": explanations,
+            "invalidations": invalidations,
+            "cache_manager": cache_manager
         }
     except Exception as e:
-        return {"available": False, "error": str(e)}
+        return {"available": False, "error": str(e), "tiers": tiers, "lyrics_explanations": explanations,
+                "invalidations": invalidations, "cache_manager": cache_manager}
+
+
+redis_health.check()
 
 
 if __name__ == "__main__":
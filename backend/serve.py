@@ -0,0 +1,134 @@
+"""
+Async serving mode for the AI DJ backend
+
+`python main.py` runs Flask's threaded dev server: every in-flight /dj_recommend holds an
+OS thread for the 10-30s it spends waiting on Groq, Spotify, Genius, DeepL and iTunes.
+
+This entrypoint serves the same app on gevent's event loop instead. Sockets, sleeps,
+locks and threads are monkey-patched before anything else is imported, so the existing
+sync code (requests, spotipy, the Groq client, redis, the pipeline's thread pools) yields
+to the loop whenever it waits on the network. Each request is a greenlet, not a thread,
+so hundreds of recommendations can be in flight in one process. Every route - including
+the SSE stream - works unchanged.
+
+Usage:
+    python backend/serve.py
+
+Configuration (environment variables):
+    FLASK_PORT              Port to listen on (default: 5001)
+    SERVER_HOST             Interface to bind (default: 0.0.0.0)
+    SERVER_MAX_CONNECTIONS  Max concurrently handled requests (default: 1000)
+"""
+
+from gevent import monkey
+
+# Must run before anything imports socket, ssl, threading or time
+monkey.patch_all()
+
+import os
+import time
+import threading
+
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+# psycopg2 talks to Postgres through libpq, which monkey-patching can't reach -
+# psycogreen hands its waits to the event loop so queries don't block every request
+try:
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+    PSYCOPG_COOPERATIVE = True
+except ImportError:
+    PSYCOPG_COOPERATIVE = False
+
+from flask import jsonify
+
+from main import app
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("FLASK_PORT", 5001))
+SERVER_MAX_CONNECTIONS = int(os.getenv("SERVER_MAX_CONNECTIONS", 1000))
+
+
+class InFlightCounter:
+    """WSGI middleware that tracks how many requests are being handled right now"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+
+        # Metrics
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_requests = 0
+
+    def __call__(self, environ, start_response):
+        with self.lock:
+            self.in_flight += 1
+            self.total_requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            # Streamed bodies are still being produced after this returns - count until closed
+            return _ClosingIterator(self.wsgi_app(environ, start_response), self._done)
+        except Exception:
+            self._done()
+            raise
+
+    def _done(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "mode": "gevent",
+                "max_connections": SERVER_MAX_CONNECTIONS,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "total_requests": self.total_requests,
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "psycopg_cooperative": PSYCOPG_COOPERATIVE
+            }
+
+
+class _ClosingIterator:
+    """Wraps a WSGI response body and runs a callback once the server closes it"""
+
+    def __init__(self, body, on_close):
+        self.body = body
+        self.on_close = on_close
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.on_close()
+
+
+in_flight_counter = InFlightCounter(app.wsgi_app)
+app.wsgi_app = in_flight_counter
+
+
+@app.route('/api/server_stats')
+def server_stats():
+    """Concurrency metrics for the async server"""
+    return jsonify(in_flight_counter.stats())
+
+
+if __name__ == '__main__':
+    if not PSYCOPG_COOPERATIVE:
+        print("⚠️  psycogreen not installed - Postgres queries will block the event loop while they run")
+    # gevent infers str from spawn's default, but takes a Pool
+    server = WSGIServer((SERVER_HOST, SERVER_PORT), app, spawn=Pool(SERVER_MAX_CONNECTIONS))  # type: ignore[arg-type]
+    print(f"🚀 AI DJ async server on http://{SERVER_HOST}:{SERVER_PORT} "
+          f"(gevent, up to {SERVER_MAX_CONNECTIONS} concurrent requests)")
+    server.serve_forever()
@@ -4,8 +4,11 @@ Allows the frontend to receive partial responses as they're generated
 """
 
 import json
-from flask import Response, stream_with_context
-from typing import Generator, Any
+import time
+from flask import Response, request, stream_with_context
+from typing import Generator, Iterator, Callable, Optional
+
+from pipeline import StageGraph
 
 def stream_json_response(data_generator: Generator[dict, None, None]) -> Response:
     """
@@ -44,138 +47,76 @@ def stream_json_response(data_generator: Generator[dict, None, None]) -> Respons
     )
 
 
-def stream_dj_recommendation(
-    ai_service,
-    user_message: str,
-    user_profile: dict,
-    conversation_history: list,
-    weather_data: dict = None
-) -> Generator[dict, None, None]:
+def stream_dj_recommendation(pipeline_events: Iterator[dict], on_close: Optional[Callable] = None) -> Generator[dict, None, None]:
     """
-    Generator that yields DJ recommendation data in chunks
+    Generator that forwards recommendation pipeline events to the client as they happen
+    
+    Args:
+        pipeline_events: Events from main.run_dj_pipeline
+        on_close: Called once the stream ends (finished, failed or client disconnected)
     
     Yields:
         {"type": "status", "message": "Generating recommendations..."}
+        {"type": "intro_delta", "delta": "DJ in"}           - intro text as the LLM writes it
         {"type": "intro", "content": "DJ intro text"}
-        {"type": "songs", "data": [song1, song2, ...]}
-        {"type": "progress", "current": 1, "total": 6}
-        {"type": "track", "data": {...}}
+        {"type": "track", "index": 0, "data": {...}}       - one per resolved track
+        {"type": "lyrics_scores", "data": {track_id: score}}
+        {"type": "selection", "track_ids": [...]}
+        {"type": "explanation", "data": {...}}             - one per selected track
+        {"type": "complete", "data": {...}}                - same payload as /dj_recommend
     """
+    start_time = time.time()
+    first_track_logged = False
     try:
-        # Step 1: Get AI recommendations
         yield {"type": "status", "message": "🎵 Getting AI recommendations..."}
         
-        ai_response_raw = ai_service.get_recommendations(
-            user_message,
-            user_profile,
-            conversation_history,
-            weather_data=weather_data
-        )
-        
-        # Parse AI response
-        import json
-        import re
-        
-        # Try to parse JSON
-        try:
-            ai_response_json = json.loads(ai_response_raw)
-        except json.JSONDecodeError:
-            # Try to extract JSON from markdown code blocks
-            json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', ai_response_raw, re.DOTALL)
-            if json_match:
-                ai_response_json = json.loads(json_match.group(1))
-            else:
-                # Try to find JSON object directly
-                json_match = re.search(r'\{.*\}', ai_response_raw, re.DOTALL)
-                if json_match:
-                    ai_response_json = json.loads(json_match.group(0))
-                else:
-                    raise ValueError("Could not parse JSON from LLM response")
-        
-        dj_intro = ai_response_json.get('intro', 'Check out these amazing tracks!')
-        llm_songs = ai_response_json.get('songs', [])
-        
-        # Step 2: Send intro immediately
-        yield {"type": "intro", "content": dj_intro}
-        
-        # Step 3: Send song list
-        yield {"type": "songs", "count": len(llm_songs)}
-        
-        # Step 4: Stream each track as it's found
-        for i, song_data in enumerate(llm_songs, 1):
-            yield {
-                "type": "progress",
-                "current": i,
-                "total": len(llm_songs),
-                "message": f"Finding {song_data.get('title')}..."
-            }
-            
-            # This would integrate with the actual Spotify search
-            # For now, just yield the song data
-            yield {
-                "type": "song_found",
-                "data": song_data,
-                "index": i - 1
-            }
-        
-        yield {"type": "status", "message": "✅ All tracks found!"}
+        for event in pipeline_events:
+            if event['type'] == 'intro':
+                print(f"⏱️  [STREAM] Intro sent after {time.time() - start_time:.2f}s")
+            elif event['type'] == 'track' and not first_track_logged:
+                first_track_logged = True
+                print(f"⏱️  [STREAM] First track sent after {time.time() - start_time:.2f}s")
+            yield event
         
+        print(f"⏱️  [STREAM] Completed after {time.time() - start_time:.2f}s")
     except Exception as e:
-        yield {"type": "error", "message": str(e)}
+        print(f"Error in dj_recommend_stream: {e}")
+        yield {"type": "error", "message": str(e), "status": getattr(e, 'status', 500)}
+    finally:
+        if on_close:
+            on_close()
 
 
-def create_streaming_route(app, ai_service):
+def create_streaming_route(app, run_pipeline: Callable, authenticate: Callable):
     """
     Add streaming endpoint to Flask app
     
     Usage:
         from streaming import create_streaming_route
-        create_streaming_route(app, ai_service)
+        create_streaming_route(app, run_dj_pipeline, get_authenticated_spotify)
+    
+    The functions are passed in rather than imported from main, so this module
+    never re-imports main (which would re-run the app's setup when main is __main__).
     """
     @app.route('/dj_recommend_stream', methods=['POST'])
     def dj_recommend_stream():
-        """Streaming version of DJ recommendations"""
-        from flask import request, session
-        from main import get_authenticated_spotify
+        """Streaming version of DJ recommendations (same pipeline as /dj_recommend)"""
+        sp, error = authenticate()
+        if error or sp is None:
+            return {"error": "Not authenticated"}, 401
         
-        sp, redirect_response = get_authenticated_spotify()
-        if redirect_response:
-            return redirect_response
+        data = request.json
+        if data is None:
+            return {"error": "JSON body is required"}, 400
         
-        try:
-            data = request.json
-            user_message = data.get('message', 'recommend me some great songs')
-            selected_tool = data.get('tool')
-            
-            # Get user profile
-            from main import get_user_profile_data
-            clerk_id = session.get('clerk_user_id')
-            user_profile = get_user_profile_data(sp, clerk_id)
-            
-            # Get conversation history
-            conversation_history = session.get('conversation_history', [])
-            
-            # Get weather data if needed
-            weather_data = None
-            if selected_tool == 'weather':
-                location = data.get('location')
-                if location:
-                    # Fetch weather (simplified)
-                    pass
-            
-            # Stream the response
-            return stream_json_response(
-                stream_dj_recommendation(
-                    ai_service,
-                    user_message,
-                    user_profile,
-                    conversation_history,
-                    weather_data
-                )
+        # The pipeline runs lazily while the response streams (inside the request context)
+        graph = StageGraph("dj_recommend_stream")
+        return stream_json_response(
+            stream_dj_recommendation(
+                run_pipeline(sp, data, graph),
+                on_close=graph.close
             )
-        
-        except Exception as e:
-            return {"error": str(e)}, 500
+        )
     
     print("✅ Streaming endpoint registered: /dj_recommend_stream")
 
@@ -0,0 +1,51 @@
+"""
+Cache payload encoding: every installed codec, zstd compression and legacy JSON
+
+Run from the backend directory:
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import cache_codec  # noqa: E402
+from cache_codec import CODEC_NAMES, COMPRESSED_FLAG, CodecError, codec_info, decode, encode  # noqa: E402
+
+INSTALLED = [codec for codec, name in CODEC_NAMES.items() if name in codec_info()["available"]]
+
+SMALL = {"id": "x1", "name": "Song", "artists": ["Art"], "score": 4, "explicit": False, "preview": None}
+LARGE = {"lyrics": "la la la rain on the window\n" * 200, "highlighted_terms": ["rain"]}
+
+
+@pytest.mark.parametrize("codec", INSTALLED, ids=[CODEC_NAMES[codec] for codec in INSTALLED])
+def test_round_trip_uncompressed(codec):
+    payload = encode(SMALL, codec)
+
+    assert payload[0] == codec
+    assert decode(payload) == SMALL
+
+
+@pytest.mark.parametrize("codec", INSTALLED, ids=[CODEC_NAMES[codec] for codec in INSTALLED])
+def test_round_trip_compressed(codec):
+    if cache_codec.zstandard is None or not cache_codec.CACHE_COMPRESS_THRESHOLD:
+        pytest.skip("zstandard is not installed")
+    payload = encode(LARGE, codec)
+
+    assert payload[0] == codec | COMPRESSED_FLAG
+    assert len(payload) < len(json.dumps(LARGE))
+    assert decode(payload) == LARGE
+
+
+def test_legacy_headerless_json():
+    assert decode(json.dumps(SMALL)) == SMALL
+    assert decode(json.dumps(SMALL).encode('utf-8')) == SMALL
+
+
+def test_unknown_payloads_raise():
+    with pytest.raises(CodecError):
+        decode(b"")
@@ -0,0 +1,56 @@
+"""
+Tolerant parsing of LLM JSON output, whole and streamed
+
+Run from the backend directory:
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from llm_json import IncrementalJSONParser, LLMJSONError, parse_llm_json  # noqa: E402
+
+RESPONSE = ('Sure!\n```json\n{"intro": "Rainy night", "songs": '
+            '[{"title": "A", "artist": "B"}, {"title": "C", "artist": "D"}]}\n```')
+
+
+def test_trailing_comma_in_fences_is_repaired():
+    value = parse_llm_json('```json\n{"intro": "Hi", "songs": [{"title": "A", "artist": "B"},]}\n```')
+    assert value == {"intro": "Hi", "songs": [{"title": "A", "artist": "B"}]}
+
+
+def test_truncated_output_keeps_what_was_written():
+    value = parse_llm_json('{"intro": "Hi", "songs": [{"title": "A", "artist": "B"}, {"title": "C", "art')
+    assert value["intro"] == "Hi"
+    assert value["songs"][0] == {"title": "A", "artist": "B"}
+    assert value["songs"][1]["title"] == "C"
+
+
+def test_no_object_raises():
+    with pytest.raises(LLMJSONError):
+        parse_llm_json("Sorry, I can't help with that.")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, len(RESPONSE)])
+def test_incremental_parser_emits_each_element_once(chunk_size):
+    parser = IncrementalJSONParser(partial_keys=["intro"])
+    events = []
+    for i in range(0, len(RESPONSE), chunk_size):
+        events += parser.feed(RESPONSE[i:i + chunk_size])
+
+    items = [event for event in events if event[0] == "item"]
+    members = [event for event in events if event[0] == "member"]
+    assert items == [
+        ("item", "songs", 0, {"title": "A", "artist": "B"}),
+        ("item", "songs", 1, {"title": "C", "artist": "D"}),
+    ]
+    assert [event[1] for event in members] == ["intro", "songs"]
+    assert members[0][2] == "Rainy night"
+    # Partial intros only grow, and never repeat
+    partials = [event[2] for event in events if event[0] == "partial"]
+    assert len(partials) == len(set(partials))
+    assert all("Rainy night".startswith(text) for text in partials)
@@ -0,0 +1,41 @@
+"""
+Highlighted terms mapped from translated lyrics back onto the original
+
+Run from the backend directory:
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lyrics_alignment import align_term, align_highlighted_terms  # noqa: E402
+
+ORIGINAL = "Bailando con María en la playa\nEl chocolate caliente de la noche\nMi corazón late por ti"
+ENGLISH = "Dancing with Maria on the beach\nThe hot chocolate of the night\nMy heart beats for you"
+
+
+def test_names_and_cognates_match_fuzzily():
+    assert align_term("Maria", ENGLISH, ORIGINAL) == "María"
+    assert align_term("chocolate", ENGLISH, ORIGINAL) == "chocolate"
+
+
+def test_unmatched_terms_are_projected_by_position():
+    assert align_term("heart", ENGLISH, ORIGINAL) == "corazón"
+    # Most of the line highlights the whole original line
+    assert align_term("Dancing with Maria on the beach", ENGLISH, ORIGINAL) == "Bailando con María en la playa"
+
+
+def test_projection_when_line_counts_differ():
+    original = "Bailando con María\n\nen la playa\nEl chocolate caliente\nMi corazón late por ti"
+    english = "Dancing with Maria on the beach\nThe hot chocolate\nMy heart beats for you"
+
+    assert align_term("chocolate", english, original) == "chocolate"
+    assert align_term("heart", english, original) == "corazón"
+
+
+def test_terms_missing_from_the_translation_are_dropped():
+    assert align_term("rainbow", ENGLISH, ORIGINAL) is None
+    assert align_highlighted_terms(["Maria", "maria", "rainbow", "chocolate"], ENGLISH, ORIGINAL) == \
+        ["María", "chocolate"]
@@ -0,0 +1,76 @@
+"""
+GroqScheduler admission against a local RateLimiter
+
+Run from the backend directory:
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rate_limiter import (  # noqa: E402
+    GroqScheduler, RateLimiter, RequestDropped, PRIORITY_EXPLANATION, PRIORITY_PRIMARY
+)
+
+
+def admit_concurrently(scheduler, priority, limiter, tokens, count, timeout):
+    """Queue `count` tickets at once; returns (granted tickets, number dropped)"""
+    granted, dropped = [], []
+    start = threading.Barrier(count)
+
+    def admit():
+        start.wait()
+        try:
+            granted.append(scheduler.admit(priority, limiter, tokens, timeout=timeout))
+        except RequestDropped:
+            dropped.append(1)
+
+    threads = [threading.Thread(target=admit) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return granted, len(dropped)
+
+
+def test_low_priority_grants_reserve_budget():
+    # Budget for exactly one 500-token call; the next one would wait ~40s for the refill
+    limiter = RateLimiter(max_requests_per_minute=30, max_tokens_per_minute=600, name="test")
+    scheduler = GroqScheduler(max_concurrent=16)
+
+    granted, dropped = admit_concurrently(scheduler, PRIORITY_EXPLANATION, limiter, 500, count=5, timeout=2)
+
+    assert len(granted) == 1
+    assert dropped == 4
+    reservation = granted[0].reservation
+    assert reservation is not None and reservation.waited == 0
+    assert limiter.total_requests == 1
+    assert limiter.estimated_wait(500) > 2  # The granted call's budget is already taken
+
+
+def test_primary_is_granted_without_budget():
+    limiter = RateLimiter(max_requests_per_minute=30, max_tokens_per_minute=600, name="test")
+    limiter.acquire(600)
+    scheduler = GroqScheduler(max_concurrent=16)
+
+    ticket = scheduler.admit(PRIORITY_PRIMARY, limiter, 500)
+
+    # Primary calls queue in the limiter themselves
+    assert ticket.state == "granted"
+    assert ticket.reservation is None
+    scheduler.release(ticket)
+
+
+def test_released_reservation_returns_its_tokens():
+    limiter = RateLimiter(max_requests_per_minute=30, max_tokens_per_minute=600, name="test")
+
+    reservation = limiter.reserve(500)
+    assert limiter.estimated_wait(500) > 0
+    reservation.release()
+
+    assert limiter.estimated_wait(500) == 0
+    reservation.reconcile(400)  # Already settled - no-op
+    assert limiter.get_current_usage()["usage_vs_estimate"] is None
@@ -0,0 +1,199 @@
+"""
+Groq token accounting for AI DJ
+Estimates a call's tokens from its actual prompt before it is sent (so the rate limiter
+reserves about the right amount), then records what Groq really counted per endpoint.
+
+Estimates use a fast local approximation of Llama's tokenizer (word pieces + punctuation),
+scaled by a per-endpoint correction learned from response.usage, so they converge on
+the real prompt sizes without shipping a tokenizer.
+"""
+
+import re
+import threading
+from bisect import bisect_left
+from typing import Optional
+
+# Histogram bucket upper bounds (tokens); the last bucket is open-ended
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+# Chat formatting adds a few tokens per message (role header + separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# How fast the learned estimate correction follows new observations (0-1)
+CORRECTION_SMOOTHING = 0.2
+
+_PIECES = re.compile(r"[A-Za-z]+|\d|[^\sA-Za-z\d]")
+
+
+def approx_token_count(text: str) -> int:
+    """
+    Approximate Llama-3 token count: common short words are one token, long words split
+    every ~6 letters, digits and punctuation/non-Latin characters count one each.
+    """
+    if not text:
+        return 0
+    count = 0
+    for piece in _PIECES.findall(text):
+        count += 1 + (len(piece) - 1) // 6 if piece[0].isalpha() and piece.isascii() else 1
+    return count
+
+
+def approx_message_tokens(messages: list) -> int:
+    """Approximate prompt tokens for a list of chat messages"""
+    return sum(approx_token_count(m.get('content') or '') + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+class TokenHistogram:
+    """Per-bucket counts plus sum/count/max (enough for averages and rough percentiles)"""
+
+    def __init__(self, buckets=TOKEN_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value: int):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> Optional[int]:
+        """Upper bound of the bucket holding the p-th percentile, capped at the max seen (None if empty)"""
+        if not self.count:
+            return None
+        target = p * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        labels = [f"<={b}" for b in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": round(self.sum / self.count, 1) if self.count else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.max,
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+class TokenEstimate:
+    """Pre-call estimate: prompt tokens (corrected) plus the completion allowance"""
+
+    def __init__(self, endpoint: str, approx_prompt: int, prompt: int, completion: int):
+        self.endpoint = endpoint
+        self.approx_prompt = approx_prompt  # Raw approximation, before correction
+        self.prompt = prompt
+        self.completion = completion
+
+    @property
+    def total(self) -> int:
+        return self.prompt + self.completion
+
+
+class _EndpointUsage:
+    def __init__(self):
+        self.prompt = TokenHistogram()
+        self.completion = TokenHistogram()
+        self.total = TokenHistogram()
+        self.correction = 1.0  # Learned real prompt tokens / approximation
+        self.calls = 0
+        self.unreported = 0  # Responses without usage
+        self.estimated_total = 0
+        self.actual_total = 0
+
+
+class TokenUsageTracker:
+    """Per-endpoint estimates and real-usage histograms"""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def _endpoint(self, endpoint: str) -> _EndpointUsage:
+        # Caller holds the lock
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = _EndpointUsage()
+        return self.endpoints[endpoint]
+
+    def estimate(self, endpoint: str, messages: list, max_tokens: Optional[int] = None,
+                 expected_completion: Optional[int] = None) -> TokenEstimate:
+        """
+        Estimate a call before sending it. The completion allowance is expected_completion if
+        given, else max_tokens (capped at the endpoint's observed p95) - the difference to the
+        real usage is reconciled with the limiter afterwards.
+        """
+        approx_prompt = approx_message_tokens(messages)
+        with self.lock:
+            stats = self._endpoint(endpoint)
+            correction = stats.correction
+            # Once we've seen enough responses, reserve the endpoint's p95 completion instead of the cap
+            typical_completion = stats.completion.percentile(0.95) if stats.completion.count >= 5 else None
+        if expected_completion is not None:
+            completion = expected_completion
+        elif typical_completion is not None and max_tokens:
+            completion = min(max_tokens, typical_completion)
+        else:
+            completion = max_tokens or 0
+        return TokenEstimate(endpoint, approx_prompt, int(approx_prompt * correction) + 1, completion)
+
+    def record(self, estimate: TokenEstimate, usage) -> Optional[int]:
+        """
+        Record Groq's usage for a call (a response.usage object, or None if not reported).
+        Returns the total tokens to reconcile the rate limiter with (None if unknown).
+        """
+        prompt_tokens = getattr(usage, 'prompt_tokens', None)
+        completion_tokens = getattr(usage, 'completion_tokens', None)
+        total_tokens = getattr(usage, 'total_tokens', None)
+        if total_tokens is None and prompt_tokens is not None and completion_tokens is not None:
+            total_tokens = prompt_tokens + completion_tokens
+
+        with self.lock:
+            stats = self._endpoint(estimate.endpoint)
+            stats.calls += 1
+            if total_tokens is None:
+                stats.unreported += 1
+                return None
+            stats.total.observe(total_tokens)
+            stats.estimated_total += estimate.total
+            stats.actual_total += total_tokens
+            if prompt_tokens is not None:
+                stats.prompt.observe(prompt_tokens)
+                if estimate.approx_prompt:
+                    ratio = min(4.0, max(0.25, prompt_tokens / estimate.approx_prompt))
+                    stats.correction += CORRECTION_SMOOTHING * (ratio - stats.correction)
+            if completion_tokens is not None:
+                stats.completion.observe(completion_tokens)
+        return total_tokens
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                endpoint: {
+                    "calls": s.calls,
+                    "unreported": s.unreported,
+                    "prompt_tokens": s.prompt.to_dict(),
+                    "completion_tokens": s.completion.to_dict(),
+                    "total_tokens": s.total.to_dict(),
+                    "estimate_correction": round(s.correction, 3),
+                    # Reserved / used: > 1 means we hold back more TPM than we spend
+                    "reserved_vs_actual": round(s.estimated_total / s.actual_total, 2) if s.actual_total else None
+                }
+                for endpoint, s in sorted(self.endpoints.items())
+            }
+
+
+# Global tracker shared by every Groq caller
+token_usage = TokenUsageTracker()
+
+
+def get_token_usage_stats() -> dict:
+    """Per-endpoint Groq token histograms"""
+    return token_usage.stats()
@@ -0,0 +1,311 @@
+"""
+Spotify track resolution stage for AI DJ
+Turns the LLM's (title, artist) suggestions into Spotify track payloads,
+running the searches concurrently while keeping the LLM's order
+"""
+
+import os
+import re
+import hashlib
+import unicodedata
+import concurrent.futures
+import requests
+from typing import Optional
+
+from redis_cache import TieredCache
+from http_clients import http_clients
+
+# Max concurrent Spotify searches per request (7 songs -> 7 workers by default)
+TRACK_RESOLVE_MAX_WORKERS = int(os.getenv("TRACK_RESOLVE_MAX_WORKERS", 7))
+
+# Resolution cache TTLs (in seconds)
+TRACK_RESOLVE_TTL = int(os.getenv("TRACK_RESOLVE_TTL", 7 * 24 * 3600))  # 1 week
+TRACK_RESOLVE_NEGATIVE_TTL = int(os.getenv("TRACK_RESOLVE_NEGATIVE_TTL", 6 * 3600))  # 6 hours
+
+# Shared across users: the LLM keeps recommending the same popular songs
+resolution_cache = TieredCache(
+    "track_resolve",
+    ttl=TRACK_RESOLVE_TTL,
+    negative_ttl=TRACK_RESOLVE_NEGATIVE_TTL,
+    local_max_entries=5000,
+    local_ttl=3600
+)
+
+
+def normalize_song_text(text: str) -> str:
+    """Normalize an LLM title/artist so trivial differences map to the same cache key"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = text.casefold().replace('&', ' and ')
+    text = re.sub(r"[^\w\s]", ' ', text)
+    return ' '.join(text.split())
+
+
+def resolution_cache_key(title: str, artist: str, market: str) -> str:
+    """Cache key for a normalized (title, artist, market) triple"""
+    raw = f"{normalize_song_text(title)}|{normalize_song_text(artist)}|{(market or 'US').upper()}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_itunes_preview_url(track_name, artist_name):
+    """
+    Fetch 30-second preview URL from iTunes API as fallback when Spotify preview is unavailable.
+
+    Args:
+        track_name: Name of the track
+        artist_name: Name of the artist (can be comma-separated for multiple artists)
+
+    Returns:
+        Preview URL string or None if not found
+    """
+    try:
+        # Clean artist name - take first artist if comma-separated
+        primary_artist = artist_name.split(',')[0].strip() if ',' in artist_name else artist_name.strip()
+
+        # Build search query: "artist track" format works best
+        search_term = f"{primary_artist} {track_name}"
+
+        # iTunes Search API endpoint
+        url = "https://itunes.apple.com/search"
+        params = {
+            'term': search_term,
+            'media': 'music',
+            'entity': 'song',
+            'limit': 1
+        }
+
+        # Make request (no authentication needed)
+        response = http_clients.get(url, params=params)
+        response.raise_for_status()
+
+        data = response.json()
+
+        # Check if results exist
+        if data.get('resultCount', 0) > 0:
+            result = data['results'][0]
+            preview_url = result.get('previewUrl')
+
+            if preview_url:
+                print(f"    ✓ iTunes preview found: {preview_url[:50]}...")
+                return preview_url
+            else:
+                print(f"    ⚠️  iTunes found track but no preview URL")
+                return None
+        else:
+            print(f"    ⚠️  iTunes: No results found")
+            return None
+
+    except requests.exceptions.Timeout:
+        print(f"    ⚠️  iTunes API timeout")
+        return None
+    except requests.exceptions.RequestException as e:
+        print(f"    ⚠️  iTunes API error: {e}")
+        return None
+    except Exception as e:
+        print(f"    ⚠️  Unexpected error fetching iTunes preview: {e}")
+        return None
+
+
+def format_track(track: dict, preview_url: Optional[str]) -> dict:
+    """Convert a Spotify search result into the track payload sent to the frontend"""
+    return {
+        'id': track['id'],
+        'name': track['name'],
+        'artist': ', '.join([a['name'] for a in track['artists']]),
+        'artists': [{'name': a['name'], 'id': a['id']} for a in track['artists']],
+        'album': {
+            'name': track['album']['name'],
+            'images': track['album']['images']
+        },
+        'preview_url': preview_url,  # This will be Spotify or iTunes URL
+        'external_url': track['external_urls']['spotify'],
+        'duration_ms': track['duration_ms'],
+        'popularity': track['popularity']
+    }
+
+
+def search_spotify_track(sp, title: str, artist: str, market: str) -> tuple[Optional[dict], bool]:
+    """
+    Search Spotify for a single LLM suggestion.
+    Tries "track + artist" first, then falls back to a title-only search.
+
+    Returns:
+        Tuple of (raw Spotify track or None, matched_by_title_only)
+    """
+    search_results = sp.search(
+        q=f"track:{title} artist:{artist}",
+        type='track',
+        limit=1,
+        market=market
+    )
+    if search_results and search_results['tracks']['items']:
+        return search_results['tracks']['items'][0], False
+
+    # Try searching with just the title
+    search_results = sp.search(
+        q=f"track:{title}",
+        type='track',
+        limit=1,
+        market=market
+    )
+    if search_results and search_results['tracks']['items']:
+        return search_results['tracks']['items'][0], True
+
+    return None, False
+
+
+def resolve_song(sp, song_data: dict, market: str, excluded_track_ids: set,
+                 cached: Optional[tuple] = None) -> Optional[dict]:
+    """
+    Resolve one LLM song to a formatted Spotify track (runs inside a worker thread).
+    Checks the resolution cache first - or uses cached, a (hit, track) pair from
+    ResolutionBatch.prefetch - and only misses go to Spotify/iTunes.
+    Returns None if the song is missing, not found, or was already recommended.
+    """
+    title = (song_data.get('title') or '').strip()
+    artist = (song_data.get('artist') or '').strip()
+
+    if not title or not artist:
+        return None
+
+    cache_key = resolution_cache_key(title, artist, market)
+    hit, cached_track = cached if cached is not None else resolution_cache.get(cache_key)
+    if hit:
+        if cached_track is None:
+            print(f"  💾 Not found (cached): {title} by {artist}")
+            return None
+        if cached_track['id'] in excluded_track_ids:
+            print(f"  ⏭️  Skipping duplicate: {cached_track['name']} by {cached_track['artist']} (already recommended)")
+            return None
+        print(f"  💾 Found (cached): {cached_track['name']} by {cached_track['artist']}")
+        return cached_track
+
+    try:
+        print(f"Searching Spotify: track:{title} artist:{artist}")
+        track, title_only = search_spotify_track(sp, title, artist, market)
+
+        if not track:
+            print(f"  ✗ Not found: {title} by {artist}")
+            resolution_cache.set_negative(cache_key)
+            return None
+
+        artist_name = ', '.join([a['name'] for a in track['artists']])
+
+        # Skip if this track was already recommended (before paying for an iTunes lookup).
+        # Not cached: the payload would be missing its iTunes preview for other users.
+        if track['id'] in excluded_track_ids:
+            print(f"  ⏭️  Skipping duplicate: {track['name']} by {artist_name} (already recommended)")
+            return None
+
+        preview_url = track.get('preview_url')
+        print(f"  ✓ Found{' (title only)' if title_only else ''}: {track['name']} by {artist_name}")
+        print(f"    Preview URL: {preview_url if preview_url else 'NULL/None'}")
+
+        # If Spotify preview is missing, try iTunes as fallback
+        if not preview_url:
+            print(f"    Trying iTunes API fallback...")
+            itunes_preview = get_itunes_preview_url(track['name'], artist_name)
+            if itunes_preview:
+                preview_url = itunes_preview
+
+        formatted = format_track(track, preview_url)
+        resolution_cache.set(cache_key, formatted)
+        return formatted
+    except Exception as e:
+        # Errors are not cached - the next request retries the search
+        print(f"  ✗ Error searching for {title} by {artist}: {e}")
+        return None
+
+
+class ResolutionBatch:
+    """
+    Resolves songs as they are submitted - e.g. while the LLM is still streaming the
+    rest of the list - and hands back each track as soon as its search finishes.
+
+    Usage:
+        batch = ResolutionBatch(sp, market, excluded_track_ids)
+        batch.prefetch(songs)                          # optional: one cache lookup for known songs
+        batch.submit(0, {"title": ..., "artist": ...})
+        for index, track in batch.completed():        # whatever has finished so far
+            ...
+        for index, track in batch.completed(wait=True):  # the rest, as they finish
+            ...
+        tracks = batch.tracks()   # LLM order, deduplicated, positions set
+        batch.close()
+    """
+
+    def __init__(self, sp, market: Optional[str] = None, excluded_track_ids: Optional[set] = None,
+                 max_workers: int = TRACK_RESOLVE_MAX_WORKERS):
+        self.sp = sp
+        self.market = market or 'US'
+        self.excluded_track_ids = excluded_track_ids or set()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self.pending = {}  # future -> LLM index
+        self.resolved = []  # (LLM index, formatted track)
+        self.prefetched = {}  # resolution cache key -> (hit, track)
+
+    def _cache_key(self, song_data: dict) -> Optional[str]:
+        title = (song_data.get('title') or '').strip()
+        artist = (song_data.get('artist') or '').strip()
+        return resolution_cache_key(title, artist, self.market) if title and artist else None
+
+    def prefetch(self, songs: list):
+        """Look up the resolution cache for songs known up front in one round trip"""
+        keys = [key for key in map(self._cache_key, songs) if key and key not in self.prefetched]
+        if not keys:
+            return
+        found = resolution_cache.get_many(keys)
+        for key in keys:
+            self.prefetched[key] = (True, found[key]) if key in found else (False, None)
+
+    def submit(self, index: int, song_data: dict):
+        # Each prefetched result is used once - a repeated song looks itself up again
+        cached = self.prefetched.pop(self._cache_key(song_data), None)
+        future = self.executor.submit(resolve_song, self.sp, song_data, self.market, self.excluded_track_ids, cached)
+        self.pending[future] = index
+
+    def completed(self, wait: bool = False):
+        """
+        Yield (llm_index, track) for searches that have finished since the last call.
+        With wait=True, blocks until every submitted search is done, yielding in completion order.
+        Songs that are missing, not found or excluded are skipped.
+        """
+        if wait:
+            done = concurrent.futures.as_completed(list(self.pending))
+        else:
+            done = [future for future in list(self.pending) if future.done()]
+        for future in done:
+            index = self.pending.pop(future)
+            track = future.result()
+            if track:
+                self.resolved.append((index, track))
+                yield index, track
+
+    def tracks(self) -> list:
+        """Everything resolved so far, in LLM order with duplicates removed"""
+        return order_resolved_tracks(track for _, track in sorted(self.resolved, key=lambda item: item[0]))
+
+    def close(self):
+        """Stop the workers; searches that haven't started yet are cancelled"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def order_resolved_tracks(resolved) -> list:
+    """Drop duplicate Spotify tracks (first one wins) and number the rest from 1"""
+    tracks = []
+    seen_ids = set()
+    for track in resolved:
+        # Two LLM suggestions can resolve to the same Spotify track
+        if track['id'] in seen_ids:
+            print(f"  ⏭️  Skipping duplicate within this batch: {track['name']}")
+            continue
+        seen_ids.add(track['id'])
+        track['position'] = len(tracks) + 1
+        tracks.append(track)
+
+    return tracks
+
+
+def get_resolution_cache_stats() -> dict:
+    """Hit/miss counters for the track resolution cache"""
+    return resolution_cache.stats()
@@ -0,0 +1,72 @@
+"""
+Shared translation cache for AI DJ
+Remembers (translated_text, detected_language) for lyrics so identical texts are
+never sent to DeepL (or the Groq fallback) twice.
+
+Keys are the SHA-256 of the FULL text, so two songs sharing an intro can't collide.
+The in-process tier is bounded by entry count and bytes; the Redis tier is optional
+(TRANSLATION_CACHE_REDIS=false keeps translations process-local).
+"""
+
+import os
+import hashlib
+from typing import Optional
+
+from redis_cache import TieredCache
+
+TRANSLATION_CACHE_TTL = int(os.getenv("TRANSLATION_CACHE_TTL", 30 * 24 * 3600))  # 30 days
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", 2000))
+TRANSLATION_CACHE_MAX_BYTES = int(os.getenv("TRANSLATION_CACHE_MAX_BYTES", 16 * 1024 * 1024))  # 16 MB
+TRANSLATION_CACHE_REDIS = os.getenv("TRANSLATION_CACHE_REDIS", "true").lower() == "true"
+
+_cache = TieredCache(
+    "translation",
+    ttl=TRANSLATION_CACHE_TTL,
+    local_max_entries=TRANSLATION_CACHE_MAX_ENTRIES,
+    local_ttl=TRANSLATION_CACHE_TTL,
+    local_max_bytes=TRANSLATION_CACHE_MAX_BYTES,
+    use_redis=TRANSLATION_CACHE_REDIS
+)
+
+
+def translation_key(text: str) -> str:
+    """Cache key for a text (hash of the full content)"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def get_cached_translation(text: str) -> Optional[tuple[str, str]]:
+    """Get cached (translated_text, detected_language) for text, or None on a miss"""
+    hit, value = _cache.get(translation_key(text))
+    if not hit or value is None:
+        return None
+    return value['translated'] or text, value['language']
+
+
+def get_cached_translations(texts: list) -> list:
+    """get_cached_translation for several texts with one lookup - a list in the order of texts"""
+    keys = [translation_key(text) for text in texts]
+    found = _cache.get_many(keys)
+    return [
+        (found[key]['translated'] or text, found[key]['language']) if found.get(key) else None
+        for text, key in zip(texts, keys)
+    ]
+
+
+def _entry(text: str, translated: str, language: str) -> dict:
+    # Don't keep a second copy of texts that didn't need translating
+    return {'translated': translated if translated != text else None, 'language': language}
+
+
+def cache_translation(text: str, translated: str, language: str):
+    """Store a successful translation (or an English detection, with translated == text)"""
+    _cache.set(translation_key(text), _entry(text, translated, language))
+
+
+def cache_translations(items: list):
+    """cache_translation for several (text, translated, language) items in one round trip"""
+    _cache.set_many({translation_key(text): _entry(text, translated, language) for text, translated, language in items})
+
+
+def get_translation_cache_stats() -> dict:
+    """Hit/miss counters for the translation cache"""
+    return _cache.stats()